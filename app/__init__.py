@@ -23,6 +23,39 @@ def create_app(config_name: str) -> Flask:
     mail.init_app(app)
     login_manager.init_app(app)
 
+    from app.metrics import metrics
+    from app.presence import presence
+    from app.query_guard import query_guard
+    from app.fragment_cache import fragment_cache
+    from app.reference_data import reference_data
+    from app.outbox import outbox
+    from app.identity import identity_cache
+    from app.images import images
+    from app.assets import assets
+    from app.search import search
+    from app.feed import feed
+    from app.fanout import fanout
+    from app.passwords import passwords
+    from app.rate_limit import rate_limiter
+    from app.tokens import tokens
+    from app.uniqueness import uniqueness
+    metrics.init_app(app)
+    presence.init_app(app)
+    query_guard.init_app(app)
+    fragment_cache.init_app(app)
+    reference_data.init_app(app)
+    outbox.init_app(app)
+    identity_cache.init_app(app)
+    images.init_app(app)
+    assets.init_app(app)
+    search.init_app(app)
+    feed.init_app(app)
+    fanout.init_app(app)
+    passwords.init_app(app)
+    rate_limiter.init_app(app)
+    tokens.init_app(app)
+    uniqueness.init_app(app)
+
     # register blueprints
     from app.blueprints import blog_bp, auth_bp, admin_bp
     app.register_blueprint(blog_bp, url_prefix='/blog')
@@ -0,0 +1,165 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+from flask import Flask, request, current_app, send_from_directory
+from werkzeug.security import safe_join
+from app.images import blob_name
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+compressible = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico')
+shard = re.compile(r'[0-9a-f]{2}')
+fingerprinted = re.compile(r'(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)?')
+
+
+def fingerprint(filename: str, digest: str) -> str:
+    """Insert the digest of a file in its name, `css/base.css` -> `css/base.<digest>.css`"""
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{digest[:12]}{ext}'
+
+
+def _digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(64 * 1024):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _precompress(path: str) -> int:
+    """Write the .gz and .br versions of a text file if they are outdated, return written files"""
+    written = 0
+    mtime = os.path.getmtime(path)
+    encoders = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    data = None
+    for suffix, compress in encoders:
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            continue
+        with open(f'{target}.tmp', 'wb') as f:
+            f.write(compressed)
+        os.replace(f'{target}.tmp', target)
+        written += 1
+    return written
+
+
+class Assets():
+    """
+    Fingerprinted and precompressed static files, `flask assets build` hashes
+    the files of `ASSET_DIRS` into a manifest and writes .gz/.br versions of
+    text files, `url_for('static', ...)` then builds urls containing the hash
+    of the file which are served with a one year immutable Cache-Control,
+    content addressed uploads are immutable by their name, the static view
+    serves the precompressed version accepted by the client, files are sent
+    with the server's file wrapper (sendfile) or X-Sendfile if enabled
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('ASSET_MANIFEST', os.path.join(app.root_path, 'static', 'manifest.json'))
+        app.config.setdefault('ASSET_DIRS', ['css', 'js', 'images'])
+        app.config.setdefault('ASSET_MAX_AGE', 365 * 24 * 3600)
+        app.extensions['assets'] = self._load(app.config['ASSET_MANIFEST'])
+        if app.has_static_folder:
+            app.url_defaults(self._url_defaults)
+            app.view_functions['static'] = self.send_static
+
+    def _load(self, path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def manifest(self) -> dict:
+        """file name -> fingerprinted file name"""
+        return current_app.extensions['assets']
+
+    def build(self) -> tuple[int, int]:
+        """Rebuild the manifest and precompress text files, return (files, compressed files)"""
+        static = current_app.static_folder
+        manifest = {}
+        compressed = 0
+        for folder in current_app.config['ASSET_DIRS']:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(static, folder)):
+                # content addressed uploads are immutable by their name
+                dirnames[:] = [d for d in dirnames if not shard.fullmatch(d)]
+                for name in filenames:
+                    if name.startswith('.') or name.endswith(('.gz', '.br', '.tmp')) or \
+                            blob_name.fullmatch(name):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    filename = os.path.relpath(path, static).replace(os.sep, '/')
+                    manifest[filename] = fingerprint(filename, _digest(path))
+                    if name.endswith(compressible):
+                        compressed += _precompress(path)
+
+        path = current_app.config['ASSET_MANIFEST']
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(f'{path}.tmp', path)
+        current_app.extensions['assets'] = manifest
+        return len(manifest), compressed
+
+    def _url_defaults(self, endpoint: str, values: dict) -> None:
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def _resolve(self, filename: str) -> tuple[str, bool]:
+        """Return the actual file name of a requested name and whether it is immutable"""
+        match = fingerprinted.fullmatch(filename)
+        if match is not None:
+            original = match['stem'] + (match['ext'] or '')
+            current = self.manifest.get(original)
+            if current is not None:
+                # outdated fingerprints get the current file, without long caching
+                return original, current == filename
+        return filename, blob_name.fullmatch(filename.rpartition('/')[2]) is not None
+
+    def send_static(self, filename: str):
+        """Static view serving fingerprinted and precompressed files"""
+        static = current_app.static_folder
+        filename, immutable = self._resolve(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        encoding = None
+        if filename.endswith(compressible):
+            accepted = request.accept_encodings
+            for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+                path = safe_join(static, filename + suffix)
+                if accepted[name] and path is not None and os.path.isfile(path):
+                    encoding = name
+                    break
+
+        max_age = current_app.config['ASSET_MAX_AGE'] if immutable else None
+        response = send_from_directory(
+            static, filename + suffix if encoding else filename, mimetype=mimetype, max_age=max_age)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        if filename.endswith(compressible):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
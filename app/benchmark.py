@@ -0,0 +1,184 @@
+import json
+import math
+import time
+import random
+import platform
+from threading import Thread
+from flask import Flask, url_for
+from sqlalchemy import event, select
+from app import db
+from app.util import utcnow
+
+
+scenarios = ('view_blog', 'view_post', 'profile', 'login', 'create_comment')
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest rank percentile of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Benchmark():
+    """
+    Drive the hot endpoints through the test client of an application and
+    measure the latency and the queries of each request, targets are sampled
+    from the database (e.g. filled by `app.fake.generate`), logins and comments
+    use the generated users whose password is `app.fake.password`, comments are
+    written to the database
+    """
+    def __init__(self, app: Flask, requests: int=200, warmup: int=10, seed: int=0):
+        self.app = app
+        self.requests = requests
+        self.warmup = warmup
+        self.rand = random.Random(seed)
+        self._queries = 0
+
+    def _count(self, *args):
+        self._queries += 1
+
+    def _targets(self) -> dict:
+        from app.fake import password
+        from app.models import User, Blog, Post
+        users = db.session.execute(
+            select(User.username, User.email)
+            .where(User.email.like('%@example.com'))
+            .order_by(User.id).limit(1000)).all()
+        blogs = db.session.scalars(select(Blog.name).order_by(Blog.id).limit(1000)).all()
+        posts = db.session.scalars(select(Post.id).order_by(Post.id.desc()).limit(1000)).all()
+        if not users or not blogs or not posts:
+            raise ValueError('no data to benchmark, run `flask fake` first')
+        return dict(users=users, blogs=blogs, posts=posts, password=password)
+
+    def _url(self, endpoint: str, **values) -> str:
+        with self.app.test_request_context():
+            return url_for(endpoint, **values)
+
+    def _request(self, name: str, targets: dict, clients: dict):
+        rand = self.rand
+        if name == 'view_blog':
+            return clients['anonymous'].get(
+                self._url('blog.view_blog', blog_name=rand.choice(targets['blogs'])))
+        if name == 'view_post':
+            return clients['anonymous'].get(
+                self._url('blog.view_post', id=rand.choice(targets['posts'])))
+        if name == 'profile':
+            username, _ = rand.choice(targets['users'])
+            return clients['anonymous'].get(self._url('blog.profile', username=username))
+        if name == 'login':
+            _, email = rand.choice(targets['users'])
+            # a new session per login
+            return self.app.test_client().post(
+                self._url('auth.login'), data={'email': email, 'password': targets['password']})
+        if name == 'create_comment':
+            return clients['user'].post(
+                self._url('blog.create_comment', id=rand.choice(targets['posts'])),
+                data={'body': f'benchmark comment {rand.random()}'})
+        raise ValueError(f'unknown scenario {name}')
+
+    def _failed(self, name: str, response) -> bool:
+        if name == 'login':
+            return 'HX-Redirect' not in response.headers
+        return response.status_code >= 400
+
+    def _run(self, names: tuple) -> dict:
+        with self.app.app_context():
+            targets = self._targets()
+            engine = db.engine
+        clients = {'anonymous': self.app.test_client(), 'user': self.app.test_client()}
+        _, email = targets['users'][0]
+        clients['user'].post(
+            self._url('auth.login'), data={'email': email, 'password': targets['password']})
+        results = {}
+        event.listen(engine, 'before_cursor_execute', self._count)
+        try:
+            for name in names:
+                for _ in range(self.warmup):
+                    self._request(name, targets, clients)
+                latencies = []
+                queries = 0
+                errors = 0
+                for _ in range(self.requests):
+                    self._queries = 0
+                    start = time.perf_counter()
+                    response = self._request(name, targets, clients)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    queries += self._queries
+                    errors += self._failed(name, response)
+                results[name] = dict(
+                    requests=self.requests,
+                    errors=errors,
+                    mean_ms=round(sum(latencies) / len(latencies), 3),
+                    p50_ms=round(percentile(latencies, 50), 3),
+                    p95_ms=round(percentile(latencies, 95), 3),
+                    p99_ms=round(percentile(latencies, 99), 3),
+                    queries_per_request=round(queries / self.requests, 2))
+        finally:
+            event.remove(engine, 'before_cursor_execute', self._count)
+        return results
+
+    def run(self, names: tuple=scenarios) -> dict:
+        """Run the given scenarios, return their latency percentiles (ms) and queries per request"""
+        outcome = {}
+
+        def target():
+            try:
+                outcome['results'] = self._run(names)
+            except Exception as e:
+                outcome['error'] = e
+
+        config = self.app.config
+        csrf = config.get('WTF_CSRF_ENABLED', True)
+        rate_limit = config.get('RATE_LIMIT_ENABLED', True)
+        config['WTF_CSRF_ENABLED'] = False
+        # all the logins come from one address
+        config['RATE_LIMIT_ENABLED'] = False
+        try:
+            # requests of a thread without application context get their own
+            # context, g and database session, as they do in a server
+            thr = Thread(target=target, name='benchmark')
+            thr.start()
+            thr.join()
+        finally:
+            config['WTF_CSRF_ENABLED'] = csrf
+            config['RATE_LIMIT_ENABLED'] = rate_limit
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['results']
+
+
+def save_baseline(results: dict, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(dict(
+            created_at=utcnow().isoformat(),
+            python=platform.python_version(),
+            results=results), f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results: dict, baseline: dict, tolerance: float=0.2, noise_ms: float=1.0) -> list[str]:
+    """
+    Return the regressions of results against a baseline, a p95 latency more
+    than tolerance (and noise_ms) above the baseline, or more queries per request
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and \
+                result['p95_ms'] - base['p95_ms'] > noise_ms:
+            regressions.append(
+                f'{name}: p95 {result["p95_ms"]:.1f}ms, baseline {base["p95_ms"]:.1f}ms')
+        if result['queries_per_request'] > base['queries_per_request']:
+            regressions.append(
+                f'{name}: {result["queries_per_request"]} queries per request, '
+                f'baseline {base["queries_per_request"]}')
+    return regressions
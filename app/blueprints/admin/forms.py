@@ -1,8 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import (
     StringField, EmailField, TextAreaField, BooleanField, SelectField)
-from wtforms.validators import DataRequired, Length, Regexp, Email, ValidationError
-from app.models import User, Role
+from wtforms.validators import DataRequired, Length, Regexp, Email
+from app.reference_data import reference_data
 
 
 class EditAccountForm(FlaskForm):
@@ -20,16 +20,6 @@ class EditAccountForm(FlaskForm):
 
     def __init__(self, user, *args, **kwargs):
         super(EditAccountForm, self).__init__(*args, **kwargs)
-        self.role.choices = [(role.id, role.name) for role in Role.query.all()]
+        self.role.choices = list(reference_data.choices('roles'))
         self.user = user
-    
-    def validate_email(self, field):
-        if field.data != self.user.email and \
-                User.query.filter_by(email=field.data).first():
-            raise ValidationError('email already in use')
-    
-    def validate_username(self, field):
-        if field.data != self.user.username and \
-                User.query.filter_by(username=field.data).first():
-            raise ValidationError('username already in use')
     
\ No newline at end of file
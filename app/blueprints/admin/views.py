@@ -1,9 +1,11 @@
-from flask import request, url_for, flash
+from flask import request, url_for, flash, Response
 from flask_login import login_required
 from app import db
 from app.decorators import template, admin_required
+from app.metrics import metrics as request_metrics
 from app.util import hx_redirect
-from app.models import User, Role
+from app.uniqueness import uniqueness
+from app.models import User
 from . import admin_bp as bp
 from .forms import EditAccountForm
 
@@ -21,11 +23,12 @@ def edit_user_account(username):
         user.location = form.location.data
         user.about_me = form.about_me.data
         user.confirmed = form.confirmed.data
-        user.role = Role.query.get(form.role.data)
+        user.role_id = form.role.data
         db.session.add(user)
-        db.session.commit()
-        flash('data has been updated', category='success')
-        return hx_redirect(url_for('blog.profile', username=username))
+        if uniqueness.save(form):
+            flash('data has been updated', category='success')
+            return hx_redirect(url_for('blog.profile', username=username))
+        return dict(form=form, user=user)
     form.username.data = user.username
     form.email.data = user.email
     form.location.data = user.location
@@ -34,3 +37,10 @@ def edit_user_account(username):
     form.role.data = user.role_id
 
     return dict(form=form, user=user)
+
+
+@bp.route('/metrics')
+@login_required
+@admin_required
+def metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -4,7 +4,7 @@ from wtforms import (
     HiddenField)
 from wtforms.validators import DataRequired, Length, Email, Regexp, EqualTo
 from wtforms import ValidationError
-from app.models import User
+from app.uniqueness import uniqueness
 
 
 class LoginForm(FlaskForm):
@@ -26,16 +26,6 @@ class RegistrationForm(FlaskForm):
     confirm_password = PasswordField('confirm password', validators=[DataRequired()])
     submit = SubmitField('Sign up')
 
-    def validate_email(self, field):
-        user = User.query.filter_by(email=field.data).first()
-        if user:
-            raise ValidationError('email already in use')
-    
-    def validate_username(self, field):
-        user = User.query.filter_by(username=field.data).first()
-        if user:
-            raise ValidationError('username already in use')
-
 
 class ForgotPasswordForm(FlaskForm):
     email = EmailField('email', validators=[DataRequired(), Length(max=64), Email()])
@@ -54,8 +44,8 @@ class ChangeEmailForm(FlaskForm):
     submit = SubmitField('Send')
 
     def validate_email(self, field):
-        user = User.query.filter_by(email=field.data).first()
-        if user:
+        # nothing is written before the link is followed, see `update_email`
+        if uniqueness.taken('email', field.data):
             raise ValidationError('email already in use')
 
 
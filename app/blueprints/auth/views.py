@@ -1,8 +1,11 @@
-from flask import request, url_for, flash, redirect
+from flask import request, url_for, flash, redirect, abort
 from flask_login import login_required, login_user, logout_user, current_user
 from app import db
 from app.models import User
-from app.decorators import template
+from app.passwords import PasswordPoolBusy
+from app.rate_limit import Limit
+from app.uniqueness import uniqueness
+from app.decorators import template, rate_limit
 from app.util import hx_redirect, send_mail
 from . import auth_bp as bp
 from .forms import (
@@ -11,6 +14,7 @@ from .forms import (
 
 
 @bp.route('/login', methods=['GET', 'POST'])
+@rate_limit(Limit('ip', 20, 60), Limit('email', 5, 60))
 @template('auth/login.html')
 def login():
     if current_user.is_authenticated:
@@ -18,7 +22,13 @@ def login():
     form = LoginForm(request.form)
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user is not None and user.verify_password(form.password.data):
+        try:
+            verified = user is not None and user.verify_password(form.password.data)
+        except PasswordPoolBusy:
+            abort(429, retry_after=1)
+        if verified:
+            # the password may have been rehashed
+            db.session.commit()
             login_user(user, form.remember_me.data)
             next = request.args.get('next')
             if next is None or not next.startswith('/'):
@@ -29,6 +39,7 @@ def login():
 
 
 @bp.route('/register', methods=['GET', 'POST'])
+@rate_limit(Limit('ip', 10, 3600), Limit('email', 3, 3600))
 @template('auth/register.html')
 def register():
     if current_user.is_authenticated:
@@ -40,13 +51,15 @@ def register():
             email=form.email.data,
             password=form.password.data)
         db.session.add(user)
-        db.session.commit()
+        if not uniqueness.save(form):
+            return dict(form=form)
         send_mail(
             user.email, 
             'Confirm your account', 
             'auth/email/confirm',
             user=user,
             token=user.generate_token({'confirm': user.id}))
+        db.session.commit()
         flash('a confirmation email has been sent, please check your inbox', category='success')
         return hx_redirect(url_for('auth.login'))
     return dict(form=form)
@@ -87,15 +100,13 @@ def change_account_info():
     form = ChangeAccountInfoForm(request.form)
     if form.validate():
         user = current_user._get_current_object()
-        if User.query.filter_by(username=form.username.data).first()\
-            and form.username.data != user.username:
-            flash('please choose a different username', category='warning')
-            return hx_redirect(url_for('auth.settings'))
         user.username = form.username.data
         user.location = form.location.data
         user.about_me = form.about_me.data
         db.session.add(user)
-        db.session.commit()
+        if not uniqueness.save(form):
+            flash('please choose a different username', category='warning')
+            return hx_redirect(url_for('auth.settings'))
         flash('account info updated', category='success')
     else:
         flash('an error occurred while updating your info', category='warning')
@@ -113,6 +124,7 @@ def change_email():
             'auth/email/update-email',
             user=current_user,
             token=current_user.generate_token({'update-email': form.email.data}))
+        db.session.commit()
         flash('an email have been sent to your account to confirm the changes', category='success')
     else:
         flash('an error occurred while updating your info', category='warning')
@@ -123,8 +135,10 @@ def change_email():
 @login_required
 def update_email(token):
     if current_user.update_email(token):
-        db.session.commit()
-        flash('your email address have been updated', category='success')
+        if uniqueness.save():
+            flash('your email address have been updated', category='success')
+        else:
+            flash('this email address is already in use', category='warning')
     else:
         flash('an error occurred while updating your info, link might be invalid or expired', category='warning')
     return redirect(url_for('auth.settings'))
@@ -184,6 +198,7 @@ def unconfirmed():
 
 @bp.route('/resend-confirmation')
 @login_required
+@rate_limit(Limit('user', 3, 3600), Limit('ip', 10, 3600), methods=('GET',))
 def resend_confirmation():
     send_mail(
         current_user.email,
@@ -191,11 +206,13 @@ def resend_confirmation():
         'auth/email/confirm',
         user=current_user,
         token=current_user.generate_token({'confirm': current_user.id}))
+    db.session.commit()
     flash('a confirmation email has been sent, please check your inbox', category='success')
     return redirect(url_for('blog.index'))
 
 
 @bp.route('/forgot-password', methods=['GET', 'POST'])
+@rate_limit(Limit('ip', 10, 3600), Limit('email', 3, 3600))
 @template('auth/forgot-password.html')
 def forgot_password():
     form = ForgotPasswordForm(request.form)
@@ -210,6 +227,7 @@ def forgot_password():
             'auth/email/reset-password',
             user=user,
             token=user.generate_token({'email': user.email}))
+        db.session.commit()
         flash('please check your inbox for resitting password email', category='success')
     return dict(form=form)
 
@@ -220,7 +238,6 @@ def reset_password(token):
     form = ResetPasswordForm(request.form)
     if form.validate_on_submit():
         email = User.reset_password(token)
-        print(email)
         if email:
             user = User.query.filter_by(email=email).first()
             if user:
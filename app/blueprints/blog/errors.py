@@ -18,3 +18,17 @@ def internal_server_error(e):
 @template('errors/403.html', 403)
 def forbidden(e):
     return dict()
+
+
+@template('errors/429.html', 429)
+def _too_many_requests(e):
+    return dict()
+
+
+@bp.app_errorhandler(429)
+def too_many_requests(e):
+    """keep the Retry-After header of the error, e.g. `abort(429, retry_after=1)`"""
+    response = _too_many_requests(e)
+    if getattr(e, 'retry_after', None) is not None:
+        response.headers['Retry-After'] = dict(e.get_headers())['Retry-After']
+    return response
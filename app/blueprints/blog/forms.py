@@ -1,10 +1,11 @@
-import imghdr
 from werkzeug.datastructures.file_storage import FileStorage
+from flask import current_app
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectField, FileField, SubmitField
 from wtforms.validators import DataRequired, Length, ValidationError, Regexp
 from flask_wtf.file import FileAllowed
-from app.models import Post, Category, Blog
+from app.reference_data import reference_data
+from app.images import sniff_format, header_size
 
 
 class CreateBlogForm(FlaskForm):
@@ -16,8 +17,19 @@ class CreateBlogForm(FlaskForm):
     submit = SubmitField('create')
 
     def validate_name(self, field):
-        if Blog.query.filter_by(name=field.data).first():
-            raise ValidationError('blog name already in use')
+        if field.data.lower() in reserved_names():
+            raise ValidationError('blog name is reserved')
+
+
+def reserved_names() -> set[str]:
+    """first segments of the static blog routes (`/blog/search`...), they take precedence over `/blog/<blog_name>`"""
+    names = set()
+    for rule in current_app.url_map.iter_rules():
+        if rule.endpoint.startswith('blog.'):
+            segment = rule.rule.removeprefix('/blog/').split('/')[0]
+            if segment and '<' not in segment:
+                names.add(segment.lower())
+    return names
 
 
 class CreatePostForm(FlaskForm):
@@ -29,30 +41,20 @@ class CreatePostForm(FlaskForm):
 
     def __init__(self, allowed_ext: list, post=None, *args, **kwargs):
         super(CreatePostForm, self).__init__(*args, **kwargs)
-        self.category.choices = [(c.id, c.name) for c in Category.query.all()]
+        self.category.choices = list(reference_data.choices('categories'))
         self.allowed_ext = allowed_ext
         self.post = post
         self.image.validators = [FileAllowed(allowed_ext, 'Unsupported image format')]
     
-    def validate_title(self, field):
-        if self.post is None:
-            if Post.query.filter_by(title=field.data).first():
-                raise ValidationError('title already in use')
-        else:
-            if self.post.title != field.data:
-                if Post.query.filter_by(title=field.data).first():
-                    raise ValidationError('title already in use')
-                    
-    
     def validate_image(self, field):
         """
         identify the format of given image stream, return None if format
         is unrecognized, else return format as file extension
         """
         if type(field.data) == FileStorage:
-            header = field.data.stream.read(512)
+            header = field.data.stream.read(header_size)
             field.data.stream.seek(0)
-            format = imghdr.what(None, header)
+            format = sniff_format(header)
             if field.data.filename:
                 if not format or format not in self.allowed_ext:
                     raise ValidationError('unsupported image format')
@@ -1,5 +1,6 @@
 from flask import request, redirect, url_for
 from flask_login import current_user
+from app.presence import presence
 from . import blog_bp as bp
 
 
@@ -13,3 +14,10 @@ def before_request():
         if current_user.blog is None and\
                 request.endpoint == 'blog.create_post':
             return redirect(url_for('blog.create_blog'))
+
+
+@bp.after_app_request
+def after_request(response):
+    if presence.should_flush():
+        presence.flush()
+    return response
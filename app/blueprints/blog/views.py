@@ -1,29 +1,169 @@
-import os
-import secrets
-from werkzeug.utils import secure_filename
-from flask import request, flash, url_for, current_app, redirect, send_from_directory
+from flask import request, flash, url_for, current_app, redirect, send_from_directory, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models import User, Permission, Post, Category, Blog, Comment
-from app.decorators import template, permission_required
+from app.models.loaders import load_profile
+from app.decorators import template, permission_required, rate_limit
+from app.rate_limit import Limit
+from app.fragment_cache import CacheOptions
+from app.feed import feed
+from app.reference_data import reference_data
+from app.images import images
+from app.pagination import KeysetPagination
+from app.search import search as search_index
+from app.uniqueness import uniqueness, fields as unique_fields, inline_fields
 from app.util import hx_redirect
 from . import blog_bp as bp
 from .forms import CreatePostForm, CreateBlogForm, CreateCommentForm
 
 
+def __feed():
+    categories = feed.categories()
+    category = request.args.get('category')
+    category_id = None
+    if category:
+        category_id = reference_data.id('categories', category)
+        if category_id is None:
+            abort(404)
+    page = feed.page(
+        current_app.config['ENTRIES_PER_PAGE'], category_id, request.args.get('cursor'))
+    return dict(feed=page, categories=categories, category=category, endpoint='blog.feed_page')
+
+
 @bp.route('/')
 @template('blog/index.html')
 def index():
-    return dict()
+    return __feed()
+
+
+@bp.route('/feed')
+@template('fragments/_feed.html')
+def feed_page():
+    return __feed()
+
+
+def __user_version(username):
+    return db.session.execute(
+        db.select(User.updated_at, User.last_seen)
+        .where(User.username == username)).first()
+
+
+def __blog_version(blog_name):
+    return db.session.execute(
+        db.select(Blog.updated_at, User.updated_at)
+        .outerjoin(User, Blog.user_id == User.id)
+        .where(Blog.name == blog_name)).first()
+
+
+def __post_version(id):
+    # the page shows the names of the commenters too
+    commenters = db.select(db.func.max(User.updated_at))\
+        .join(Comment, Comment.user_id == User.id)\
+        .where(Comment.post_id == id).scalar_subquery()
+    return db.session.execute(
+        db.select(Post.updated_at, User.updated_at, commenters)
+        .outerjoin(User, Post.user_id == User.id)
+        .where(Post.id == id)).first()
+
+
+def __following():
+    page = feed.following(
+        current_user.id, current_app.config['ENTRIES_PER_PAGE'], request.args.get('cursor'))
+    return dict(feed=page, endpoint='blog.following_page')
+
+
+@bp.route('/following')
+@login_required
+@template('blog/following.html')
+def following():
+    return __following()
+
+
+@bp.route('/following/feed')
+@login_required
+@template('fragments/_feed.html')
+def following_page():
+    return __following()
 
 
 @bp.route('/profile/<username>')
-@template('blog/profile.html')
+@template(
+    'blog/profile.html',
+    cache=CacheOptions(60, depends=['users', 'blogs', 'posts', 'comments']),
+    validator=__user_version)
 def profile(username):
-    user = User.query.filter_by(username=username).first_or_404()
+    user = User.query.options(*load_profile('user.profile'))\
+        .filter_by(username=username).first_or_404()
     return dict(user=user)
 
 
+def __user_id(username):
+    return db.session.scalar(db.select(User.id).where(User.username == username))
+
+
+def __activity_scope(username):
+    """the panel is only dropped by the posts and comments of its user"""
+    user_id = __user_id(username)
+    return f'user:{user_id}' if user_id is not None else None
+
+
+def __activity(username):
+    """latest comments with the title of their post and latest posts of a user, in one query"""
+    limit = current_app.config['PROFILE_ACTIVITY_LIMIT']
+    user_id = db.select(User.id).where(User.username == username).scalar_subquery()
+    comments = db.select(
+            db.literal('comment').label('kind'), Comment.created_at, Post.id.label('post_id'),
+            Post.title, db.func.substr(Comment.body, 1, 100).label('excerpt'))\
+        .join(Post, Post.id == Comment.post_id)\
+        .where(Comment.user_id == user_id)\
+        .order_by(Comment.created_at.desc())\
+        .limit(limit)\
+        .subquery()
+    posts = db.select(
+            db.literal('post').label('kind'), Post.created_at, Post.id.label('post_id'),
+            Post.title, db.func.substr(Post.body, 1, 100).label('excerpt'))\
+        .where(Post.user_id == user_id)\
+        .order_by(Post.created_at.desc())\
+        .limit(limit)\
+        .subquery()
+    rows = db.session.execute(
+        db.union_all(db.select(comments), db.select(posts))).all()
+    rows.sort(key=lambda row: row.created_at, reverse=True)
+    if not rows and __user_id(username) is None:
+        abort(404)
+    return dict(
+        username=username,
+        comments=[row for row in rows if row.kind == 'comment'],
+        posts=[row for row in rows if row.kind == 'post'])
+
+
+@bp.route('/profile/<username>/activity')
+@template(
+    'fragments/_activity.html',
+    cache=CacheOptions(60, depends=['posts', 'comments'], scope=__activity_scope))
+def profile_activity(username):
+    return __activity(username)
+
+
+def __search():
+    q = request.args.get('q', '').strip()
+    results = search_index.search(
+        q, current_app.config['SEARCH_RESULTS_PER_PAGE'], request.args.get('cursor'))
+    return dict(q=q, results=results)
+
+
+@bp.route('/search')
+@template('blog/search.html', cache=CacheOptions(60, depends=['posts', 'comments']))
+def search():
+    return __search()
+
+
+@bp.route('/search/results')
+@template('fragments/_search-results.html', cache=CacheOptions(60, depends=['posts', 'comments']))
+def search_results():
+    return __search()
+
+
 @bp.route('/create-blog', methods=['GET', 'POST'])
 @login_required
 @permission_required(Permission.WRITE)
@@ -37,37 +177,132 @@ def create_blog():
         blog.name = form.name.data
         blog.user = current_user._get_current_object()
         db.session.add(blog)
-        db.session.commit()
-        flash('you can write posts now', category='success')
-        return hx_redirect(url_for('blog.create_post'))
+        if uniqueness.save(form):
+            flash('you can write posts now', category='success')
+            return hx_redirect(url_for('blog.create_post'))
     return dict(form=form)
 
 
+@bp.route('/available/<name>')
+@rate_limit(Limit('ip', 120, 60), methods=('GET',))
+@template('fragments/_availability.html')
+def availability(name):
+    """inline validation of a unique form field, e.g. /available/username?username=..."""
+    if name not in inline_fields:
+        abort(404)
+    field = unique_fields[name]
+    value = request.args.get(field.field, '').strip()
+    taken = bool(value) and uniqueness.taken(name, value)
+    return dict(message=field.message if taken else None)
+
+
+def __paginate_posts(blog):
+    return KeysetPagination(
+        blog.posts,
+        keys=[Post.created_at, Post.id],
+        per_page=current_app.config['ENTRIES_PER_PAGE'],
+        cursor=request.args.get('cursor'))
+
+
 @bp.route('/<blog_name>')
-@template('blog/view-blog.html')
+@template(
+    'blog/view-blog.html',
+    cache=CacheOptions(60, depends=['users', 'blogs', 'posts', 'comments', 'follows']),
+    validator=__blog_version)
 def view_blog(blog_name):
+    blog = Blog.query.options(*load_profile('blog.page'))\
+        .filter_by(name=blog_name).first_or_404()
+    pagination = __paginate_posts(blog)
+    return dict(blog=blog, posts=pagination.items, pagination=pagination)
+
+
+@bp.route('/<blog_name>/posts')
+@template(
+    'blog/blog-posts.html',
+    cache=CacheOptions(60, depends=['posts', 'comments']),
+    validator=__blog_version)
+def blog_posts(blog_name):
     blog = Blog.query.filter_by(name=blog_name).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    pagination = blog.posts.order_by(Post.created_at.desc()).paginate(
-        page=page,
+    pagination = __paginate_posts(blog)
+    return dict(blog=blog, posts=pagination.items, pagination=pagination)
+
+
+def __category_posts(name):
+    category_id = reference_data.id('categories', name)
+    if category_id is None:
+        abort(404)
+    # served by the (category_id, created_at) index
+    pagination = KeysetPagination(
+        Post.query.filter_by(category_id=category_id),
+        keys=[Post.created_at, Post.id],
         per_page=current_app.config['ENTRIES_PER_PAGE'],
-        error_out=False)
-    posts = pagination.items
-    return dict(blog=blog, posts=posts, pagination=pagination)
+        cursor=request.args.get('cursor'))
+    return dict(
+        category=name, posts=pagination.items, pagination=pagination,
+        posts_url=url_for('blog.category_posts', name=name, cursor=pagination.next_cursor))
+
+
+@bp.route('/category/<name>')
+@template('blog/category.html', cache=CacheOptions(60, depends=['categories', 'posts', 'comments']))
+def category(name):
+    return __category_posts(name)
+
+
+@bp.route('/category/<name>/posts')
+@template('blog/category-posts.html', cache=CacheOptions(60, depends=['categories', 'posts', 'comments']))
+def category_posts(name):
+    return __category_posts(name)
+
+
+def __follow_button(blog, following):
+    can_follow = current_user.can(Permission.FOLLOW) and current_user.id != blog.user_id
+    return dict(blog=blog, following=following, can_follow=can_follow)
+
+
+@bp.route('/<blog_name>/follow-button')
+@template('fragments/_follow-button.html')
+def follow_button(blog_name):
+    blog = Blog.query.filter_by(name=blog_name).first_or_404()
+    following = current_user.is_authenticated and current_user.is_following(blog)
+    return __follow_button(blog, following)
+
+
+@bp.route('/<blog_name>/follow', methods=['POST'])
+@login_required
+@permission_required(Permission.FOLLOW)
+@template('fragments/_follow-button.html')
+def follow(blog_name):
+    blog = Blog.query.filter_by(name=blog_name).first_or_404()
+    if blog.user_id == current_user.id:
+        abort(403)
+    current_user.follow(blog)
+    db.session.commit()
+    return __follow_button(blog, True)
+
 
+@bp.route('/<blog_name>/unfollow', methods=['POST'])
+@login_required
+@permission_required(Permission.FOLLOW)
+@template('fragments/_follow-button.html')
+def unfollow(blog_name):
+    blog = Blog.query.filter_by(name=blog_name).first_or_404()
+    current_user.unfollow(blog)
+    db.session.commit()
+    return __follow_button(blog, False)
 
-def __post_img_url(form):
+
+def __post_image(form):
     if form.image.data is not None and form.image.data.filename:
-        filename = (f'{current_user.id}_' +
-                    f'{secrets.token_urlsafe(4)}_' +
-                    f'{secure_filename(form.image.data.filename)}')
-        img_url = url_for('static', filename=f'images/{filename}', _external=True)
-        form.image.data.save(
-            os.path.join(current_app.config['IMAGE_UPLOAD_PATH'], filename))
-    else:
-        img_url = None
-    
-    return img_url
+        try:
+            return images.store(form.image.data)
+        except (OSError, ValueError) as e:
+            current_app.logger.warning('image upload failed: %r', e)
+    return None
+
+
+def __set_post_image(post, image):
+    post.img_url = url_for('static', filename=f'images/{image.path}', _external=True)
+    post.set_image(image)
 
 
 @bp.route('/write', methods=['GET', 'POST'])
@@ -77,27 +312,27 @@ def __post_img_url(form):
 def create_post():
     form = CreatePostForm(current_app.config['IMAGE_UPLOAD_EXTENSIONS'])
     if form.validate_on_submit():
-        img_url = __post_img_url(form)
-        if img_url is None:
+        image = __post_image(form)
+        if image is None:
             flash('error while handling image upload, image not saved', category='warning')
         post = Post()
         post.title = form.title.data
         post.body = form.body.data
-        post.img_url = img_url
+        if image is not None:
+            __set_post_image(post, image)
         post.author = current_user._get_current_object()
         post.blog = current_user.blog
-        if form.category.data:
-            post.category = Category.query.get(form.category.data)
+        if form.category.data in dict(form.category.choices):
+            post.category_id = form.category.data
         db.session.add(post)
-        db.session.commit()
-        flash('Post have been published', category='success')
-        return hx_redirect(url_for('blog.view_post', id=post.id))
-    else:
-        if request.method == 'POST':
-            flash('an error occurred while publishing the post', category='danger')
-            for field_name, errors in form.errors.items():
-                for msg in errors:
-                    flash(f'{field_name} - {msg}', category='danger')
+        if uniqueness.save(form):
+            flash('Post have been published', category='success')
+            return hx_redirect(url_for('blog.view_post', id=post.id))
+    if request.method == 'POST':
+        flash('an error occurred while publishing the post', category='danger')
+        for field_name, errors in form.errors.items():
+            for msg in errors:
+                flash(f'{field_name} - {msg}', category='danger')
 
     return dict(form=form, endpoint=url_for('blog.create_post'))
 
@@ -113,23 +348,23 @@ def edit_post(id):
         return hx_redirect(url_for('blog.view_post', id=post.id))
     form = CreatePostForm(allowed_ext=current_app.config['IMAGE_UPLOAD_EXTENSIONS'], post=post)
     if form.validate_on_submit():
-        img_url = __post_img_url(form)
+        image = __post_image(form)
+        # loads the image refs, before the post is changed
+        if image is not None:
+            __set_post_image(post, image)
         post.title = form.title.data
         post.body = form.body.data
-        if img_url:
-            post.img_url = img_url
-        if form.category.data:
+        if form.category.data in dict(form.category.choices):
             post.category_id = form.category.data
         db.session.add(post)
-        db.session.commit()
-        flash('Post have been published', category='success')
-        return hx_redirect(url_for('blog.view_post', id=post.id))
-    else:
-        if request.method == 'POST':
-            flash('an error occurred while publishing the post', category='danger')
-            for field_name, errors in form.errors.items():
-                for msg in errors:
-                    flash(f'{field_name} - {msg}', category='danger')
+        if uniqueness.save(form):
+            flash('Post have been published', category='success')
+            return hx_redirect(url_for('blog.view_post', id=post.id))
+    if request.method == 'POST':
+        flash('an error occurred while publishing the post', category='danger')
+        for field_name, errors in form.errors.items():
+            for msg in errors:
+                flash(f'{field_name} - {msg}', category='danger')
     
     form.title.data = post.title
     form.body.data = post.body
@@ -138,13 +373,36 @@ def edit_post(id):
     return dict(form=form, endpoint=url_for('blog.edit_post', id=post.id), img_url=post.img_url)
 
 
+def __paginate_comments(post_id):
+    return KeysetPagination(
+        Comment.query.options(*load_profile('comment.listing')).filter_by(post_id=post_id),
+        keys=[Comment.created_at, Comment.id],
+        per_page=current_app.config['COMMENTS_PER_PAGE'],
+        cursor=request.args.get('cursor'))
+
+
 @bp.route('/post/<int:id>')
-@template('blog/post.html')
+@template(
+    'blog/post.html',
+    cache=CacheOptions(60, depends=['users', 'blogs', 'posts', 'comments'], anonymous_only=True),
+    validator=__post_version)
 def view_post(id):
-    post = Post.query.get_or_404(id)
+    post = Post.query.options(*load_profile('post.page')).get_or_404(id)
     form = CreateCommentForm()
-    comments = post.comments.order_by(Comment.created_at.desc()).all()
-    return dict(post=post, comment_form=form, comments=comments)
+    pagination = __paginate_comments(id)
+    return dict(
+        post=post, comment_form=form, comments=pagination.items, pagination=pagination)
+
+
+@bp.route('/post/<int:id>/comments')
+@template(
+    'fragments/_comments.html',
+    cache=CacheOptions(60, depends=['users', 'posts', 'comments']),
+    validator=__post_version)
+def post_comments(id):
+    db.first_or_404(db.select(Post.id).where(Post.id == id))
+    pagination = __paginate_comments(id)
+    return dict(post_id=id, comments=pagination.items, pagination=pagination)
 
 
 @bp.route('/delete-post', methods=['POST'])
@@ -152,7 +410,7 @@ def view_post(id):
 @permission_required(Permission.WRITE)
 def delete_post():
     id = request.form.get('id', type=int)
-    post = Post.query.get_or_404(id)
+    post = Post.query.options(*load_profile('post.page')).get_or_404(id)
     blog_name = post.blog.name
     if not current_user.is_admin() and\
             current_user.id != post.author.id:
@@ -182,9 +440,9 @@ def create_comment(id):
 @bp.route('/delete-comment/<int:id>', methods=['POST'])
 @login_required
 @permission_required(Permission.COMMENT)
-def delete_comment(post_id):
-    id = request.form.get('id', type=int)
+def delete_comment(id):
     comment = Comment.query.get_or_404(id)
+    post_id = comment.post_id
     if not current_user.is_admin() and\
             current_user.id != comment.user_id:
         return redirect(url_for('blog.index'))
@@ -1,5 +1,6 @@
 import os
 import os.path
+import click
 from flask import Flask
 
 
@@ -29,3 +30,191 @@ def register_cli(app: Flask) -> None:
         import unittest
         tests = unittest.TestLoader().discover('tests')
         unittest.TextTestRunner(verbosity=2).run(tests)
+
+
+    @app.cli.command('render-posts')
+    @click.option('--chunk-size', default=500, help='Number of posts rendered per batch.')
+    def render_posts(chunk_size):
+        """Re-render the html body of all posts."""
+        from app.rendering import rerender_posts
+
+        def progress(done, total):
+            print(f'Rendered {done}/{total} posts.')
+
+        count = rerender_posts(chunk_size, progress)
+        print(f'Done, {count} posts rendered.')
+
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--chunk-size', default=1000, help='Number of rows written per batch.')
+    def reconcile(chunk_size):
+        """Recompute the post and comment counters."""
+        from app.counters import reconcile_counters
+        for name, count in reconcile_counters(chunk_size).items():
+            print(f'{name}: {count} rows fixed.')
+
+
+    @app.cli.command('fake')
+    @click.option('--users', default=100, help='Number of users, each with a blog.')
+    @click.option('--posts', default=1000, help='Number of posts.')
+    @click.option('--comments', default=10000, help='Number of comments.')
+    @click.option('--categories', default=10, help='Number of categories.')
+    @click.option('--seed', default=0, help='Seed of the generated data.')
+    @click.option('--chunk-size', default=5000, help='Number of rows inserted per batch.')
+    def fake(users, posts, comments, categories, seed, chunk_size):
+        """Insert fake data, the password of the fake users is "password"."""
+        from app.fake import generate
+
+        def progress(name, count):
+            print(f'Inserted {count} {name}.')
+
+        counts = generate(users, posts, comments, categories, seed, chunk_size, progress)
+        print('Done, ' + ', '.join(f'{count} {name}' for name, count in counts.items()) + '.')
+
+
+    @app.cli.command('bench')
+    @click.option('--requests', default=200, help='Number of measured requests per scenario.')
+    @click.option('--scenario', multiple=True, help='Scenario to run, all by default.')
+    @click.option('--baseline', default=os.path.join('data', 'benchmark-baseline.json'),
+                  help='Baseline file the results are compared to.')
+    @click.option('--save', is_flag=True, help='Save the results as the new baseline.')
+    @click.option('--tolerance', default=0.2, help='Allowed p95 latency increase, 0.2 is 20%.')
+    def bench(requests, scenario, baseline, save, tolerance):
+        """Measure latency and queries of the hot endpoints."""
+        from app.benchmark import Benchmark, scenarios, save_baseline, load_baseline, compare
+        results = Benchmark(app, requests).run(scenario or scenarios)
+        print(f'{"scenario":<16}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>10}{"errors":>8}')
+        for name, result in results.items():
+            print(
+                f'{name:<16}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["p99_ms"]:>10.2f}{result["queries_per_request"]:>10}{result["errors"]:>8}')
+        if save:
+            save_baseline(results, baseline)
+            print(f'Saved baseline to {baseline}.')
+        elif os.path.exists(baseline):
+            regressions = compare(results, load_baseline(baseline), tolerance)
+            for regression in regressions:
+                print(f'Regression: {regression}')
+            if regressions:
+                raise SystemExit(1)
+            print('No regression.')
+
+
+    @app.cli.command('mail-worker')
+    @click.option('--once', is_flag=True, help='Send the due emails and exit.')
+    def mail_worker(once):
+        """Send the emails queued in the outbox."""
+        from app.outbox import outbox
+        if once:
+            print(f'Sent {outbox.drain()} emails.')
+        else:
+            print('Mail worker started, press CTRL+C to quit.')
+            try:
+                outbox.work()
+            except KeyboardInterrupt:
+                pass
+        for name, value in outbox.stats().items():
+            print(f'{name}: {value}')
+
+
+    @app.cli.command('fanout-worker')
+    @click.option('--once', is_flag=True, help='Run the due jobs and exit.')
+    def fanout_worker(once):
+        """Deliver new posts to the timelines of their followers."""
+        from app.fanout import fanout
+        if once:
+            print(f'Delivered {fanout.drain()} timeline entries.')
+        else:
+            print('Fan-out worker started, press CTRL+C to quit.')
+            try:
+                fanout.work()
+            except KeyboardInterrupt:
+                pass
+        for name, value in fanout.stats().items():
+            print(f'{name}: {value}')
+
+
+    @app.cli.group('passwords')
+    def passwords_cli():
+        """Manage password hashing."""
+
+
+    @passwords_cli.command('bench')
+    @click.option('--method', multiple=True,
+                  help='Hashing method to measure, e.g. pbkdf2:sha256:600000, the configured one by default.')
+    @click.option('--duration', default=2.0, help='Seconds each method is measured for.')
+    @click.option('--processes', default=None, type=int, help='Number of processes, one per core by default.')
+    def passwords_bench(method, duration, processes):
+        """Measure the hashes per second per core of hashing methods."""
+        from app.passwords import benchmark
+        results = benchmark(method or [app.config['PASSWORD_HASH_METHOD']], duration, processes)
+        print(f'{"method":<28}{"per core/s":>12}{"total/s":>12}{"cores":>8}')
+        for name, result in results.items():
+            print(f'{name:<28}{result["per_core"]:>12.2f}{result["total"]:>12.2f}{result["cores"]:>8}')
+
+
+    @app.cli.group('images')
+    def images_cli():
+        """Manage uploaded images."""
+
+
+    @images_cli.command('variants')
+    def image_variants():
+        """Generate the missing variants of uploaded images."""
+        from app.images import images, is_variant, sniff_format, header_size
+        count = 0
+        for dirpath, _, filenames in os.walk(app.config['IMAGE_UPLOAD_PATH']):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if filename.startswith('.') or is_variant(filename):
+                    continue
+                with open(path, 'rb') as f:
+                    if sniff_format(f.read(header_size)) is None:
+                        continue
+                if not images.variants(filename):
+                    images.process(path)
+                    count += 1
+        images.shutdown()
+        print(f'Done, {count} images processed.')
+
+
+    @images_cli.command('gc')
+    @click.option('--grace', default=None, type=int,
+                  help='Keep images uploaded within this many seconds, default IMAGE_GC_GRACE.')
+    @click.option('--batch-size', default=1000, help='Number of images removed per batch.')
+    def image_gc(grace, batch_size):
+        """Remove the images no longer referenced by a post."""
+        from app.images import images
+        print(f'Done, {images.gc(grace, batch_size)} images removed.')
+
+
+    @app.cli.group('assets')
+    def assets_cli():
+        """Manage static assets."""
+
+
+    @assets_cli.command('build')
+    def build_assets():
+        """Fingerprint static files and precompress text files."""
+        from app.assets import assets, brotli
+        files, compressed = assets.build()
+        print(f'Done, {files} files in the manifest, {compressed} files compressed.')
+        if brotli is None:
+            print('brotli is not installed, .br files were skipped.')
+
+
+    @app.cli.group('search')
+    def search_cli():
+        """Manage the search index."""
+
+
+    @search_cli.command('rebuild')
+    @click.option('--chunk-size', default=1000, help='Number of rows indexed per batch.')
+    def rebuild_search(chunk_size):
+        """Index all posts and comments again."""
+        from app.search import search
+
+        def progress(done, total):
+            print(f'Indexed {done}/{total} posts and comments.')
+
+        print(f'Done, {search.rebuild(chunk_size, progress)} posts and comments indexed.')
@@ -0,0 +1,64 @@
+import json
+import time
+import hashlib
+from datetime import datetime, timezone
+from flask import Response, request, session, current_app
+from flask_login import current_user
+
+
+def _identity() -> str:
+    """the part of the full page that changes per user"""
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    # pages of authenticated users embed csrf tokens, which expire, and the
+    # controls their permissions allow
+    window = int(time.time() // max(current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600, 1))
+    return f'user:{current_user.get_id()}:{current_user.permissions}:{window}'
+
+
+def compute_validators(version: tuple) -> tuple[str, datetime|None]:
+    """
+    Return the ETag and Last-Modified date of the current request's response,
+    given the version of the content returned by the view's validator
+    """
+    parts = [
+        request.endpoint,
+        sorted(request.view_args.items()),
+        sorted(request.args.items(multi=True)),
+        bool(request.headers.get('HX-Request')),
+        _identity(),
+        list(version)]
+    etag = hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+    dates = [
+        v if v.tzinfo else v.replace(tzinfo=timezone.utc)
+        for v in version if isinstance(v, datetime)]
+    return etag, max(dates) if dates else None
+
+
+def is_cacheable() -> bool:
+    """Conditional responses only apply to GET requests without pending flashed messages"""
+    return request.method in ('GET', 'HEAD') and not session.get('_flashes')
+
+
+def not_modified(etag: str, last_modified: datetime|None) -> bool:
+    """Check the request's If-None-Match / If-Modified-Since headers"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    # dates don't account for the user specific parts of the page
+    if request.if_modified_since and last_modified is not None and \
+            not current_user.is_authenticated:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def set_validators(resp: Response, etag: str, last_modified: datetime|None) -> Response:
+    """Add the validators and caching headers to the response"""
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    resp.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        resp.cache_control.private = True
+    resp.vary.add('HX-Request')
+    resp.vary.add('Cookie')
+    return resp
@@ -0,0 +1,41 @@
+from sqlalchemy import select, update, func, bindparam
+from app import db
+from app.fragment_cache import fragment_cache
+
+
+def _counters() -> list[tuple]:
+    from app.models import User, Blog, Post, Comment, Follow
+    return [
+        # counter column, counted rows grouped by
+        (Post.__table__.c.comment_count, Comment.__table__.c.post_id),
+        (Blog.__table__.c.post_count, Post.__table__.c.blog_id),
+        (Blog.__table__.c.follower_count, Follow.__table__.c.blog_id),
+        (User.__table__.c.post_count, Post.__table__.c.user_id),
+        (User.__table__.c.comment_count, Comment.__table__.c.user_id)]
+
+
+def reconcile_counters(chunk_size: int=1000) -> dict:
+    """
+    Recompute the denormalized counters with one grouped aggregate per counter,
+    only the rows whose counter drifted are written, in bulk UPDATEs of
+    chunk_size rows, return the number of fixed rows of each counter
+    """
+    fixed = {}
+    for counter, key in _counters():
+        table = counter.table
+        counts = dict(db.session.execute(
+            select(key, func.count()).where(key.is_not(None)).group_by(key)).all())
+        changes = [
+            {'row_id': row_id, 'value': counts.get(row_id, 0)}
+            for row_id, value in db.session.execute(select(table.c.id, counter))
+            if value != counts.get(row_id, 0)]
+        stmt = update(table)\
+            .where(table.c.id == bindparam('row_id'))\
+            .values({counter.key: bindparam('value')})
+        for i in range(0, len(changes), chunk_size):
+            db.session.execute(stmt, changes[i:i + chunk_size])
+            db.session.commit()
+        fixed[f'{table.name}.{counter.key}'] = len(changes)
+    # bulk updates skip the session events
+    fragment_cache.invalidate('posts', 'blogs', 'users')
+    return fixed
@@ -1,22 +1,50 @@
 from functools import wraps
-from flask import request, render_template, Response, abort
+from math import ceil
+from typing import Callable
+from markupsafe import Markup
+from flask import request, render_template, make_response, Response, abort
 from flask_login import current_user
 from app.models import Permission
+from app.fragment_cache import fragment_cache, CacheOptions
+from app.rate_limit import rate_limiter, Limit
+from app.conditional import compute_validators, is_cacheable, not_modified, set_validators
 
 
-def template(temp_name: str=None, status_code: int=200):
-    """return the template if request type is hypermedia, else return the full page"""
+def template(
+        temp_name: str=None, status_code: int=200, cache: CacheOptions=None,
+        validator: Callable[..., tuple|None]=None):
+    """
+    return the template if request type is hypermedia, else return the full page,
+    the rendered template is cached if cache options are given, if a validator is
+    given it's called with the view args and returns a cheap version of the content
+    (e.g. updated_at columns), used to answer with 304 without calling the view
+    """
     def decorator(f):
         @wraps(f)
         def decorated_func(*args, **kwargs):
-            # catch the data returned by the view
-            data = f(*args, **kwargs)
-            if type(data) == Response:
-                return data
-            if request.headers.get('HX-Request'):
-                resp = render_template(temp_name, **data), status_code
-            else:
-                resp = render_template('_wrapper.html', partial=temp_name, data=data), status_code
+            etag = last_modified = None
+            if validator is not None and status_code == 200 and is_cacheable():
+                version = validator(**kwargs)
+                if version is not None:
+                    etag, last_modified = compute_validators(version)
+                    if not_modified(etag, last_modified):
+                        return set_validators(Response(status=304), etag, last_modified)
+
+            key = fragment_cache.key(cache) if cache is not None else None
+            html = fragment_cache.get(key) if key is not None else None
+            if html is None:
+                # catch the data returned by the view
+                data = f(*args, **kwargs)
+                if type(data) == Response:
+                    return data
+                html = render_template(temp_name, **data)
+                if key is not None:
+                    fragment_cache.set(key, html, cache.ttl)
+            if not request.headers.get('HX-Request'):
+                html = render_template('_wrapper.html', content=Markup(html))
+            resp = make_response(html, status_code)
+            if etag is not None:
+                set_validators(resp, etag, last_modified)
             return resp
         return decorated_func
     return decorator
@@ -37,3 +65,21 @@ def permission_required(permission: int):
 def admin_required(f):
     """abort with 403 if current user is not admin"""
     return permission_required(Permission.ADMIN)(f)
+
+
+def rate_limit(*limits: Limit, methods: tuple=('POST',)):
+    """
+    abort with 429 if the request exceeds one of the given limits, e.g.
+    `@rate_limit(Limit('ip', 20, 60), Limit('email', 5, 60))`, only requests
+    with given methods are counted
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_func(*args, **kwargs):
+            if request.method in methods:
+                wait = rate_limiter.hit(limits)
+                if wait:
+                    abort(429, retry_after=ceil(wait))
+            return f(*args, **kwargs)
+        return decorated_func
+    return decorator
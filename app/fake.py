@@ -0,0 +1,160 @@
+import random
+import hashlib
+from datetime import timedelta
+from typing import Callable
+from sqlalchemy import select, insert, func
+from app import db
+from app.util import utcnow
+
+
+# password of all the generated users
+password = 'password'
+
+
+def _next_id(model) -> int:
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _insert(table, rows: list[dict], chunk_size: int) -> None:
+    """Insert rows with executemany in chunks, one transaction per chunk"""
+    for i in range(0, len(rows), chunk_size):
+        db.session.execute(insert(table), rows[i:i + chunk_size])
+        db.session.commit()
+
+
+def generate(
+        users: int=100, posts: int=1000, comments: int=10000, categories: int=10,
+        seed: int=0, chunk_size: int=5000, progress: Callable[[str, int], None]=None) -> dict:
+    """
+    Bulk insert fake users (each with a blog), categories, posts and comments
+    with Core executemany inserts, the rows are added to the existing ones,
+    generated users' password is `password`, the same seed generates the same
+    data, the timeline, search index and counters maintained by the mapper
+    events are filled in afterwards, return inserted rows counts
+    """
+    from faker import Faker
+    from app.models import User, Role, Blog, Post, Category, Comment, TimelineEntry
+    from app.rendering import renderer
+    from app.search import search
+    from app.counters import reconcile_counters
+    from app.fragment_cache import fragment_cache
+    from app.reference_data import reference_data
+    from app.passwords import passwords
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    rand = random.Random(seed)
+    now = utcnow().replace(tzinfo=None)
+    start = now - timedelta(days=365)
+
+    def moment(after=start):
+        return after + timedelta(seconds=rand.randrange(max(int((now - after).total_seconds()), 1)))
+
+    def report(name, count):
+        if progress is not None:
+            progress(name, count)
+
+    # texts are drawn from pools, rendering every body would dominate the run
+    bodies = [
+        '\n\n'.join(fake.paragraphs(nb=rand.randint(2, 6))) for _ in range(min(posts, 200) or 1)]
+    bodies_html = [renderer.render(body) for body in bodies]
+    comment_bodies = [fake.sentence(nb_words=rand.randint(4, 24)) for _ in range(500)]
+    # hashing is slow by design, all the users share one
+    password_hash = passwords.hash(password)
+    role_id = db.session.scalar(select(Role.id).where(Role.default == True))
+
+    category_id = _next_id(Category)
+    category_rows = []
+    names = set(db.session.scalars(select(Category.name)))
+    while len(category_rows) < categories:
+        name = fake.unique.word()[:24]
+        if name not in names:
+            names.add(name)
+            category_rows.append({'id': category_id + len(category_rows), 'name': name})
+    _insert(Category.__table__, category_rows, chunk_size)
+    category_ids = [row['id'] for row in category_rows] or \
+        list(db.session.scalars(select(Category.id))) or [None]
+    report('categories', len(category_rows))
+
+    user_id = _next_id(User)
+    blog_id = _next_id(Blog)
+    user_rows = []
+    blog_rows = []
+    for i in range(users):
+        id = user_id + i
+        username = f'{fake.user_name()[:48]}{id}'
+        email = f'{username}@example.com'
+        member_since = moment()
+        user_rows.append({
+            'id': id, 'username': username, 'email': email,
+            'location': fake.city(), 'about_me': fake.sentence(),
+            'member_since': member_since, 'last_seen': moment(member_since),
+            'updated_at': member_since, 'confirmed': True, 'password_hash': password_hash,
+            'avatar_hash': hashlib.md5(email.encode('utf-8')).hexdigest(), 'role_id': role_id,
+            'post_count': 0, 'comment_count': 0})
+        blog_rows.append({
+            'id': blog_id + i, 'name': f'blog{id}', 'user_id': id, 'updated_at': member_since,
+            'post_count': 0, 'follower_count': 0})
+    _insert(User.__table__, user_rows, chunk_size)
+    report('users', len(user_rows))
+    _insert(Blog.__table__, blog_rows, chunk_size)
+    report('blogs', len(blog_rows))
+    if not blog_rows:
+        blog_rows = [
+            {'id': id, 'user_id': owner, 'updated_at': start}
+            for id, owner in db.session.execute(select(Blog.id, Blog.user_id))]
+    if not blog_rows and (posts or comments):
+        raise ValueError('posts need blogs, generate some users')
+    user_ids = [row['user_id'] for row in blog_rows]
+
+    post_id = _next_id(Post)
+    post_rows = []
+    for i in range(posts):
+        blog = blog_rows[rand.randrange(len(blog_rows))]
+        created_at = moment(blog['updated_at'])
+        body = rand.randrange(len(bodies))
+        post_rows.append({
+            'id': post_id + i, 'title': f'{fake.sentence(nb_words=rand.randint(3, 8))[:100]} #{post_id + i}',
+            'body': bodies[body], 'body_html': bodies_html[body],
+            'created_at': created_at, 'updated_at': created_at, 'comment_count': 0,
+            'blog_id': blog['id'], 'user_id': blog['user_id'],
+            'category_id': category_ids[rand.randrange(len(category_ids))]})
+    _insert(Post.__table__, post_rows, chunk_size)
+    report('posts', len(post_rows))
+    post_refs = [(row['id'], row['created_at']) for row in post_rows] or \
+        list(db.session.execute(select(Post.id, Post.created_at)))
+    if not post_refs and comments:
+        raise ValueError('comments need posts')
+
+    comment_id = _next_id(Comment)
+    inserted = 0
+    # comments are built chunk by chunk, millions of dicts don't fit in memory
+    while inserted < comments:
+        rows = []
+        for i in range(inserted, min(inserted + chunk_size, comments)):
+            post, posted_at = post_refs[rand.randrange(len(post_refs))]
+            rows.append({
+                'id': comment_id + i, 'body': comment_bodies[rand.randrange(len(comment_bodies))],
+                'created_at': moment(posted_at), 'user_id': user_ids[rand.randrange(len(user_ids))],
+                'post_id': post})
+        _insert(Comment.__table__, rows, chunk_size)
+        inserted += len(rows)
+        report('comments', inserted)
+
+    # rows the mapper events would have written
+    timeline = TimelineEntry.__table__
+    posts_table = Post.__table__
+    db.session.execute(insert(timeline).from_select(
+        ['post_id', 'created_at', 'blog_id', 'category_id'],
+        select(posts_table.c.id, posts_table.c.created_at, posts_table.c.blog_id, posts_table.c.category_id)
+        .where(posts_table.c.id >= post_id)))
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        search.rebuild(chunk_size)
+    reconcile_counters(chunk_size)
+    # bulk inserts skip the session events
+    fragment_cache.invalidate('categories', 'comments')
+    reference_data.invalidate('categories')
+    return dict(
+        categories=len(category_rows), users=len(user_rows), blogs=len(user_rows),
+        posts=len(post_rows), comments=comments)
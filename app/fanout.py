@@ -0,0 +1,286 @@
+import secrets
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import select, update, delete, exists, func, literal
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Post, Blog, Follow, InboxEntry, FanoutJob
+from app.util import utcnow
+
+
+class _FanoutState():
+    """Per application worker pool and counters"""
+    def __init__(self):
+        self.lock = Lock()
+        self.wake = Event()
+        self.stop = Event()
+        self.threads = []
+        self.jobs = 0
+        self.delivered = 0
+        self.skipped = 0
+
+
+def is_celebrity(follower_count: int|None) -> bool:
+    """Check if posts of a blog with given followers are merged on read instead of delivered"""
+    return (follower_count or 0) >= current_app.config['FANOUT_THRESHOLD']
+
+
+class Fanout():
+    """
+    Delivery of new posts to the personal timelines of their blog's followers,
+    a job is queued in the `fanout_jobs` table in the transaction creating the
+    post and a bounded pool of worker threads (or `flask fanout-worker`) copies
+    the post into the `inbox` rows of the followers in batches, so creating a
+    post doesn't get slower with the number of followers
+
+    Blogs with `FANOUT_THRESHOLD` followers or more are not delivered, their
+    posts are read from the timeline and merged into the inbox of each reader
+    (see `Feed.following`), writing them would cost a row per follower, when a
+    blog drops below the threshold its posts skipped meanwhile are queued again
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('FANOUT_WORKERS', 2)
+        app.config.setdefault('FANOUT_THRESHOLD', 1000)
+        app.config.setdefault('FANOUT_BATCH_SIZE', 1000)
+        app.config.setdefault('FANOUT_BACKFILL', 20)
+        app.config.setdefault('FANOUT_LEASE', 120)
+        app.config.setdefault('FANOUT_POLL_INTERVAL', 5)
+        app.extensions['fanout'] = _FanoutState()
+        if not db.event.contains(Session, 'after_commit', _wake_workers):
+            db.event.listen(Post, 'after_insert', _on_post_inserted)
+            db.event.listen(Post, 'after_update', _on_post_updated)
+            db.event.listen(Post, 'before_delete', _on_post_deleted)
+            db.event.listen(Follow, 'after_insert', _on_followed)
+            db.event.listen(Follow, 'after_delete', _on_unfollowed)
+            db.event.listen(Session, 'after_commit', _wake_workers)
+            db.event.listen(Session, 'after_rollback', _discard_jobs)
+
+    @property
+    def _state(self) -> _FanoutState:
+        return current_app.extensions['fanout']
+
+    def claim(self, batch_size: int) -> list[FanoutJob]:
+        """Lease a batch of due jobs to the caller"""
+        jobs = FanoutJob.__table__
+        now = utcnow()
+        token = secrets.token_hex(16)
+        due = select(jobs.c.id)\
+            .where(jobs.c.next_attempt_at <= now)\
+            .order_by(jobs.c.id)\
+            .limit(batch_size)
+        db.session.execute(
+            update(jobs)
+            .where(jobs.c.id.in_(due), jobs.c.next_attempt_at <= now)
+            .values(
+                claim=token,
+                attempts=jobs.c.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=current_app.config['FANOUT_LEASE'])))
+        db.session.commit()
+        return FanoutJob.query.filter_by(claim=token).order_by(FanoutJob.id).all()
+
+    def deliver(self, job: FanoutJob) -> int:
+        """
+        Copy the post of the job into the inboxes of its blog's followers, one
+        batch of followers per transaction, rows delivered by a previous
+        attempt are skipped, return delivered rows count
+        """
+        inbox = InboxEntry.__table__
+        follows = Follow.__table__
+        posts = Post.__table__
+        batch_size = current_app.config['FANOUT_BATCH_SIZE']
+        job_id, post_id, blog_id = job.id, job.post_id, job.blog_id
+        follower_count = db.session.scalar(
+            select(Blog.follower_count).where(Blog.id == blog_id))
+        delivered = 0
+        if not is_celebrity(follower_count):
+            last_id = 0
+            while True:
+                ids = db.session.scalars(
+                    select(follows.c.follower_id)
+                    .where(follows.c.blog_id == blog_id, follows.c.follower_id > last_id)
+                    .order_by(follows.c.follower_id)
+                    .limit(batch_size)).all()
+                if not ids:
+                    break
+                # the post may be deleted since the job was queued
+                rows = select(follows.c.follower_id, posts.c.id, posts.c.created_at, posts.c.blog_id)\
+                    .join(posts, posts.c.id == post_id)\
+                    .where(
+                        follows.c.blog_id == blog_id,
+                        follows.c.follower_id.between(ids[0], ids[-1]),
+                        ~exists().where(
+                            inbox.c.user_id == follows.c.follower_id,
+                            inbox.c.post_id == posts.c.id))
+                result = db.session.execute(
+                    inbox.insert().from_select(['user_id', 'post_id', 'created_at', 'blog_id'], rows))
+                db.session.commit()
+                delivered += max(result.rowcount, 0)
+                last_id = ids[-1]
+        db.session.execute(delete(FanoutJob.__table__).where(FanoutJob.__table__.c.id == job_id))
+        db.session.commit()
+
+        state = self._state
+        with state.lock:
+            state.jobs += 1
+            state.delivered += delivered
+            state.skipped += is_celebrity(follower_count)
+        return delivered
+
+    def drain(self) -> int:
+        """Run due jobs until none is left, return delivered rows count"""
+        delivered = 0
+        while True:
+            jobs = self.claim(20)
+            if not jobs:
+                return delivered
+            for job in jobs:
+                delivered += self.deliver(job)
+
+    def work(self) -> None:
+        """Run jobs until stopped, waiting for new posts in between"""
+        app = current_app._get_current_object()
+        state = self._state
+        while not state.stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                app.logger.exception('fan-out worker failed')
+            finally:
+                db.session.remove()
+            state.wake.wait(app.config['FANOUT_POLL_INTERVAL'])
+            state.wake.clear()
+
+    def _run_worker(self, app: Flask) -> None:
+        with app.app_context():
+            self.work()
+
+    def start_workers(self) -> None:
+        """Start the worker threads of the application if they are not running"""
+        state = self._state
+        with state.lock:
+            if state.threads:
+                return
+            app = current_app._get_current_object()
+            for i in range(app.config['FANOUT_WORKERS']):
+                thr = Thread(
+                    target=self._run_worker, args=[app], name=f'fanout-{i}', daemon=True)
+                thr.start()
+                state.threads.append(thr)
+
+    def stop_workers(self, timeout: float=None) -> None:
+        """Stop the worker threads after their current job"""
+        state = self._state
+        state.stop.set()
+        state.wake.set()
+        for thr in state.threads:
+            thr.join(timeout)
+        state.threads = []
+        state.stop.clear()
+
+    def stats(self) -> dict:
+        """Return queue depth metrics and this process' delivery counters"""
+        jobs = FanoutJob.__table__
+        pending, oldest = db.session.execute(
+            select(func.count(), func.min(jobs.c.created_at))).one()
+        state = self._state
+        with state.lock:
+            return dict(
+                pending=pending,
+                oldest_pending=oldest,
+                jobs=state.jobs,
+                delivered=state.delivered,
+                skipped=state.skipped)
+
+
+fanout = Fanout()
+
+
+def _on_post_inserted(mapper, connection, target):
+    if target.blog_id is None:
+        return
+    connection.execute(FanoutJob.__table__.insert().values(post_id=target.id, blog_id=target.blog_id))
+    session = db.object_session(target)
+    if session is not None:
+        session.info['fanout_jobs'] = True
+
+
+def _on_post_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in ('created_at', 'blog_id')):
+        return
+    inbox = InboxEntry.__table__
+    connection.execute(
+        inbox.update()
+        .where(inbox.c.post_id == target.id)
+        .values(created_at=target.created_at, blog_id=target.blog_id))
+
+
+def _on_post_deleted(mapper, connection, target):
+    inbox = InboxEntry.__table__
+    jobs = FanoutJob.__table__
+    connection.execute(inbox.delete().where(inbox.c.post_id == target.id))
+    connection.execute(jobs.delete().where(jobs.c.post_id == target.id))
+
+
+def _on_followed(mapper, connection, target):
+    """Deliver the latest posts of a newly followed blog, they are merged on read for celebrities"""
+    follower_count = connection.scalar(
+        select(Blog.follower_count).where(Blog.id == target.blog_id))
+    if is_celebrity(follower_count):
+        return
+    posts = Post.__table__
+    latest = select(literal(target.follower_id), posts.c.id, posts.c.created_at, posts.c.blog_id)\
+        .where(posts.c.blog_id == target.blog_id)\
+        .order_by(posts.c.created_at.desc(), posts.c.id.desc())\
+        .limit(current_app.config['FANOUT_BACKFILL'])
+    connection.execute(InboxEntry.__table__.insert().from_select(
+        ['user_id', 'post_id', 'created_at', 'blog_id'], latest))
+
+
+def _on_unfollowed(mapper, connection, target):
+    inbox = InboxEntry.__table__
+    connection.execute(
+        inbox.delete()
+        .where(inbox.c.user_id == target.follower_id, inbox.c.blog_id == target.blog_id))
+    # the counter is already decremented by `Follow.on_deleted`
+    follower_count = connection.scalar(
+        select(Blog.follower_count).where(Blog.id == target.blog_id))
+    if not is_celebrity(follower_count) and is_celebrity(follower_count + 1):
+        _queue_skipped(connection, target)
+
+
+def _queue_skipped(connection, target):
+    """
+    Queue the posts of a blog dropping below the threshold which were never
+    delivered, they are no longer merged on read
+    """
+    posts = Post.__table__
+    inbox = InboxEntry.__table__
+    jobs = FanoutJob.__table__
+    now = utcnow()
+    skipped = select(posts.c.id, posts.c.blog_id, literal(now), literal(now), literal(0))\
+        .where(
+            posts.c.blog_id == target.blog_id,
+            ~exists().where(inbox.c.post_id == posts.c.id),
+            ~exists().where(jobs.c.post_id == posts.c.id))
+    result = connection.execute(jobs.insert().from_select(
+        ['post_id', 'blog_id', 'created_at', 'next_attempt_at', 'attempts'], skipped))
+    session = db.object_session(target)
+    if session is not None and result.rowcount:
+        session.info['fanout_jobs'] = True
+
+
+def _wake_workers(session):
+    if session.info.pop('fanout_jobs', False) and has_app_context() and \
+            current_app.config['FANOUT_WORKERS'] > 0:
+        fanout.start_workers()
+        current_app.extensions['fanout'].wake.set()
+
+
+def _discard_jobs(session):
+    session.info.pop('fanout_jobs', None)
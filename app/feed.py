@@ -0,0 +1,225 @@
+import time
+import heapq
+from threading import Lock
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app import db
+from app.pagination import encode_cursor, decode_cursor, _after
+from app.reference_data import reference_data
+
+
+class FeedItem():
+    """A post of the feed with the data shown on its card"""
+    __slots__ = ('post_id', 'created_at', 'blog_id', 'category_id', 'title', 'excerpt', 'img_url', 'blog_name')
+
+    def __init__(self, post_id, created_at, blog_id, category_id, title, excerpt, img_url, blog_name):
+        self.post_id = post_id
+        self.created_at = created_at
+        self.blog_id = blog_id
+        self.category_id = category_id
+        self.title = title
+        self.excerpt = excerpt
+        self.img_url = img_url
+        self.blog_name = blog_name
+
+    @property
+    def key(self) -> tuple:
+        return (self.created_at, self.post_id)
+
+
+class FeedPage():
+    """A page of the feed, newest first, paged with a cursor on (created_at, post_id)"""
+    def __init__(self, items: list[FeedItem], has_next: bool, from_memory: bool):
+        self.items = items
+        self.has_next = has_next
+        self.from_memory = from_memory
+
+    @property
+    def next_cursor(self) -> str|None:
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(list(self.items[-1].key), 'next')
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class _FeedState():
+    """Per application head of the feed"""
+    def __init__(self):
+        self.lock = Lock()
+        self.head = None
+        self.complete = False  # the head holds the whole timeline
+        self.loaded_at = 0.0
+        self.loads = 0
+
+
+class Feed():
+    """
+    Home feed of the posts of all blogs, read from the `timeline` table in
+    keyset pages, the newest `FEED_HEAD_SIZE` entries are kept in memory with
+    the data of their cards so the first pages need no queries, the head is
+    reloaded after `FEED_HEAD_TTL` seconds, or on commit of a post change made
+    by this process
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('FEED_HEAD_SIZE', 200)
+        app.config.setdefault('FEED_HEAD_TTL', 10)
+        app.extensions['feed'] = _FeedState()
+        if not db.event.contains(Session, 'after_commit', _invalidate_changes):
+            from app.models import Post
+            for event_name in ('after_insert', 'after_update', 'after_delete'):
+                db.event.listen(Post, event_name, _record_change)
+            db.event.listen(Session, 'after_commit', _invalidate_changes)
+            db.event.listen(Session, 'after_rollback', _discard_changes)
+
+    @property
+    def _state(self) -> _FeedState:
+        return current_app.extensions['feed']
+
+    def _select(self):
+        from app.models import TimelineEntry, Post, Blog
+        timeline = TimelineEntry.__table__
+        return select(
+                timeline.c.post_id, timeline.c.created_at, timeline.c.blog_id, timeline.c.category_id,
+                Post.title, func.substr(Post.body, 1, 100), Post.img_url, Blog.name)\
+            .select_from(timeline)\
+            .join(Post, Post.id == timeline.c.post_id)\
+            .outerjoin(Blog, Blog.id == timeline.c.blog_id)
+
+    def _keys(self) -> list:
+        from app.models import TimelineEntry
+        return [TimelineEntry.created_at, TimelineEntry.post_id]
+
+    def _load(self) -> _FeedState:
+        state = self._state
+        ttl = current_app.config['FEED_HEAD_TTL']
+        if state.head is not None and time.monotonic() - state.loaded_at < ttl:
+            return state
+        size = current_app.config['FEED_HEAD_SIZE']
+        rows = db.session.execute(
+            self._select().order_by(*[key.desc() for key in self._keys()]).limit(size)).all()
+        with state.lock:
+            state.head = [FeedItem(*row) for row in rows]
+            state.complete = len(rows) < size
+            state.loaded_at = time.monotonic()
+            state.loads += 1
+        return state
+
+    def categories(self) -> tuple:
+        """Return (id, name) of the categories"""
+        return reference_data.choices('categories')
+
+    def page(self, per_page: int, category_id: int=None, cursor: str=None) -> FeedPage:
+        """Return a page of the feed, optionally of a single category"""
+        keys = self._keys()
+        decoded = decode_cursor(cursor, keys) if cursor else None
+        after = tuple(decoded[1]) if decoded and decoded[0] == 'next' else None
+
+        state = self._load()
+        head, complete = state.head, state.complete
+        items = [
+            item for item in head
+            if (category_id is None or item.category_id == category_id)
+            and (after is None or item.key < after)]
+        if len(items) > per_page or complete:
+            return FeedPage(items[:per_page], len(items) > per_page, True)
+
+        # past the head, read the timeline
+        from app.models import TimelineEntry
+        query = self._select()
+        if category_id is not None:
+            query = query.where(TimelineEntry.category_id == category_id)
+        if after is not None:
+            query = query.where(_after(keys, list(after), descending=True))
+        rows = db.session.execute(
+            query.order_by(*[key.desc() for key in keys]).limit(per_page + 1)).all()
+        items = [FeedItem(*row) for row in rows]
+        return FeedPage(items[:per_page], len(items) > per_page, False)
+
+    def following(self, user_id: int, per_page: int, cursor: str=None) -> FeedPage:
+        """
+        Return a page of the personal timeline of a user, the posts delivered to
+        the user's inbox merged with the posts of the followed blogs having too
+        many followers to be delivered, see `app.fanout`
+        """
+        from app.models import TimelineEntry, InboxEntry, Follow, Post, Blog
+        keys = self._keys()
+        decoded = decode_cursor(cursor, keys) if cursor else None
+        after = list(decoded[1]) if decoded and decoded[0] == 'next' else None
+
+        inbox = InboxEntry.__table__
+        delivered = select(
+                inbox.c.post_id, inbox.c.created_at, inbox.c.blog_id, Post.category_id,
+                Post.title, func.substr(Post.body, 1, 100), Post.img_url, Blog.name)\
+            .select_from(inbox)\
+            .join(Post, Post.id == inbox.c.post_id)\
+            .outerjoin(Blog, Blog.id == inbox.c.blog_id)\
+            .where(inbox.c.user_id == user_id)
+        if after is not None:
+            delivered = delivered.where(
+                _after([inbox.c.created_at, inbox.c.post_id], after, descending=True))
+        sources = [delivered.order_by(inbox.c.created_at.desc(), inbox.c.post_id.desc())]
+
+        celebrities = select(Follow.blog_id)\
+            .join(Blog, Blog.id == Follow.blog_id)\
+            .where(
+                Follow.follower_id == user_id,
+                Blog.follower_count >= current_app.config['FANOUT_THRESHOLD'])
+        blog_ids = db.session.scalars(celebrities).all()
+        if blog_ids:
+            merged = self._select().where(TimelineEntry.blog_id.in_(blog_ids))
+            if after is not None:
+                merged = merged.where(_after(keys, after, descending=True))
+            sources.append(merged.order_by(*[key.desc() for key in keys]))
+
+        streams = [
+            [FeedItem(*row) for row in db.session.execute(query.limit(per_page + 1))]
+            for query in sources]
+        items = []
+        seen = set()
+        # a blog passing the threshold has its older posts in the inboxes too
+        for item in heapq.merge(*streams, key=lambda item: item.key, reverse=True):
+            if item.post_id not in seen:
+                seen.add(item.post_id)
+                items.append(item)
+            if len(items) > per_page:
+                break
+        return FeedPage(items[:per_page], len(items) > per_page, False)
+
+    def invalidate(self) -> None:
+        """Drop the head, it's reloaded on next read"""
+        state = self._state
+        with state.lock:
+            state.head = None
+
+    def stats(self) -> dict:
+        state = self._state
+        with state.lock:
+            return dict(
+                head=len(state.head) if state.head is not None else 0,
+                complete=state.complete,
+                loads=state.loads)
+
+
+feed = Feed()
+
+
+def _record_change(mapper, connection, target):
+    session = db.object_session(target)
+    if session is not None:
+        session.info['feed_changed'] = True
+
+
+def _invalidate_changes(session):
+    if session.info.pop('feed_changed', False) and has_app_context():
+        feed.invalidate()
+
+
+def _discard_changes(session):
+    session.info.pop('feed_changed', None)
@@ -0,0 +1,237 @@
+import time
+import json
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from threading import Lock, local
+from typing import Callable
+from flask import Flask, request, session, current_app, has_app_context
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CacheOptions():
+    """
+    Fragment cache options of a view, e.g.
+    `@template('blog/post.html', cache=CacheOptions(60, depends=['posts', 'comments']))`,
+    cached fragments are dropped when a row of the tables they depend on changes,
+    if `scope` is given it's called with the view args and returns the owner of
+    the fragment (`user:<id>`, None to skip the cache), the fragment is then only
+    dropped by changes of the rows of that user (rows with a `user_id`)
+    """
+    def __init__(
+            self, ttl: int=60, depends: list=(), anonymous_only: bool=False,
+            scope: Callable[..., str|None]=None):
+        self.ttl = ttl
+        self.depends = tuple(depends)
+        # views rendering user specific content (e.g. forms with csrf tokens) must
+        # only be cached for anonymous visitors
+        self.anonymous_only = anonymous_only
+        self.scope = scope
+
+
+class MemoryBackend():
+    """In-process LRU cache with expiration"""
+    def __init__(self, max_entries: int=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._generations = {}
+        self._lock = Lock()
+
+    def get(self, key: str) -> str|None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, names: tuple) -> list[int]:
+        with self._lock:
+            return [self._generations.get(name, 0) for name in names]
+
+    def bump(self, names: set) -> None:
+        with self._lock:
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend():
+    """Cache stored in a local sqlite file, shared by all the workers of a host"""
+    def __init__(self, path: str, max_entries: int=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = local()
+        self._sets = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS fragments '
+                '(key TEXT PRIMARY KEY, value TEXT, expires REAL)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS generations '
+                '(name TEXT PRIMARY KEY, value INTEGER)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> str|None:
+        row = self._conn().execute(
+            'SELECT value FROM fragments WHERE key = ? AND expires >= ?',
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO fragments VALUES (?, ?, ?)', (key, value, now + ttl))
+        self._sets += 1
+        if self._sets % 100 == 0:
+            # purge expired entries then the entries closest to expiration over the limit
+            conn.execute('DELETE FROM fragments WHERE expires < ?', (now,))
+            conn.execute(
+                'DELETE FROM fragments WHERE key IN (SELECT key FROM fragments '
+                'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def generations(self, names: tuple) -> list[int]:
+        if not names:
+            return []
+        rows = dict(self._conn().execute(
+            f'SELECT name, value FROM generations WHERE name IN ({",".join("?" * len(names))})',
+            names).fetchall())
+        return [rows.get(name, 0) for name in names]
+
+    def bump(self, names: set) -> None:
+        conn = self._conn()
+        conn.executemany(
+            'INSERT INTO generations VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            [(name,) for name in names])
+
+    def clear(self) -> None:
+        self._conn().execute('DELETE FROM fragments')
+
+
+def _track_changes(session, flush_context):
+    tables = session.info.setdefault('changed_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table is not None:
+            tables.add(table)
+            # fragments scoped to the owner of the row, rows only added to a
+            # collection (e.g. the post of a new comment) are left alone
+            user_id = getattr(obj, 'user_id', None)
+            if user_id is not None and (
+                    obj not in session.dirty or session.is_modified(obj, include_collections=False)):
+                tables.add(f'{table}:user:{user_id}')
+
+
+def _invalidate_changes(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables and has_app_context():
+        fragment_cache.invalidate(*tables)
+
+
+def _discard_changes(session):
+    session.info.pop('changed_tables', None)
+
+
+class FragmentCache():
+    """
+    Cache rendered template partials of views decorated with `template(..., cache=...)`,
+    fragments are keyed by endpoint, view args, query string and an auth bucket
+    (anonymous or the permissions of the current user), and are invalidated
+    whenever rows of the tables they depend on are committed
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('FRAGMENT_CACHE_BACKEND', 'memory')
+        app.config.setdefault('FRAGMENT_CACHE_PATH', None)
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', 1024)
+        backend = app.config['FRAGMENT_CACHE_BACKEND']
+        if backend == 'memory':
+            app.extensions['fragment_cache'] = MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+        elif backend == 'sqlite':
+            app.extensions['fragment_cache'] = SQLiteBackend(
+                app.config['FRAGMENT_CACHE_PATH'], app.config['FRAGMENT_CACHE_SIZE'])
+        else:
+            app.extensions['fragment_cache'] = None
+
+        if not event.contains(Session, 'after_flush', _track_changes):
+            event.listen(Session, 'after_flush', _track_changes)
+            event.listen(Session, 'after_commit', _invalidate_changes)
+            event.listen(Session, 'after_rollback', _discard_changes)
+
+    @property
+    def backend(self) -> MemoryBackend|SQLiteBackend|None:
+        return current_app.extensions.get('fragment_cache')
+
+    def _auth_bucket(self) -> str:
+        if not current_user.is_authenticated:
+            return 'anonymous'
+        return f'permissions:{current_user.permissions}'
+
+    def key(self, options: CacheOptions) -> str|None:
+        """Return the cache key of the current request, None if it must not be cached"""
+        if self.backend is None or request.method != 'GET':
+            return None
+        # rendered partials include the flashed messages
+        if session.get('_flashes'):
+            return None
+        if options.anonymous_only and current_user.is_authenticated:
+            return None
+        depends = options.depends
+        if options.scope is not None:
+            scope = options.scope(**request.view_args)
+            if scope is None:
+                return None
+            depends = tuple(f'{table}:{scope}' for table in depends)
+        parts = [
+            request.endpoint,
+            sorted(request.view_args.items()),
+            sorted(request.args.items(multi=True)),
+            self._auth_bucket(),
+            depends,
+            self.backend.generations(depends)]
+        return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> str|None:
+        return self.backend.get(key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.backend.set(key, value, ttl)
+
+    def invalidate(self, *tables: str) -> None:
+        """Drop the fragments depending on the given tables"""
+        if self.backend is not None:
+            self.backend.bump(set(tables))
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,162 @@
+import time
+from threading import Lock
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, object_session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+
+
+class _IdentityState():
+    """Per application snapshots of logged in users"""
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.entries = {}  # user id -> (expires at, user columns, blog columns or None)
+        self.hits = 0
+        self.misses = 0
+
+
+def _columns(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _build(model, columns: dict):
+    """Create a detached instance of model with given committed column values"""
+    obj = model.__mapper__.class_manager.new_instance()
+    for key, value in columns.items():
+        set_committed_value(obj, key, value)
+    make_transient_to_detached(obj)
+    return obj
+
+
+class IdentityCache():
+    """
+    Short lived snapshots of the users loaded by `login_manager.user_loader`,
+    a snapshot holds the user row and the id and name of the user's blog, it's
+    merged into the session without emitting SQL, the role permissions come
+    from the role permission table, snapshots are dropped when the user or the
+    blog are changed and expire after `IDENTITY_CACHE_TTL` seconds, so edits
+    made by other processes are picked up within the ttl
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('IDENTITY_CACHE_TTL', 30)
+        app.config.setdefault('IDENTITY_CACHE_SIZE', 4096)
+        app.extensions['identity_cache'] = _IdentityState(
+            app.config['IDENTITY_CACHE_TTL'], app.config['IDENTITY_CACHE_SIZE'])
+
+        if not db.event.contains(Session, 'after_commit', _invalidate_changes):
+            from app.models import User, Blog, Post, Comment
+            for event_name in ('after_insert', 'after_update', 'after_delete'):
+                db.event.listen(User, event_name, _on_user_changed)
+                db.event.listen(Blog, event_name, _on_blog_changed)
+            # posts and comments change the counters of their author
+            for event_name in ('after_insert', 'after_delete'):
+                db.event.listen(Post, event_name, _on_content_changed)
+                db.event.listen(Comment, event_name, _on_content_changed)
+            db.event.listen(Session, 'after_commit', _invalidate_changes)
+            db.event.listen(Session, 'after_rollback', _discard_changes)
+
+    @property
+    def _state(self) -> _IdentityState:
+        return current_app.extensions['identity_cache']
+
+    def load(self, user_id: int):
+        """Return the user with given id, from its snapshot if there is one"""
+        from app.models import User, Blog
+        state = self._state
+        if state.ttl <= 0:
+            return db.session.get(User, user_id)
+
+        with state.lock:
+            entry = state.entries.get(user_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del state.entries[user_id]
+                entry = None
+            if entry is not None:
+                state.hits += 1
+            else:
+                state.misses += 1
+
+        if entry is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            blog = user.blog
+            with state.lock:
+                if len(state.entries) >= state.max_entries:
+                    state.entries.pop(next(iter(state.entries)))
+                state.entries[user_id] = (
+                    time.monotonic() + state.ttl,
+                    _columns(user),
+                    {'id': blog.id, 'name': blog.name, 'user_id': blog.user_id}
+                    if blog is not None else None)
+            return user
+
+        _, user_columns, blog_columns = entry
+        user = _build(User, user_columns)
+        blog = _build(Blog, blog_columns) if blog_columns is not None else None
+        set_committed_value(user, 'blog', blog)
+        if blog is not None:
+            set_committed_value(blog, 'user', user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        """Drop the snapshots of given users"""
+        state = self._state
+        with state.lock:
+            for user_id in user_ids:
+                state.entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        state = self._state
+        with state.lock:
+            state.entries.clear()
+            state.hits = 0
+            state.misses = 0
+
+    def stats(self) -> dict:
+        state = self._state
+        with state.lock:
+            return dict(size=len(state.entries), hits=state.hits, misses=state.misses)
+
+
+identity_cache = IdentityCache()
+
+
+def _on_user_changed(mapper, connection, target):
+    _record_change(target, target.id)
+
+
+def _on_blog_changed(mapper, connection, target):
+    _record_change(target, target.user_id)
+
+
+def _on_content_changed(mapper, connection, target):
+    _record_change(target, target.user_id)
+
+
+def _record_change(target, user_id: int|None) -> None:
+    if user_id is None or not has_app_context():
+        return
+    # drop the snapshot now and again on commit, a request reading the row
+    # before the commit could store the old version in between
+    identity_cache.invalidate(user_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_identities', set()).add(user_id)
+
+
+def _invalidate_changes(session):
+    user_ids = session.info.pop('changed_identities', None)
+    if user_ids and has_app_context():
+        identity_cache.invalidate(*user_ids)
+
+
+def _discard_changes(session):
+    session.info.pop('changed_identities', None)
@@ -0,0 +1,302 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from flask import Flask, current_app
+from sqlalchemy import select, delete, exists, and_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.util import utcnow
+
+
+# format -> ((offset, signature), ...), all the signatures of a format must match
+signatures = {
+    'jpeg': ((0, b'\xff\xd8\xff'),),
+    'png': ((0, b'\x89PNG\r\n\x1a\n'),),
+    'gif87': ((0, b'GIF87a'),),
+    'gif89': ((0, b'GIF89a'),),
+    'webp': ((0, b'RIFF'), (8, b'WEBP')),
+}
+header_size = max(offset + len(sig) for sig_list in signatures.values() for offset, sig in sig_list)
+extensions = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp'}
+blob_name = re.compile(r'[0-9a-f]{64}(\.\d+w)?\.\w+')
+
+
+def sniff_format(header: bytes) -> str|None:
+    """Identify the format of an image from its first bytes, return None if unknown"""
+    for format, sig_list in signatures.items():
+        if all(header[offset:offset + len(sig)] == sig for offset, sig in sig_list):
+            return 'gif' if format.startswith('gif') else format
+    return None
+
+
+def variant_name(filename: str, width: int) -> str:
+    """Name of the variant of given image bounded to width"""
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{width}w{ext}'
+
+
+def relative_path(filename: str) -> str:
+    """Path of an image relative to the upload directory, content addressed images are sharded"""
+    if blob_name.fullmatch(filename):
+        return f'{filename[:2]}/{filename[2:4]}/{filename}'
+    return filename
+
+
+def is_variant(filename: str) -> bool:
+    """Check if given file name is the name of a variant"""
+    stem, _ = os.path.splitext(filename)
+    suffix = stem.rpartition('.')[2]
+    return suffix.endswith('w') and suffix[:-1].isdigit()
+
+
+def make_variants(path: str, widths: list[int]) -> list[int]:
+    """
+    Write the width bounded variants of the image at path next to it, only
+    widths smaller than the image are generated, return generated widths,
+    runs in the worker processes
+    """
+    from PIL import Image, ImageOps
+    done = []
+    with Image.open(path) as img:
+        if getattr(img, 'is_animated', False):
+            # resizing would drop the frames
+            return done
+        format = img.format
+        img = ImageOps.exif_transpose(img)
+        for width in sorted(widths):
+            if width >= img.width:
+                break
+            height = round(img.height * width / img.width)
+            variant = img.resize((width, height), Image.LANCZOS)
+            target = variant_name(path, width)
+            tmp = f'{target}.tmp'
+            if format == 'JPEG':
+                variant.save(tmp, format, quality=82, optimize=True, progressive=True)
+            elif format == 'WEBP':
+                variant.save(tmp, format, quality=80)
+            else:
+                variant.save(tmp, format, optimize=True)
+            # readers never see partially written variants
+            os.replace(tmp, target)
+            done.append(width)
+    return done
+
+
+class _ImageState():
+    """Per application worker pool and known variants"""
+    def __init__(self):
+        self.lock = Lock()
+        self.pool = None
+        self.pillow = True
+        self.variants = {}  # filename -> generated widths, empty if checked without any
+        self.checked = {}  # filename -> when it was found without variants
+
+
+class ImagePipeline():
+    """
+    Store uploaded images and generate width bounded variants of them in a pool
+    of worker processes, templates pick a variant with the `srcset` filter,
+    variants are only generated if Pillow is installed, a warning is logged at
+    start up and the original image is served otherwise
+
+    Images are content addressed, named by the sha256 of their bytes and
+    sharded in two levels of sub directories (`ab/cd/abcd....jpg`), so the same
+    image is stored once, images no longer referenced by a post are removed by
+    `gc` (`flask images gc`)
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('IMAGE_VARIANT_WIDTHS', [320, 640, 1280])
+        app.config.setdefault('IMAGE_WORKERS', 2)
+        app.config.setdefault('IMAGE_GC_GRACE', 3600)
+        app.config.setdefault('IMAGE_VARIANT_RECHECK', 60)
+        state = _ImageState()
+        try:
+            import PIL
+        except ImportError:
+            state.pillow = False
+            app.logger.warning('Pillow is not installed, image variants will not be generated')
+        app.extensions['images'] = state
+        app.add_template_filter(self.srcset, 'srcset')
+
+    @property
+    def _state(self) -> _ImageState:
+        return current_app.extensions['images']
+
+    def _pool(self) -> ProcessPoolExecutor:
+        state = self._state
+        with state.lock:
+            if state.pool is None:
+                state.pool = ProcessPoolExecutor(
+                    current_app.config['IMAGE_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'))
+            return state.pool
+
+    def store(self, file: FileStorage):
+        """
+        Stream the upload to the upload directory while hashing it, the file is
+        kept only if no image with the same bytes is stored yet, return the
+        image, raise ValueError if the upload is not a supported image
+        """
+        from app.models import Image
+        folder = current_app.config['IMAGE_UPLOAD_PATH']
+        sha = hashlib.sha256()
+        size = 0
+        header = b''
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while chunk := file.stream.read(64 * 1024):
+                    if len(header) < header_size:
+                        header += chunk[:header_size]
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            format = sniff_format(header)
+            if format is None:
+                raise ValueError('unsupported image format')
+
+            image = Image(hash=sha.hexdigest(), ext=extensions[format], size=size)
+            path = os.path.join(folder, image.path)
+            stored = os.path.exists(path)
+            if not stored:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        # the row is committed before the post referencing it, the grace
+        # period keeps it from being collected in between
+        try:
+            image = db.session.merge(image)
+            image.last_used_at = utcnow()
+            db.session.commit()
+        except IntegrityError:
+            # stored by a concurrent upload
+            db.session.rollback()
+            image = db.session.get(Image, image.hash)
+        if not stored:
+            self.process(path)
+        return image
+
+    def process(self, path: str) -> None:
+        """Generate the variants of the image at path, in the worker pool if there is one"""
+        if not self._state.pillow:
+            return
+        widths = current_app.config['IMAGE_VARIANT_WIDTHS']
+        state = self._state
+        filename = os.path.basename(path)
+        logger = current_app.logger
+
+        def done(f):
+            if f.exception():
+                logger.error('image variants of %s failed: %r', path, f.exception())
+            else:
+                self._forget(state, filename)
+
+        if current_app.config['IMAGE_WORKERS'] > 0:
+            self._pool().submit(make_variants, path, widths).add_done_callback(done)
+        else:
+            try:
+                make_variants(path, widths)
+                self._forget(state, filename)
+            except Exception as e:
+                logger.error('image variants of %s failed: %r', path, e)
+
+    def _forget(self, state: _ImageState, filename: str) -> None:
+        """Drop the known variants of an image, they are looked up again on next render"""
+        with state.lock:
+            state.variants.pop(filename, None)
+            state.checked.pop(filename, None)
+
+    def variants(self, filename: str) -> list[int]:
+        """
+        Return the widths of the generated variants of given image, images
+        without variants (smaller than the widths, or not processed yet) are
+        checked again after `IMAGE_VARIANT_RECHECK` seconds, or once this
+        process generated them
+        """
+        state = self._state
+        widths = state.variants.get(filename)
+        if widths:
+            return widths
+        recheck = current_app.config['IMAGE_VARIANT_RECHECK']
+        if widths is not None and time.monotonic() - state.checked.get(filename, 0) < recheck:
+            return widths
+        path = os.path.join(current_app.config['IMAGE_UPLOAD_PATH'], relative_path(filename))
+        widths = [
+            width for width in current_app.config['IMAGE_VARIANT_WIDTHS']
+            if os.path.exists(variant_name(path, width))]
+        with state.lock:
+            state.variants[filename] = widths
+            if not widths:
+                state.checked[filename] = time.monotonic()
+        return widths
+
+    def srcset(self, img_url: str|None) -> str:
+        """Template filter building the srcset attribute of an uploaded image url"""
+        if not img_url:
+            return ''
+        base, _, filename = img_url.rpartition('/')
+        widths = self.variants(filename)
+        if not widths:
+            return ''
+        return ', '.join(f'{base}/{variant_name(filename, w)} {w}w' for w in widths)
+
+    def gc(self, grace: int=None, batch_size: int=1000) -> int:
+        """
+        Remove the images not referenced by any post and not uploaded again
+        within the grace period (seconds), return removed images count
+        """
+        from app.models import Image, ImageRef
+        images = Image.__table__
+        config = current_app.config
+        folder = config['IMAGE_UPLOAD_PATH']
+        cutoff = utcnow() - timedelta(seconds=config['IMAGE_GC_GRACE'] if grace is None else grace)
+        unreferenced = and_(
+            images.c.last_used_at < cutoff,
+            ~exists().where(ImageRef.__table__.c.image_hash == images.c.hash))
+        removed = 0
+        while True:
+            rows = db.session.execute(
+                select(images.c.hash, images.c.ext).where(unreferenced).limit(batch_size)).all()
+            if not rows:
+                return removed
+            hashes = [row.hash for row in rows]
+            # conditions are checked again, the images may have been used since
+            db.session.execute(delete(images).where(images.c.hash.in_(hashes), unreferenced))
+            db.session.commit()
+            kept = set(db.session.scalars(select(images.c.hash).where(images.c.hash.in_(hashes))))
+            for row in rows:
+                if row.hash in kept:
+                    continue
+                path = os.path.join(folder, Image(hash=row.hash, ext=row.ext).path)
+                for name in [path, *(variant_name(path, w) for w in config['IMAGE_VARIANT_WIDTHS'])]:
+                    try:
+                        os.remove(name)
+                    except FileNotFoundError:
+                        pass
+                with self._state.lock:
+                    self._state.variants.pop(os.path.basename(path), None)
+                removed += 1
+
+    def shutdown(self) -> None:
+        state = self._state
+        with state.lock:
+            if state.pool is not None:
+                state.pool.shutdown()
+                state.pool = None
+
+
+images = ImagePipeline()
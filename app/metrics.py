@@ -0,0 +1,184 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import Flask, g, request, current_app, has_request_context
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+
+
+# upper bounds of the histogram buckets, +Inf is implied
+time_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+count_buckets = (0, 1, 2, 3, 5, 10, 20, 30, 50, 100)
+size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram():
+    """Prometheus style histogram with one series per label value"""
+    def __init__(self, name: str, help: str, label: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+
+    def observe(self, value: str, amount: float) -> None:
+        series = self._series.get(value)
+        if series is None:
+            series = self._series[value] = [0] * (len(self.buckets) + 3)
+        # values equal to a bound fall in its bucket
+        series[bisect_left(self.buckets, amount)] += 1
+        series[-2] += amount
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for value, series in sorted(self._series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-2]:g}')
+            lines.append(f'{self.name}_count{{{label}}} {series[-1]}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _MetricsState():
+    """Per application histograms"""
+    def __init__(self, prefix: str):
+        self.lock = Lock()
+        self.histograms = {
+            'wall': Histogram(
+                f'{prefix}_request_duration_seconds', 'Wall time of the requests.',
+                'endpoint', time_buckets),
+            'template': Histogram(
+                f'{prefix}_template_render_seconds', 'Time spent rendering templates per request.',
+                'endpoint', time_buckets),
+            'sql_count': Histogram(
+                f'{prefix}_sql_queries', 'SQL queries issued per request.',
+                'endpoint', count_buckets),
+            'sql_time': Histogram(
+                f'{prefix}_sql_duration_seconds', 'Time spent in SQL queries per request.',
+                'endpoint', time_buckets),
+            'bytes': Histogram(
+                f'{prefix}_response_bytes', 'Size of the response bodies.',
+                'endpoint', size_buckets),
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info['metrics_query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('metrics_query_start', None)
+    if start is not None and has_request_context():
+        g.metrics_sql_time = g.get('metrics_sql_time', 0.0) + time.perf_counter() - start
+        g.metrics_sql_count = g.get('metrics_sql_count', 0) + 1
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        # templates rendered while rendering a template are counted once
+        depth = g.get('metrics_render_depth', 0)
+        if depth == 0:
+            g.metrics_render_start = time.perf_counter()
+        g.metrics_render_depth = depth + 1
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and g.get('metrics_render_depth'):
+        g.metrics_render_depth -= 1
+        if g.metrics_render_depth == 0:
+            g.metrics_template_time = g.get('metrics_template_time', 0.0) + \
+                time.perf_counter() - g.metrics_render_start
+
+
+class Metrics():
+    """
+    Per endpoint histograms of the wall time, template render time, SQL queries
+    count and time and response size of the requests, exposed in the Prometheus
+    text format by `render` (served at /admin/metrics), values are kept per
+    process, each worker process is scraped separately, in debug mode (or if
+    `SERVER_TIMING` is set) the timings of a request are also sent in its
+    Server-Timing header
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PREFIX', 'mosaic')
+        app.config.setdefault('SERVER_TIMING', False)
+        app.extensions['metrics'] = _MetricsState(app.config['METRICS_PREFIX'])
+        if not app.config['METRICS_ENABLED']:
+            return
+        with app.app_context():
+            engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_rendered, app)
+        app.before_request(self._start)
+        app.after_request(self._record)
+
+    @property
+    def _state(self) -> _MetricsState:
+        return current_app.extensions['metrics']
+
+    def _start(self) -> None:
+        g.metrics_start = time.perf_counter()
+
+    def _record(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        wall = time.perf_counter() - start
+        template = g.get('metrics_template_time', 0.0)
+        sql_count = g.get('metrics_sql_count', 0)
+        sql_time = g.get('metrics_sql_time', 0.0)
+        size = response.calculate_content_length()
+        if size is None:
+            # streamed and file responses
+            size = response.content_length
+
+        endpoint = request.endpoint or 'none'
+        state = self._state
+        with state.lock:
+            histograms = state.histograms
+            histograms['wall'].observe(endpoint, wall)
+            histograms['template'].observe(endpoint, template)
+            histograms['sql_count'].observe(endpoint, sql_count)
+            histograms['sql_time'].observe(endpoint, sql_time)
+            if size is not None:
+                histograms['bytes'].observe(endpoint, size)
+
+        if current_app.debug or current_app.config['SERVER_TIMING']:
+            response.headers.add('Server-Timing', ', '.join([
+                f'app;dur={wall * 1000:.1f}',
+                f'db;dur={sql_time * 1000:.1f};desc="{sql_count} queries"',
+                f'tpl;dur={template * 1000:.1f}']))
+        return response
+
+    def render(self) -> str:
+        """Return the histograms in the Prometheus text exposition format"""
+        state = self._state
+        with state.lock:
+            lines = [line for histogram in state.histograms.values() for line in histogram.render()]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        state = self._state
+        with state.lock:
+            state.histograms = _MetricsState(current_app.config['METRICS_PREFIX']).histograms
+
+
+metrics = Metrics()
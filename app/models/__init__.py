@@ -4,3 +4,8 @@ from .blog import Blog
 from .post import Post
 from .category import Category
 from .comment import Comment
+from .outbox import OutboxMessage
+from .image import Image, ImageRef
+from .timeline import TimelineEntry
+from .follow import Follow
+from .inbox import InboxEntry, FanoutJob
@@ -1,4 +1,5 @@
 from app import db
+from app.util import utcnow
 
 
 class Blog(db.Model):
@@ -6,7 +7,12 @@ class Blog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(32), unique=True, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    updated_at = db.Column(db.DateTime(), default=utcnow, onupdate=utcnow)
+    post_count = db.Column(db.Integer, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, default=0, server_default='0')
     posts = db.relationship('Post', backref='blog', lazy='dynamic')
+    followers = db.relationship(
+        'Follow', backref='blog', lazy='dynamic', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Blog {self.name}>'
@@ -1,9 +1,16 @@
+from sqlalchemy import select
 from app import db
 from app.util import utcnow
+from .post import Post
+from .blog import Blog
+from .user import User
 
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
+        db.Index('ix_comments_user_id_created_at', 'user_id', 'created_at'))
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text())
     created_at = db.Column(db.DateTime(), default=utcnow)
@@ -12,3 +19,50 @@ class Comment(db.Model):
 
     def __repr__(self):
         return f'<Comment {self.id}>'
+
+    @staticmethod
+    def on_changed(mapper, connection, target):
+        """update the version of the commented post"""
+        if target.post_id is not None:
+            posts = Post.__table__
+            connection.execute(
+                posts.update()
+                .where(posts.c.id == target.post_id)
+                .values(updated_at=utcnow()))
+
+    @staticmethod
+    def update_counters(connection, target, delta: int):
+        """add delta to the comment counters of the commented post and the author"""
+        if target.post_id is not None:
+            posts = Post.__table__
+            connection.execute(
+                posts.update()
+                .where(posts.c.id == target.post_id)
+                .values(comment_count=posts.c.comment_count + delta))
+            # comment counts are shown on the blog page, update its version
+            blogs = Blog.__table__
+            connection.execute(
+                blogs.update()
+                .where(blogs.c.id == select(posts.c.blog_id)
+                       .where(posts.c.id == target.post_id).scalar_subquery())
+                .values(updated_at=utcnow()))
+        if target.user_id is not None:
+            users = User.__table__
+            connection.execute(
+                users.update()
+                .where(users.c.id == target.user_id)
+                .values(comment_count=users.c.comment_count + delta))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Comment.update_counters(connection, target, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Comment.update_counters(connection, target, -1)
+
+
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+    db.event.listen(Comment, event_name, Comment.on_changed)
+db.event.listen(Comment, 'after_insert', Comment.on_inserted)
+db.event.listen(Comment, 'after_delete', Comment.on_deleted)
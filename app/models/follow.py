@@ -0,0 +1,37 @@
+from app import db
+from app.util import utcnow
+from .blog import Blog
+
+
+class Follow(db.Model):
+    __tablename__ = 'follows'
+    __table_args__ = (
+        # followers of a blog, in the order they are fanned out
+        db.Index('ix_follows_blog_id_follower_id', 'blog_id', 'follower_id'),)
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    blog_id = db.Column(db.Integer, db.ForeignKey('blogs.id'), primary_key=True)
+    created_at = db.Column(db.DateTime(), default=utcnow)
+
+    def __repr__(self):
+        return f'<Follow {self.follower_id} -> {self.blog_id}>'
+
+    @staticmethod
+    def update_counters(connection, target, delta: int):
+        """add delta to the followers counter of the followed blog and update its version"""
+        blogs = Blog.__table__
+        connection.execute(
+            blogs.update()
+            .where(blogs.c.id == target.blog_id)
+            .values(follower_count=blogs.c.follower_count + delta, updated_at=utcnow()))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Follow.update_counters(connection, target, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Follow.update_counters(connection, target, -1)
+
+
+db.event.listen(Follow, 'after_insert', Follow.on_inserted)
+db.event.listen(Follow, 'after_delete', Follow.on_deleted)
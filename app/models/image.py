@@ -0,0 +1,33 @@
+from app import db
+from app.util import utcnow
+
+
+class Image(db.Model):
+    """An uploaded image stored under the sha256 of its bytes"""
+    __tablename__ = 'images'
+    hash = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(8))
+    size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime(), default=utcnow)
+    # uploads of the same bytes touch this date, unreferenced images are only
+    # collected once it's older than the grace period
+    last_used_at = db.Column(db.DateTime(), index=True, default=utcnow)
+    refs = db.relationship('ImageRef', backref='image', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<Image {self.hash}>'
+
+    @property
+    def path(self) -> str:
+        """Path of the image relative to the upload directory"""
+        return f'{self.hash[:2]}/{self.hash[2:4]}/{self.hash}.{self.ext}'
+
+
+class ImageRef(db.Model):
+    """Reference of a post to an image, an image without references can be collected"""
+    __tablename__ = 'image_refs'
+    image_hash = db.Column(db.String(64), db.ForeignKey('images.hash'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True, index=True)
+
+    def __repr__(self):
+        return f'<ImageRef {self.image_hash} {self.post_id}>'
@@ -0,0 +1,37 @@
+from app import db
+from app.util import utcnow
+
+
+class InboxEntry(db.Model):
+    """
+    Post delivered to the personal timeline of a follower of its blog, rows are
+    written by the fan-out workers, posts of blogs with many followers are not
+    delivered but merged into the timeline when it's read
+    """
+    __tablename__ = 'inbox'
+    __table_args__ = (
+        db.Index('ix_inbox_user_id_created_at_post_id', 'user_id', 'created_at', 'post_id'),)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime())
+    blog_id = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<InboxEntry {self.user_id} {self.post_id}>'
+
+
+class FanoutJob(db.Model):
+    """A new post to deliver to the inboxes of its blog's followers"""
+    __tablename__ = 'fanout_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, index=True)
+    blog_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime(), default=utcnow)
+    # the job is due when this date is reached, claiming workers push it
+    # forward by their lease duration
+    next_attempt_at = db.Column(db.DateTime(), index=True, default=utcnow)
+    claim = db.Column(db.String(32), index=True)
+    attempts = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return f'<FanoutJob {self.id}>'
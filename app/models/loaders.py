@@ -0,0 +1,27 @@
+from functools import cache
+from sqlalchemy.orm import joinedload
+from .user import User
+from .blog import Blog
+from .post import Post
+from .comment import Comment
+
+
+@cache
+def _profiles() -> dict:
+    # built on first use, backref attributes (Post.blog, Comment.user...)
+    # only exist once the mappers are configured
+    return {
+        # post page: blog name and author username
+        'post.page': (joinedload(Post.blog), joinedload(Post.author)),
+        # blog page: owner username
+        'blog.page': (joinedload(Blog.user),),
+        # comments listing: commenter username
+        'comment.listing': (joinedload(Comment.user),),
+        # profile page: user's blog name
+        'user.profile': (joinedload(User.blog),),
+    }
+
+
+def load_profile(name: str) -> tuple:
+    """Return the loader options of the given profile, e.g. `query.options(*load_profile('post.page'))`"""
+    return _profiles()[name]
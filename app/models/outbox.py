@@ -0,0 +1,44 @@
+import json
+from flask_mail import Message
+from app import db
+from app.util import utcnow
+
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text())
+    sender = db.Column(db.String(128))
+    subject = db.Column(db.String(256))
+    body = db.Column(db.Text())
+    html = db.Column(db.Text())
+    created_at = db.Column(db.DateTime(), default=utcnow)
+    # the message is due when this date is reached, claiming workers push it
+    # forward by their lease duration and failed attempts by the retry delay
+    next_attempt_at = db.Column(db.DateTime(), index=True, default=utcnow)
+    claim = db.Column(db.String(32), index=True)
+    attempts = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Boolean(), default=False)
+    last_error = db.Column(db.Text())
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id}>'
+
+    @staticmethod
+    def from_message(msg: Message) -> 'OutboxMessage':
+        """Build an outbox row from a flask-mail message"""
+        return OutboxMessage(
+            recipients=json.dumps(msg.recipients),
+            sender=msg.sender,
+            subject=msg.subject,
+            body=msg.body,
+            html=msg.html)
+
+    def to_message(self) -> Message:
+        """Build the flask-mail message of this row"""
+        return Message(
+            subject=self.subject,
+            recipients=json.loads(self.recipients),
+            sender=self.sender,
+            body=self.body,
+            html=self.html)
@@ -1,34 +1,79 @@
-import bleach
-from markdown import markdown
 from app import db
 from app.util import utcnow
+from app.rendering import renderer
+from .blog import Blog
+from .user import User
+from .image import ImageRef
 
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (
+        db.Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_posts_category_id_created_at', 'category_id', 'created_at'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128), unique=True, index=True)
     body = db.Column(db.Text())
     body_html = db.Column(db.Text())
     created_at = db.Column(db.DateTime(), index=True, default=utcnow)
+    updated_at = db.Column(db.DateTime(), default=utcnow, onupdate=utcnow)
     img_url = db.Column(db.String())
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
     blog_id = db.Column(db.Integer, db.ForeignKey('blogs.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
+    image_refs = db.relationship('ImageRef', backref='post', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Post {self.id}>'
 
+    def set_image(self, image) -> None:
+        """Use given image as the banner of the post, the previous one is unreferenced"""
+        if [ref.image_hash for ref in self.image_refs] != [image.hash]:
+            self.image_refs = [ImageRef(image_hash=image.hash)]
+
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = [
-            'a', 'b', 'p', 'i', 'ul', 'li', 'ol', 'em'
-            'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre',
-            'abbr', 'acronym', 'blockquote', 'code', 'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            text=markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
+        target.body_html = renderer.render(value)
+
+    @staticmethod
+    def on_changed(mapper, connection, target):
+        """update the version of the post's blog"""
+        if target.blog_id is not None:
+            blogs = Blog.__table__
+            connection.execute(
+                blogs.update()
+                .where(blogs.c.id == target.blog_id)
+                .values(updated_at=utcnow()))
+
+    @staticmethod
+    def update_counters(connection, target, delta: int):
+        """add delta to the post counters of the post's blog and author"""
+        if target.blog_id is not None:
+            blogs = Blog.__table__
+            connection.execute(
+                blogs.update()
+                .where(blogs.c.id == target.blog_id)
+                .values(post_count=blogs.c.post_count + delta))
+        if target.user_id is not None:
+            users = User.__table__
+            connection.execute(
+                users.update()
+                .where(users.c.id == target.user_id)
+                .values(post_count=users.c.post_count + delta))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Post.update_counters(connection, target, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Post.update_counters(connection, target, -1)
 
 
 db.event.listen(Post.body, 'set', Post.on_changed_body)
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+    db.event.listen(Post, event_name, Post.on_changed)
+db.event.listen(Post, 'after_insert', Post.on_inserted)
+db.event.listen(Post, 'after_delete', Post.on_deleted)
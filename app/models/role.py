@@ -1,4 +1,5 @@
 from app import db
+from app.reference_data import reference_data
 
 
 class Permission:
@@ -71,3 +72,24 @@ class Role(db.Model):
 
             db.session.add(role)
         db.session.commit()
+        permission_table.refresh()
+
+
+class PermissionTable():
+    """
+    Roles' permissions (role id -> bitmask), used to check users' permissions
+    without loading their role, read from the roles snapshot of
+    `reference_data`, which is refreshed after roles changes are committed
+    """
+    def get(self, role_id: int) -> int:
+        """return the permissions bitmask of the given role"""
+        return reference_data.value('roles', role_id) or 0
+
+    def refresh(self) -> None:
+        """reload the roles on next lookup"""
+        reference_data.invalidate('roles')
+
+    invalidate = refresh
+
+
+permission_table = PermissionTable()
@@ -0,0 +1,55 @@
+from app import db
+from .post import Post
+
+
+class TimelineEntry(db.Model):
+    """
+    Compact index of all posts by creation date for the home feed, rows are
+    written with their post by the post mapper events
+    """
+    __tablename__ = 'timeline'
+    __table_args__ = (
+        db.Index('ix_timeline_created_at_post_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_category_id_created_at_post_id', 'category_id', 'created_at', 'post_id'),
+        db.Index('ix_timeline_blog_id_created_at_post_id', 'blog_id', 'created_at', 'post_id'))
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime())
+    blog_id = db.Column(db.Integer)
+    category_id = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<TimelineEntry {self.post_id}>'
+
+    @staticmethod
+    def on_post_inserted(mapper, connection, target):
+        connection.execute(TimelineEntry.__table__.insert().values(
+            post_id=target.id,
+            created_at=target.created_at,
+            blog_id=target.blog_id,
+            category_id=target.category_id))
+
+    @staticmethod
+    def on_post_updated(mapper, connection, target):
+        state = db.inspect(target)
+        if not any(state.attrs[attr].history.has_changes()
+                   for attr in ('created_at', 'blog_id', 'category_id')):
+            return
+        timeline = TimelineEntry.__table__
+        connection.execute(
+            timeline.update()
+            .where(timeline.c.post_id == target.id)
+            .values(
+                created_at=target.created_at,
+                blog_id=target.blog_id,
+                category_id=target.category_id))
+
+    @staticmethod
+    def on_post_deleted(mapper, connection, target):
+        timeline = TimelineEntry.__table__
+        connection.execute(timeline.delete().where(timeline.c.post_id == target.id))
+
+
+db.event.listen(Post, 'after_insert', TimelineEntry.on_post_inserted)
+db.event.listen(Post, 'after_update', TimelineEntry.on_post_updated)
+# the entry references the post, it goes first
+db.event.listen(Post, 'before_delete', TimelineEntry.on_post_deleted)
@@ -1,12 +1,12 @@
-import time
 import hashlib
-import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask import current_app
 from flask_login import UserMixin, AnonymousUserMixin
 from app import db, login_manager
+from app.passwords import passwords
+from app.tokens import tokens
 from app.util import utcnow
-from .role import Role, Permission
+from .role import Role, Permission, permission_table
+from .follow import Follow
 
 
 class User(db.Model, UserMixin):
@@ -18,6 +18,9 @@ class User(db.Model, UserMixin):
     about_me = db.Column(db.Text())
     member_since = db.Column(db.DateTime(), default=utcnow)
     last_seen = db.Column(db.DateTime(), default=utcnow)
+    updated_at = db.Column(db.DateTime(), default=utcnow, onupdate=utcnow)
+    post_count = db.Column(db.Integer, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
     confirmed = db.Column(db.Boolean(), default=False)
     password_hash = db.Column(db.String(128))
     avatar_hash = db.Column(db.String(32))
@@ -25,6 +28,8 @@ class User(db.Model, UserMixin):
     blog = db.relationship('Blog', uselist=False, backref='user')
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     comments = db.relationship('Comment', backref='user', lazy='dynamic')
+    follows = db.relationship(
+        'Follow', backref='follower', lazy='dynamic', cascade='all, delete-orphan')
 
     def __repr__(self) -> str:
         return f'<User {self.username}>'
@@ -46,37 +51,62 @@ class User(db.Model, UserMixin):
     
     @password.setter
     def password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
     
     def verify_password(self, password: str) -> bool:
-        """Check if given password matches the stored password hash"""
-        return check_password_hash(self.password_hash, password)
+        """
+        Check if given password matches the stored password hash, a hash made
+        with other parameters than the configured ones is replaced (to commit),
+        raise PasswordPoolBusy if too many verifications are waiting
+        """
+        ok, new_hash = passwords.verify(self.password_hash, password)
+        if new_hash is not None:
+            self.password_hash = new_hash
+            passwords.record_rehash()
+        return ok
     
+    @property
+    def permissions(self) -> int:
+        """Permissions bitmask of user's role, resolved without loading the role"""
+        if self.role_id is None:
+            # role is not flushed yet
+            return self.role.permissions if self.role is not None else 0
+        return permission_table.get(self.role_id)
+
     def can(self, permission: int) -> bool:
         """Check if user have the given permission"""
-        return self.role is not None and self.role.has_permission(permission)
+        return self.permissions & permission == permission
 
     def is_admin(self) -> bool:
         """Check if user have administrator access"""
         return self.can(Permission.ADMIN)
 
+    def is_following(self, blog) -> bool:
+        """Check if user follows given blog"""
+        return db.session.get(Follow, (self.id, blog.id)) is not None
+
+    def follow(self, blog) -> None:
+        """Follow given blog, the change is committed by the caller"""
+        if not self.is_following(blog):
+            db.session.add(Follow(follower_id=self.id, blog_id=blog.id))
+
+    def unfollow(self, blog) -> None:
+        """Stop following given blog, the change is committed by the caller"""
+        follow = db.session.get(Follow, (self.id, blog.id))
+        if follow is not None:
+            db.session.delete(follow)
+
     def generate_token(self, payload: dict, expires_in: int=600) -> str:
         """Generate jwt token using given payload"""
-        payload.update({'exp': time.time() + expires_in})
-        token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-        return token
+        return tokens.encode(payload, expires_in)
     
     def confirm(self, token: str) -> bool:
         """
         Set confirmed flag to True, payload format: {'confirm': user.id},
-        return False if token is invalid or token doesn't contain the payload
+        return False if token is invalid, used or doesn't contain the payload
         """
-        try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms='HS256')
-        except:
-            return False
-        
-        if data.get('confirm') != self.id:
+        data = tokens.decode(token)
+        if data is None or data.get('confirm') != self.id or tokens.use(token) is None:
             return False
         self.confirmed = True
         db.session.add(self)
@@ -86,41 +116,30 @@ class User(db.Model, UserMixin):
     def reset_password(token: str) -> bool|str:
         """
         payload format: {'email': user.email},
-        return False if token is invalid or token doesn't contain the payload
-        """        
-        try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms='HS256')
-        except:
-            return False
-        
-        if data.get('email') is None:
+        return False if token is invalid, used or doesn't contain the payload
+        """
+        data = tokens.decode(token)
+        if data is None or data.get('email') is None or tokens.use(token) is None:
             return False
-        
         return data.get('email')
 
     def update_email(self, token: str) -> bool:
         """
         update user email, payload format: {'update-email': user.email},
-        return False if token is invalid or token doesn't contain the payload
+        return False if token is invalid, used or doesn't contain the payload
         """
-        try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms='HS256')
-        except:
-            return False
-        
-        if data.get('update-email') is None:
+        data = tokens.decode(token)
+        if data is None or data.get('update-email') is None or tokens.use(token) is None:
             return False
-        
         self.email = data.get('update-email')
         self.avatar_hash = self.generate_md5_hash()
         db.session.add(self)
         return True
     
     def ping(self):
-        """Update user's last seen property"""
-        self.last_seen = utcnow()
-        db.session.add(self)
-        db.session.commit()
+        """Record user's activity, last seen is written in batches by the presence tracker"""
+        from app.presence import presence
+        presence.ping(self.id)
 
     def generate_md5_hash(self) -> str:
         """Generate md5 hash using user email"""
@@ -148,4 +167,5 @@ login_manager.anonymous_user = AnonymousUser
 
 @login_manager.user_loader
 def load_user(id :str) -> User:
-    return User.query.get(int(id))
+    from app.identity import identity_cache
+    return identity_cache.load(int(id))
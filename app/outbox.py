@@ -0,0 +1,207 @@
+import secrets
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from flask import Flask, current_app, has_app_context
+from flask_mail import Message
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import Session
+from app import db, mail
+from app.models import OutboxMessage
+from app.util import utcnow
+
+
+class _OutboxState():
+    """Per application worker pool and counters"""
+    def __init__(self):
+        self.lock = Lock()
+        self.wake = Event()
+        self.stop = Event()
+        self.threads = []
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+
+
+class MailOutbox():
+    """
+    Persistent queue of outgoing emails, messages are stored in the `outbox` table
+    and sent in batches over a single SMTP connection by a bounded pool of worker
+    threads, or by a separate `flask mail-worker` process, failed messages are
+    retried with exponential backoff, workers claim messages with a lease so a
+    crashed worker's messages are picked up again once the lease expires
+
+    Messages are written in the caller's transaction, they are sent once it
+    commits and dropped if it's rolled back
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('MAIL_OUTBOX_WORKERS', 2)
+        app.config.setdefault('MAIL_OUTBOX_BATCH_SIZE', 20)
+        app.config.setdefault('MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        app.config.setdefault('MAIL_OUTBOX_RETRY_DELAY', 30)
+        app.config.setdefault('MAIL_OUTBOX_LEASE', 120)
+        app.config.setdefault('MAIL_OUTBOX_POLL_INTERVAL', 5)
+        app.extensions['mail_outbox'] = _OutboxState()
+        if not db.event.contains(Session, 'after_commit', _wake_workers):
+            db.event.listen(Session, 'after_commit', _wake_workers)
+            db.event.listen(Session, 'after_rollback', _discard_messages)
+
+    @property
+    def _state(self) -> _OutboxState:
+        return current_app.extensions['mail_outbox']
+
+    def enqueue(self, msg: Message) -> OutboxMessage:
+        """Add the message to the outbox, the workers are woken up when the caller commits"""
+        row = OutboxMessage.from_message(msg)
+        db.session.add(row)
+        db.session.info['outbox_messages'] = True
+        return row
+
+    def claim(self, batch_size: int) -> list[OutboxMessage]:
+        """Lease a batch of due messages to the caller"""
+        outbox = OutboxMessage.__table__
+        now = utcnow()
+        token = secrets.token_hex(16)
+        due = select(outbox.c.id)\
+            .where(outbox.c.failed == False, outbox.c.next_attempt_at <= now)\
+            .order_by(outbox.c.id)\
+            .limit(batch_size)
+        db.session.execute(
+            update(outbox)
+            .where(outbox.c.id.in_(due), outbox.c.next_attempt_at <= now)
+            .values(
+                claim=token,
+                next_attempt_at=now + timedelta(seconds=current_app.config['MAIL_OUTBOX_LEASE'])))
+        db.session.commit()
+        return OutboxMessage.query.filter_by(claim=token).order_by(OutboxMessage.id).all()
+
+    def _retry(self, row: OutboxMessage, error: Exception) -> None:
+        config = current_app.config
+        row.attempts += 1
+        row.claim = None
+        row.last_error = repr(error)
+        if row.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            row.failed = True
+            current_app.logger.error('giving up on outbox message %d: %r', row.id, error)
+        else:
+            delay = config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (row.attempts - 1)
+            row.next_attempt_at = utcnow() + timedelta(seconds=delay)
+
+    def deliver(self, rows: list[OutboxMessage]) -> int:
+        """Send the given messages over one SMTP connection, return sent messages count"""
+        sent = []
+        failed = []
+        try:
+            with mail.connect() as conn:
+                for row in rows:
+                    try:
+                        conn.send(row.to_message())
+                        sent.append(row.id)
+                    except Exception as e:
+                        failed.append((row, e))
+        except Exception as e:
+            # connection failures, the messages not sent yet are retried
+            failed = [(row, e) for row in rows if row.id not in sent]
+
+        if sent:
+            db.session.execute(
+                delete(OutboxMessage.__table__).where(OutboxMessage.__table__.c.id.in_(sent)))
+        for row, error in failed:
+            self._retry(row, error)
+        db.session.commit()
+
+        state = self._state
+        with state.lock:
+            state.batches += 1
+            state.sent += len(sent)
+            state.retried += sum(1 for row, _ in failed if not row.failed)
+            state.failed += sum(1 for row, _ in failed if row.failed)
+        return len(sent)
+
+    def drain(self) -> int:
+        """Send due messages until none is left, return sent messages count"""
+        sent = 0
+        batch_size = current_app.config['MAIL_OUTBOX_BATCH_SIZE']
+        while True:
+            rows = self.claim(batch_size)
+            if not rows:
+                return sent
+            sent += self.deliver(rows)
+
+    def work(self) -> None:
+        """Drain the outbox until stopped, waiting for new messages in between"""
+        app = current_app._get_current_object()
+        state = self._state
+        while not state.stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                app.logger.exception('mail outbox worker failed')
+            finally:
+                db.session.remove()
+            state.wake.wait(app.config['MAIL_OUTBOX_POLL_INTERVAL'])
+            state.wake.clear()
+
+    def _run_worker(self, app: Flask) -> None:
+        with app.app_context():
+            self.work()
+
+    def start_workers(self) -> None:
+        """Start the worker threads of the application if they are not running"""
+        state = self._state
+        with state.lock:
+            if state.threads:
+                return
+            app = current_app._get_current_object()
+            for i in range(app.config['MAIL_OUTBOX_WORKERS']):
+                thr = Thread(
+                    target=self._run_worker, args=[app], name=f'mail-outbox-{i}', daemon=True)
+                thr.start()
+                state.threads.append(thr)
+
+    def stop_workers(self, timeout: float=None) -> None:
+        """Stop the worker threads after their current batch"""
+        state = self._state
+        state.stop.set()
+        state.wake.set()
+        for thr in state.threads:
+            thr.join(timeout)
+        state.threads = []
+        state.stop.clear()
+
+    def stats(self) -> dict:
+        """Return queue depth metrics and this process' delivery counters"""
+        outbox = OutboxMessage.__table__
+        pending, oldest = db.session.execute(
+            select(func.count(), func.min(outbox.c.created_at))
+            .where(outbox.c.failed == False)).one()
+        failed = db.session.scalar(
+            select(func.count()).select_from(outbox).where(outbox.c.failed == True))
+        state = self._state
+        with state.lock:
+            return dict(
+                pending=pending,
+                failed=failed,
+                oldest_pending=oldest,
+                sent=state.sent,
+                retried=state.retried,
+                gave_up=state.failed,
+                batches=state.batches)
+
+
+outbox = MailOutbox()
+
+
+def _wake_workers(session):
+    if session.info.pop('outbox_messages', False) and has_app_context() and \
+            current_app.config['MAIL_OUTBOX_WORKERS'] > 0:
+        outbox.start_workers()
+        current_app.extensions['mail_outbox'].wake.set()
+
+
+def _discard_messages(session):
+    session.info.pop('outbox_messages', None)
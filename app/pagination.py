@@ -0,0 +1,91 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import DateTime, and_, or_
+
+
+def encode_cursor(values: list, direction: str='next') -> str:
+    """Encode the key values of a row into an opaque url-safe cursor"""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    payload = json.dumps([direction, values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor: str, keys: list) -> tuple[str, list]|None:
+    """Return (direction, key values) of given cursor, None if cursor is invalid"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(payload)
+        if direction not in ('next', 'prev') or len(values) != len(keys):
+            return None
+        values = [
+            datetime.fromisoformat(v) if isinstance(key.type, DateTime) else v
+            for key, v in zip(keys, values)]
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return direction, values
+
+
+def _after(keys: list, values: list, descending: bool):
+    """Build the row comparison (k1, k2, ...) </> (v1, v2, ...) as an index friendly OR chain"""
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        cmp = key < value if descending else key > value
+        clauses.append(and_(*[k == v for k, v in zip(keys[:i], values[:i])], cmp))
+    return or_(*clauses)
+
+
+class KeysetPagination():
+    """
+    Keyset (cursor) pagination of a query in descending order of the given keys,
+    the last key must be unique (e.g. the primary key) to break ties, pages are
+    fetched with a range condition on the keys instead of OFFSET, the total
+    count is only computed if `count` is True
+    """
+    def __init__(self, query, keys: list, per_page: int, cursor: str=None, count: bool=False):
+        self.keys = keys
+        self.per_page = per_page
+        self.cursor = cursor
+        self.total = query.order_by(None).count() if count else None
+
+        decoded = decode_cursor(cursor, keys) if cursor else None
+        direction, values = decoded if decoded else ('next', None)
+        descending = direction == 'next'
+
+        q = query.order_by(None)
+        if values is not None:
+            q = q.filter(_after(keys, values, descending))
+        order = [k.desc() if descending else k.asc() for k in keys]
+        items = q.order_by(*order).limit(per_page + 1).all()
+        more = len(items) > per_page
+        items = items[:per_page]
+
+        if descending:
+            self.has_next = more
+            self.has_prev = values is not None
+        else:
+            items.reverse()
+            self.has_next = True
+            self.has_prev = more
+        self.items = items
+
+    def _key_values(self, item) -> list:
+        return [getattr(item, key.key) for key in self.keys]
+
+    @property
+    def next_cursor(self) -> str|None:
+        """Cursor of the page after this one"""
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self._key_values(self.items[-1]), 'next')
+
+    @property
+    def prev_cursor(self) -> str|None:
+        """Cursor of the page before this one"""
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(self._key_values(self.items[0]), 'prev')
+
+    def __iter__(self):
+        return iter(self.items)
@@ -0,0 +1,176 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock, BoundedSemaphore
+from flask import Flask, current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password verifications are already queued"""
+
+
+def method_of(pwhash: str) -> str:
+    """Hashing method and parameters of a stored hash, e.g. `scrypt:32768:8:1`"""
+    return pwhash.partition('$')[0]
+
+
+def verify(pwhash: str, password: str, method: str, salt_length: int) -> tuple[bool, str|None]:
+    """
+    Check a password against its hash, return whether it matches and a new hash
+    if it matches but was made with other parameters than `method`, runs in the
+    worker processes
+    """
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if method_of(pwhash) != method:
+        return True, generate_password_hash(password, method, salt_length)
+    return True, None
+
+
+def hashes_per_second(method: str, duration: float=1.0) -> float:
+    """Measure the hashes per second of a method on one core"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        generate_password_hash('benchmark password', method)
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return count / elapsed
+
+
+def benchmark(methods: list[str], duration: float=1.0, processes: int=None) -> dict:
+    """
+    Measure the hashes per second of each method with all the cores busy, one
+    process per core, return per core and total rates by method
+    """
+    processes = processes or os.cpu_count() or 1
+    results = {}
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for method in methods:
+            rates = list(pool.map(hashes_per_second, [method] * processes, [duration] * processes))
+            results[method] = dict(
+                per_core=round(sum(rates) / processes, 2), total=round(sum(rates), 2), cores=processes)
+    return results
+
+
+class _PasswordState():
+    """Per application worker pool and queue slots"""
+    def __init__(self, slots: int):
+        self.lock = Lock()
+        self.pool = None
+        self.slots = BoundedSemaphore(slots)
+        self.methods = {}  # configured method -> full method of its hashes
+        self.rejected = 0
+        self.rehashed = 0
+
+
+class PasswordHasher():
+    """
+    Password hashing with the method and cost of `PASSWORD_HASH_METHOD` (any
+    werkzeug method, e.g. `scrypt:32768:8:1` or `pbkdf2:sha256:600000`),
+    verifications run in a pool of `PASSWORD_WORKERS` processes so a burst of
+    logins doesn't hold the request threads on CPU, at most
+    `PASSWORD_QUEUE_SIZE` verifications wait for the pool, others raise
+    `PasswordPoolBusy` right away (answered with 429), hashes made with other
+    parameters are replaced on the next successful login
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_WORKERS', 2)
+        app.config.setdefault('PASSWORD_QUEUE_SIZE', 16)
+        app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', 10)
+        app.extensions['passwords'] = _PasswordState(
+            app.config['PASSWORD_WORKERS'] + app.config['PASSWORD_QUEUE_SIZE'])
+
+    @property
+    def _state(self) -> _PasswordState:
+        return current_app.extensions['passwords']
+
+    def _pool(self) -> ProcessPoolExecutor:
+        state = self._state
+        with state.lock:
+            if state.pool is None:
+                state.pool = ProcessPoolExecutor(
+                    current_app.config['PASSWORD_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'))
+            return state.pool
+
+    @property
+    def method(self) -> str:
+        """Configured method with all its parameters, as written in the hashes"""
+        state = self._state
+        method = current_app.config['PASSWORD_HASH_METHOD']
+        full = state.methods.get(method)
+        if full is None:
+            # werkzeug fills in the default parameters of short methods ('scrypt')
+            full = method_of(generate_password_hash('', method, 1))
+            with state.lock:
+                state.methods[method] = full
+        return full
+
+    def hash(self, password: str) -> str:
+        return generate_password_hash(
+            password, self.method, current_app.config['PASSWORD_SALT_LENGTH'])
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return method_of(pwhash) != self.method
+
+    def verify(self, pwhash: str, password: str) -> tuple[bool, str|None]:
+        """
+        Check a password against its hash in the worker pool, return whether it
+        matches and the new hash to store if it was made with other parameters,
+        raise PasswordPoolBusy if the pool and its queue are full or the
+        verification takes longer than `PASSWORD_VERIFY_TIMEOUT` seconds
+        """
+        config = current_app.config
+        args = (pwhash, password, self.method, config['PASSWORD_SALT_LENGTH'])
+        if config['PASSWORD_WORKERS'] <= 0:
+            return verify(*args)
+        state = self._state
+        if not state.slots.acquire(blocking=False):
+            with state.lock:
+                state.rejected += 1
+            raise PasswordPoolBusy()
+        try:
+            future = self._pool().submit(verify, *args)
+        except BaseException:
+            state.slots.release()
+            raise
+        # the slot is held until the job is done, not until the request gives up
+        future.add_done_callback(lambda f: state.slots.release())
+        try:
+            return future.result(config['PASSWORD_VERIFY_TIMEOUT'])
+        except TimeoutError:
+            # frees the slot right away if the job is still queued
+            future.cancel()
+            with state.lock:
+                state.rejected += 1
+            raise PasswordPoolBusy()
+
+    def record_rehash(self) -> None:
+        state = self._state
+        with state.lock:
+            state.rehashed += 1
+
+    def stats(self) -> dict:
+        state = self._state
+        with state.lock:
+            return dict(rejected=state.rejected, rehashed=state.rehashed)
+
+    def shutdown(self) -> None:
+        state = self._state
+        with state.lock:
+            if state.pool is not None:
+                state.pool.shutdown()
+                state.pool = None
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,109 @@
+import time
+from threading import Lock
+from datetime import datetime, timezone
+from flask import Flask, current_app
+from sqlalchemy import update, bindparam
+from app import db
+
+
+class _PresenceState():
+    """Per application buffer of users' activity"""
+    def __init__(self, interval: int, granularity: int):
+        self.interval = interval
+        self.granularity = granularity
+        self.lock = Lock()
+        self.pending = {}  # user id -> last activity (epoch seconds)
+        self.recorded = {}  # user id -> last timestamp accepted for writing
+        self.last_flush = time.monotonic()
+        self.pings = 0
+        self.absorbed = 0
+        self.flushed = 0
+        self.flushes = 0
+
+
+class PresenceTracker():
+    """
+    Record users' activity in memory and write `users.last_seen` in batched
+    UPDATEs, a user active within the granularity window causes no write,
+    buffered timestamps are written at most once every flush interval
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('PRESENCE_FLUSH_INTERVAL', 60)
+        app.config.setdefault('PRESENCE_GRANULARITY', 60)
+        app.extensions['presence'] = _PresenceState(
+            app.config['PRESENCE_FLUSH_INTERVAL'],
+            app.config['PRESENCE_GRANULARITY'])
+
+    @property
+    def _state(self) -> _PresenceState:
+        return current_app.extensions['presence']
+
+    def ping(self, user_id: int) -> None:
+        """Record an activity of the given user"""
+        state = self._state
+        now = time.time()
+        with state.lock:
+            state.pings += 1
+            last = state.recorded.get(user_id)
+            if last is not None and now - last < state.granularity:
+                state.absorbed += 1
+                return
+            state.recorded[user_id] = now
+            state.pending[user_id] = now
+
+    def should_flush(self) -> bool:
+        """Check if the flush interval has elapsed and there is pending activity"""
+        state = self._state
+        return bool(state.pending) and \
+            time.monotonic() - state.last_flush >= state.interval
+
+    def flush(self) -> int:
+        """Write pending activity in a single batched UPDATE, return written rows count"""
+        from app.models import User
+        state = self._state
+        now = time.time()
+        with state.lock:
+            pending, state.pending = state.pending, {}
+            state.last_flush = time.monotonic()
+            # forget users that left the granularity window, their next
+            # activity has to be written anyway
+            state.recorded = {
+                user_id: ts for user_id, ts in state.recorded.items()
+                if now - ts < state.granularity}
+        if not pending:
+            return 0
+
+        users = User.__table__
+        # activity is not an edit of the account, keep its version as is
+        stmt = update(users)\
+            .where(users.c.id == bindparam('user_id'))\
+            .values(last_seen=bindparam('last_seen'), updated_at=users.c.updated_at)
+        rows = [
+            {'user_id': user_id,
+             'last_seen': datetime.fromtimestamp(ts, timezone.utc)}
+            for user_id, ts in pending.items()]
+        with db.engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+        with state.lock:
+            state.flushed += len(rows)
+            state.flushes += 1
+        return len(rows)
+
+    def stats(self) -> dict:
+        """Return counters of absorbed pings versus flushed writes"""
+        state = self._state
+        with state.lock:
+            return dict(
+                pings=state.pings,
+                absorbed=state.absorbed,
+                pending=len(state.pending),
+                flushed=state.flushed,
+                flushes=state.flushes)
+
+
+presence = PresenceTracker()
@@ -0,0 +1,39 @@
+from flask import Flask, g, request, current_app, has_request_context
+from sqlalchemy import event
+from app import db
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+class QueryGuard():
+    """
+    Count the SQL queries issued while handling each request and log a warning
+    when a view goes over `QUERY_COUNT_THRESHOLD`, only active in debug mode
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('QUERY_COUNT_THRESHOLD', 30)
+        if not app.debug:
+            return
+        with app.app_context():
+            engine = db.engine
+        if not event.contains(engine, 'before_cursor_execute', _count_query):
+            event.listen(engine, 'before_cursor_execute', _count_query)
+        app.after_request(self._check)
+
+    def _check(self, response):
+        count = g.get('query_count', 0)
+        threshold = current_app.config['QUERY_COUNT_THRESHOLD']
+        if count > threshold:
+            current_app.logger.warning(
+                '%s issued %d queries (threshold %d)', request.endpoint, count, threshold)
+        return response
+
+
+query_guard = QueryGuard()
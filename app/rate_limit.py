@@ -0,0 +1,166 @@
+import time
+import sqlite3
+import hashlib
+from threading import local
+from flask import Flask, request, current_app
+from flask_login import current_user
+
+
+class Limit():
+    """
+    At most `count` requests per `period` seconds for each value of `key`, the
+    client's ip address (`ip`), the logged in user (`user`) or the submitted
+    email address (`email`), e.g. `Limit('email', 5, 60)`
+    """
+    keys = ('ip', 'user', 'email')
+
+    def __init__(self, key: str, count: int, period: float):
+        if key not in self.keys:
+            raise ValueError(f'unknown rate limit key {key}')
+        self.key = key
+        self.count = count
+        self.period = period
+        # generic cell rate algorithm: a request is due every `interval` and
+        # `count` requests may arrive at once
+        self.interval = period / count
+
+    def value(self) -> str|None:
+        """Value of the key for the current request, None if it has none (e.g. anonymous user)"""
+        if self.key == 'ip':
+            return request.remote_addr
+        if self.key == 'user':
+            return current_user.get_id() if current_user.is_authenticated else None
+        email = (request.form.get('email') or '').strip().lower()
+        # addresses are not kept in the stores
+        return hashlib.sha1(email.encode('utf-8')).hexdigest() if email else None
+
+
+class MemoryStore():
+    """
+    Buckets of the process, one float per active key (the time its bucket is
+    full again), updates don't take a lock, concurrent requests of one key may
+    let a few more requests through, which is fine for throttling
+    """
+    def __init__(self):
+        self._buckets = {}  # key -> theoretical arrival time
+
+    def hit(self, key: str, interval: float, period: float, now: float) -> float:
+        """Count a request, return 0 if it's allowed or the seconds to wait for it"""
+        tat = max(self._buckets.get(key, now), now)
+        if tat + interval - now > period:
+            return tat + interval - now - period
+        self._buckets[key] = tat + interval
+        return 0
+
+    def evict(self, now: float) -> int:
+        """Drop the full buckets, they are equivalent to no bucket, return dropped count"""
+        idle = [key for key, tat in list(self._buckets.items()) if tat <= now]
+        for key in idle:
+            self._buckets.pop(key, None)
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteStore():
+    """Buckets stored in a local sqlite file, shared by all the workers of a host"""
+    def __init__(self, path: str):
+        self.path = path
+        self._local = local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tat REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_tat ON buckets (tat)')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, interval: float, period: float, now: float) -> float:
+        conn = self._conn()
+        # one statement, concurrent workers can't both take the last token
+        row = conn.execute(
+            'INSERT INTO buckets VALUES (:key, :now + :interval) '
+            'ON CONFLICT(key) DO UPDATE SET tat = max(tat, :now) + :interval '
+            'WHERE max(tat, :now) + :interval - :now <= :period RETURNING tat',
+            dict(key=key, now=now, interval=interval, period=period)).fetchone()
+        if row is not None:
+            return 0
+        tat = conn.execute('SELECT tat FROM buckets WHERE key = ?', (key,)).fetchone()
+        return max((tat[0] if tat else now) + interval - now - period, 0.001)
+
+    def evict(self, now: float) -> int:
+        return self._conn().execute('DELETE FROM buckets WHERE tat <= ?', (now,)).rowcount
+
+    def __len__(self) -> int:
+        return self._conn().execute('SELECT count(*) FROM buckets').fetchone()[0]
+
+
+class _RateLimitState():
+    """Per application store and eviction schedule"""
+    def __init__(self, store: MemoryStore|SQLiteStore|None):
+        self.store = store
+        self.evict_at = 0.0
+
+
+class RateLimiter():
+    """
+    Token bucket rate limits of the views decorated with `rate_limit`, buckets
+    are kept per process (`memory`) or in a sqlite file shared by the workers of
+    a host (`sqlite`), full buckets are evicted every `RATE_LIMIT_EVICT_INTERVAL`
+    seconds so memory only grows with the recently active keys
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_PATH', None)
+        app.config.setdefault('RATE_LIMIT_EVICT_INTERVAL', 60)
+        backend = app.config['RATE_LIMIT_BACKEND']
+        if backend == 'memory':
+            store = MemoryStore()
+        elif backend == 'sqlite':
+            store = SQLiteStore(app.config['RATE_LIMIT_PATH'])
+        else:
+            store = None
+        app.extensions['rate_limit'] = _RateLimitState(store)
+
+    @property
+    def _state(self) -> _RateLimitState:
+        return current_app.extensions['rate_limit']
+
+    @property
+    def store(self) -> MemoryStore|SQLiteStore|None:
+        return self._state.store
+
+    def hit(self, limits: tuple[Limit]) -> float:
+        """
+        Count the current request against the limits of its endpoint, return 0
+        if it's allowed or the seconds to wait before the next one is
+        """
+        state = self._state
+        if state.store is None or not current_app.config['RATE_LIMIT_ENABLED']:
+            return 0
+        now = time.time()
+        if now >= state.evict_at:
+            state.evict_at = now + current_app.config['RATE_LIMIT_EVICT_INTERVAL']
+            state.store.evict(now)
+        for limit in limits:
+            value = limit.value()
+            if value is None:
+                continue
+            wait = state.store.hit(
+                f'{request.endpoint}:{limit.key}:{value}', limit.interval, limit.period, now)
+            if wait:
+                return wait
+        return 0
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,129 @@
+import time
+from threading import Lock
+from types import MappingProxyType
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import db
+
+
+class _Snapshot():
+    """Immutable rows of a reference table at a version"""
+    def __init__(self, version: int, rows: list):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.choices = tuple((id, name) for id, name, *_ in rows)
+        self.ids = MappingProxyType({name: id for id, name in self.choices})
+        # value column of the table by id, e.g. the permissions of the roles
+        self.values = MappingProxyType({row[0]: row[2] for row in rows if len(row) > 2})
+
+
+class _ReferenceState():
+    """Per application snapshots and versions of the reference tables"""
+    def __init__(self):
+        self.lock = Lock()
+        self.versions = {}  # table -> version
+        self.snapshots = {}  # table -> _Snapshot
+        self.loads = 0
+
+
+def _tables() -> dict:
+    from app.models import Category, Role
+    # table -> (model, order of the choices, value columns)
+    return {
+        'categories': (Category, Category.name, ()),
+        'roles': (Role, Role.id, (Role.permissions,)),
+    }
+
+
+class ReferenceData():
+    """
+    Cache of small, rarely changing tables (categories, roles) used as form
+    choices and lookups by name, each table has a version bumped on commit of a
+    change made by this process, snapshots of older versions are reloaded with
+    one query, changes made by other processes are picked up after
+    `REFERENCE_DATA_TTL` seconds, a session with uncommitted changes of a table
+    reads it without caching it, the changes may be rolled back
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('REFERENCE_DATA_TTL', 60)
+        app.extensions['reference_data'] = _ReferenceState()
+        if not db.event.contains(Session, 'after_commit', _bump_versions):
+            for model, *_ in _tables().values():
+                for event_name in ('after_insert', 'after_update', 'after_delete'):
+                    db.event.listen(model, event_name, _record_change)
+            db.event.listen(Session, 'after_commit', _bump_versions)
+            db.event.listen(Session, 'after_rollback', _discard_changes)
+
+    @property
+    def _state(self) -> _ReferenceState:
+        return current_app.extensions['reference_data']
+
+    def _snapshot(self, table: str, reload: bool=False) -> _Snapshot:
+        state = self._state
+        version = state.versions.get(table, 0)
+        snapshot = state.snapshots.get(table)
+        uncommitted = table in db.session.info.get('reference_changed', ())
+        if snapshot is not None and snapshot.version == version and not reload and \
+                not uncommitted and \
+                time.monotonic() - snapshot.loaded_at < current_app.config['REFERENCE_DATA_TTL']:
+            return snapshot
+        model, order, values = _tables()[table]
+        with db.session.no_autoflush:
+            rows = db.session.execute(
+                select(model.id, model.name, *values).order_by(order)).all()
+        snapshot = _Snapshot(version, rows)
+        if not uncommitted:
+            with state.lock:
+                # a snapshot loaded before a commit is stored with the version it was
+                # loaded at, it's reloaded on next read
+                state.snapshots[table] = snapshot
+                state.loads += 1
+        return snapshot
+
+    def choices(self, table: str) -> tuple:
+        """Return (id, name) of the rows of a reference table"""
+        return self._snapshot(table).choices
+
+    def id(self, table: str, name: str) -> int|None:
+        """Return the id of a row of a reference table by name"""
+        return self._snapshot(table).ids.get(name)
+
+    def value(self, table: str, id: int) -> object:
+        """
+        Return the value column of a row of a reference table by id, the table
+        is reloaded for unknown ids (e.g. rows added by other processes)
+        """
+        values = self._snapshot(table).values
+        if id not in values:
+            values = self._snapshot(table, reload=True).values
+        return values.get(id)
+
+    def invalidate(self, *tables: str) -> None:
+        state = self._state
+        with state.lock:
+            for table in tables:
+                state.versions[table] = state.versions.get(table, 0) + 1
+
+
+reference_data = ReferenceData()
+
+
+def _record_change(mapper, connection, target):
+    session = db.object_session(target)
+    if session is not None:
+        session.info.setdefault('reference_changed', set()).add(target.__tablename__)
+
+
+def _bump_versions(session):
+    tables = session.info.pop('reference_changed', None)
+    if tables and has_app_context():
+        reference_data.invalidate(*tables)
+
+
+def _discard_changes(session):
+    session.info.pop('reference_changed', None)
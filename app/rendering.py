@@ -0,0 +1,123 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock, local
+from typing import Callable, Iterable
+import bleach
+from markdown import Markdown
+from sqlalchemy import select, update, func
+from app import db
+from app.fragment_cache import fragment_cache
+
+
+allowed_tags = [
+    'a', 'b', 'p', 'i', 'ul', 'li', 'ol', 'em',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre',
+    'abbr', 'acronym', 'blockquote', 'code', 'strong']
+
+
+class MarkdownRenderer():
+    """
+    Convert markdown to sanitized html, rendered html is kept in an LRU cache
+    keyed by the hash of the markdown source and the sanitizer config
+    """
+    def __init__(self, tags: list=allowed_tags, cache_size: int=1024):
+        self.tags = list(tags)
+        self.cache_size = cache_size
+        self._config_key = ','.join(sorted(self.tags)).encode('utf-8')
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        # markdown and bleach objects are not thread safe, build them once per thread
+        self._local = local()
+        self.hits = 0
+        self.misses = 0
+
+    def _pipeline(self) -> tuple[Markdown, bleach.Cleaner, bleach.Linker]:
+        pipeline = getattr(self._local, 'pipeline', None)
+        if pipeline is None:
+            pipeline = (
+                Markdown(output_format='html'),
+                bleach.Cleaner(tags=self.tags, strip=True),
+                bleach.Linker())
+            self._local.pipeline = pipeline
+        return pipeline
+
+    def _key(self, text: str) -> str:
+        h = hashlib.sha256(self._config_key)
+        h.update(b'\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def _render(self, text: str) -> str:
+        md, cleaner, linker = self._pipeline()
+        html = md.reset().convert(text)
+        return linker.linkify(cleaner.clean(html))
+
+    def render(self, text: str|None) -> str|None:
+        """Return the sanitized html of given markdown text"""
+        if text is None:
+            return None
+        key = self._key(text)
+        with self._lock:
+            html = self._cache.get(key)
+            if html is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = self._render(text)
+        with self._lock:
+            self._cache[key] = html
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return html
+
+    def render_many(self, texts: Iterable[str|None]) -> list[str|None]:
+        """Render a batch of markdown texts, duplicates are rendered once"""
+        rendered = {}
+        result = []
+        for text in texts:
+            if text not in rendered:
+                rendered[text] = self.render(text)
+            result.append(rendered[text])
+        return result
+
+    def clear(self) -> None:
+        """Drop all cached html"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+renderer = MarkdownRenderer()
+
+
+def rerender_posts(chunk_size: int=500, progress: Callable[[int, int], None]=None) -> int:
+    """
+    Re-render `body_html` of all posts in chunks ordered by id, each chunk is
+    written with a single bulk UPDATE and committed, return rendered posts count
+    """
+    from app.models import Post
+    total = db.session.scalar(select(func.count(Post.id)))
+    done = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Post.id, Post.body)
+            .where(Post.id > last_id)
+            .order_by(Post.id)
+            .limit(chunk_size)).all()
+        if not rows:
+            break
+        html = renderer.render_many(row.body for row in rows)
+        db.session.execute(
+            update(Post),
+            [{'id': row.id, 'body_html': body_html} for row, body_html in zip(rows, html)])
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(done, total)
+    # bulk updates skip the session events
+    fragment_cache.invalidate('posts')
+    return done
@@ -0,0 +1,227 @@
+import re
+from typing import Callable
+from markupsafe import Markup, escape
+from flask import Flask
+from sqlalchemy import DDL, Float, Integer, column, text, select, func
+from app import db
+from app.pagination import encode_cursor, decode_cursor
+
+
+# posts and comments share the index, their rowid is 2 * id for posts and
+# 2 * id + 1 for comments so rows are updated and deleted by rowid lookups
+create_index = DDL(
+    'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+    'post_id UNINDEXED, title, body, tokenize="porter unicode61")')
+drop_index = DDL('DROP TABLE IF EXISTS search_index')
+
+# column weights of bm25: post_id, title, body
+ranking = 'bm25(search_index, 0.0, 10.0, 1.0)'
+# snippets are escaped, these markers are replaced by <mark> tags afterwards
+mark_start, mark_end = '\x02', '\x03'
+keys = [column('score', Float), column('rowid', Integer)]
+
+
+def include_name(name: str, type_: str, parent_names: dict) -> bool:
+    """Hide the search index tables from migrations autogenerate"""
+    return not (type_ == 'table' and name.startswith('search_index'))
+
+
+def _index_post(connection, post_id: int, title: str|None, body: str|None) -> None:
+    connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': 2 * post_id})
+    connection.execute(
+        text('INSERT INTO search_index (rowid, post_id, title, body) '
+             'VALUES (:rowid, :post_id, :title, :body)'),
+        {'rowid': 2 * post_id, 'post_id': post_id, 'title': title or '', 'body': body or ''})
+
+
+def _index_comment(connection, comment_id: int, post_id: int|None, body: str|None) -> None:
+    rowid = 2 * comment_id + 1
+    connection.execute(text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': rowid})
+    connection.execute(
+        text('INSERT INTO search_index (rowid, post_id, title, body) '
+             'VALUES (:rowid, :post_id, \'\', :body)'),
+        {'rowid': rowid, 'post_id': post_id, 'body': body or ''})
+
+
+def _changed(target, *attrs: str) -> bool:
+    state = db.inspect(target)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def _on_post_changed(mapper, connection, target):
+    if connection.dialect.name != 'sqlite' or not _changed(target, 'title', 'body'):
+        return
+    _index_post(connection, target.id, target.title, target.body)
+
+
+def _on_post_deleted(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(
+            text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': 2 * target.id})
+
+
+def _on_comment_changed(mapper, connection, target):
+    if connection.dialect.name != 'sqlite' or not _changed(target, 'body', 'post_id'):
+        return
+    _index_comment(connection, target.id, target.post_id, target.body)
+
+
+def _on_comment_deleted(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(
+            text('DELETE FROM search_index WHERE rowid = :rowid'), {'rowid': 2 * target.id + 1})
+
+
+def match_query(q: str) -> str|None:
+    """
+    Build an FTS5 query from user input, terms are quoted so FTS5 operators are
+    not interpreted, all terms must match and the last one matches as a prefix
+    if it's long enough, short prefixes would match most of the index
+    """
+    words = re.findall(r'\w+', q or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 3:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet: str) -> Markup:
+    return Markup(str(escape(snippet)).replace(mark_start, '<mark>').replace(mark_end, '</mark>'))
+
+
+class SearchHit():
+    """A post or a comment matching a search"""
+    def __init__(self, rowid: int, post_id: int, score: float, title: str, body: str):
+        self.rowid = rowid
+        self.kind = 'comment' if rowid % 2 else 'post'
+        self.id = rowid // 2
+        self.post_id = post_id
+        self.score = score
+        self.title = highlight(title)
+        self.body = highlight(body)
+        self.post = None
+
+
+class SearchResults():
+    """
+    A page of the posts and comments matching a query, best match first,
+    paged with a cursor on (bm25 score, rowid), the matched posts are loaded in
+    a single query
+    """
+    def __init__(self, q: str, per_page: int, cursor: str=None):
+        from app.models import Post
+        self.q = q
+        self.per_page = per_page
+        self.items = []
+        self.has_next = False
+        match = match_query(q)
+        if match is None:
+            return
+
+        decoded = decode_cursor(cursor, keys) if cursor else None
+        after = decoded[1] if decoded and decoded[0] == 'next' else None
+        sql = (
+            f'SELECT rowid, post_id, {ranking} AS score, '
+            f"highlight(search_index, 1, :start, :end) AS title, "
+            f"snippet(search_index, 2, :start, :end, '…', 24) AS body "
+            f'FROM search_index WHERE search_index MATCH :match ')
+        params = {'match': match, 'start': mark_start, 'end': mark_end, 'limit': per_page + 1}
+        if after is not None:
+            sql += f'AND ({ranking} > :score OR ({ranking} = :score AND rowid > :rowid)) '
+            params.update(score=after[0], rowid=after[1])
+        sql += 'ORDER BY score, rowid LIMIT :limit'
+        rows = db.session.execute(text(sql), params).all()
+
+        self.has_next = len(rows) > per_page
+        self.items = [SearchHit(*row) for row in rows[:per_page]]
+        post_ids = {hit.post_id for hit in self.items}
+        if post_ids:
+            posts = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids))}
+            for hit in self.items:
+                hit.post = posts.get(hit.post_id)
+            # hits of deleted posts
+            self.items = [hit for hit in self.items if hit.post is not None]
+
+    @property
+    def next_cursor(self) -> str|None:
+        if not self.has_next or not self.items:
+            return None
+        last = self.items[-1]
+        return encode_cursor([last.score, last.rowid], 'next')
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class Search():
+    """
+    Full-text search over posts and comments with an SQLite FTS5 index, the
+    index is created with the tables and kept in sync by mapper events in the
+    transaction of the change, `rebuild` (`flask search rebuild`) indexes the
+    existing rows in batches
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('SEARCH_RESULTS_PER_PAGE', 20)
+        if not db.event.contains(db.metadata, 'after_create', _create_index):
+            from app.models import Post, Comment
+            db.event.listen(db.metadata, 'after_create', _create_index)
+            db.event.listen(db.metadata, 'before_drop', _drop_index)
+            for event_name in ('after_insert', 'after_update'):
+                db.event.listen(Post, event_name, _on_post_changed)
+                db.event.listen(Comment, event_name, _on_comment_changed)
+            db.event.listen(Post, 'after_delete', _on_post_deleted)
+            db.event.listen(Comment, 'after_delete', _on_comment_deleted)
+
+    def search(self, q: str, per_page: int, cursor: str=None) -> SearchResults:
+        return SearchResults(q, per_page, cursor)
+
+    def rebuild(self, chunk_size: int=1000, progress: Callable[[int, int], None]=None) -> int:
+        """Index all posts and comments again, return indexed rows count"""
+        from app.models import Post, Comment
+        db.session.execute(text('DELETE FROM search_index'))
+        db.session.commit()
+        total = db.session.scalar(select(func.count(Post.id))) + \
+            db.session.scalar(select(func.count(Comment.id)))
+        done = 0
+        batches = (
+            ('SELECT 2 * id, id, title, body FROM posts', Post),
+            ('SELECT 2 * id + 1, post_id, \'\', body FROM comments', Comment))
+        for source, model in batches:
+            last_id = 0
+            while True:
+                ids = db.session.scalars(
+                    select(model.id).where(model.id > last_id).order_by(model.id).limit(chunk_size)).all()
+                if not ids:
+                    break
+                db.session.execute(
+                    text(f'INSERT INTO search_index (rowid, post_id, title, body) '
+                         f'{source} WHERE id >= :first AND id <= :last'),
+                    {'first': ids[0], 'last': ids[-1]})
+                db.session.commit()
+                done += len(ids)
+                last_id = ids[-1]
+                if progress is not None:
+                    progress(done, total)
+        # merge the index segments written by the batches
+        db.session.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+        db.session.commit()
+        return done
+
+
+def _create_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(create_index)
+
+
+def _drop_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(drop_index)
+
+
+search = Search()
@@ -0,0 +1,213 @@
+import time
+import heapq
+import sqlite3
+import secrets
+import hashlib
+from collections import OrderedDict
+from threading import Lock, local
+import jwt
+from flask import Flask, current_app, has_app_context
+from sqlalchemy.orm import Session
+from app import db
+
+
+def key_id(key: str) -> str:
+    """Short id of a signing key, sent in the header of the tokens"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]
+
+
+def digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+
+class MemoryLedger():
+    """Used tokens of the process, each id is kept until its token expires"""
+    def __init__(self):
+        self._used = {}  # token id -> expires at
+        self._expiry = []  # heap of (expires at, token id)
+        self._lock = Lock()
+
+    def add(self, id: str, expires: float) -> bool:
+        """Record a token as used, return False if it already was"""
+        now = time.time()
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < now:
+                _, expired = heapq.heappop(self._expiry)
+                self._used.pop(expired, None)
+            if id in self._used:
+                return False
+            self._used[id] = expires
+            heapq.heappush(self._expiry, (expires, id))
+            return True
+
+    def discard(self, id: str) -> None:
+        """Forget a used token, its heap entry is dropped when it expires"""
+        with self._lock:
+            self._used.pop(id, None)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._used
+
+    def __len__(self) -> int:
+        return len(self._used)
+
+
+class SQLiteLedger():
+    """Used tokens stored in a local sqlite file, shared by all the workers of a host"""
+    def __init__(self, path: str):
+        self.path = path
+        self._local = local()
+        self._adds = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS used (id TEXT PRIMARY KEY, expires REAL)')
+            self._local.conn = conn
+        return conn
+
+    def add(self, id: str, expires: float) -> bool:
+        conn = self._conn()
+        added = conn.execute('INSERT OR IGNORE INTO used VALUES (?, ?)', (id, expires)).rowcount
+        self._adds += 1
+        if self._adds % 100 == 0:
+            conn.execute('DELETE FROM used WHERE expires < ?', (time.time(),))
+        return added == 1
+
+    def discard(self, id: str) -> None:
+        self._conn().execute('DELETE FROM used WHERE id = ?', (id,))
+
+    def __contains__(self, id: str) -> bool:
+        return self._conn().execute('SELECT 1 FROM used WHERE id = ?', (id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute('SELECT count(*) FROM used').fetchone()[0]
+
+
+class _TokenState():
+    """Per application verified tokens and ledger"""
+    def __init__(self, ledger: MemoryLedger|SQLiteLedger, max_verified: int):
+        self.lock = Lock()
+        self.ledger = ledger
+        self.max_verified = max_verified
+        self.verified = OrderedDict()  # token digest -> payload
+
+
+class TokenService():
+    """
+    Signed (HS256) tokens sent in emails, e.g. account confirmation links,
+    tokens are signed with `SECRET_KEY` and still accepted if signed with one of
+    `SECRET_KEY_FALLBACKS` so rotating the key doesn't invalidate the links in
+    flight, verified tokens are kept in a small LRU (`TOKEN_CACHE_SIZE`) and
+    used tokens in a ledger until they expire, a replayed token is rejected
+    without decoding it nor reading the database, a token used by a session
+    rolled back (e.g. the new email is taken) can be used again
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('SECRET_KEY_FALLBACKS', [])
+        app.config.setdefault('TOKEN_CACHE_SIZE', 256)
+        app.config.setdefault('TOKEN_LEDGER_BACKEND', 'memory')
+        app.config.setdefault('TOKEN_LEDGER_PATH', None)
+        if app.config['TOKEN_LEDGER_BACKEND'] == 'sqlite':
+            ledger = SQLiteLedger(app.config['TOKEN_LEDGER_PATH'])
+        else:
+            ledger = MemoryLedger()
+        app.extensions['tokens'] = _TokenState(ledger, app.config['TOKEN_CACHE_SIZE'])
+        if not db.event.contains(Session, 'after_rollback', _release_tokens):
+            db.event.listen(Session, 'after_commit', _keep_tokens)
+            db.event.listen(Session, 'after_rollback', _release_tokens)
+
+    @property
+    def _state(self) -> _TokenState:
+        return current_app.extensions['tokens']
+
+    @property
+    def ledger(self) -> MemoryLedger|SQLiteLedger:
+        return self._state.ledger
+
+    def _keys(self) -> dict:
+        keys = [current_app.config['SECRET_KEY'], *current_app.config['SECRET_KEY_FALLBACKS']]
+        return {key_id(key): key for key in keys if key}
+
+    def encode(self, payload: dict, expires_in: int=600) -> str:
+        """Sign payload with the current key, the token expires in given seconds"""
+        key = current_app.config['SECRET_KEY']
+        payload = {**payload, 'exp': time.time() + expires_in, 'jti': secrets.token_urlsafe(12)}
+        return jwt.encode(payload, key, algorithm='HS256', headers={'kid': key_id(key)})
+
+    def decode(self, token: str) -> dict|None:
+        """Return the payload of a valid, unexpired and unused token, None otherwise"""
+        state = self._state
+        token_digest = digest(token)
+        with state.lock:
+            payload = state.verified.get(token_digest)
+            if payload is not None:
+                state.verified.move_to_end(token_digest)
+        if payload is None:
+            payload = self._verify(token)
+            if payload is None:
+                return None
+            with state.lock:
+                state.verified[token_digest] = payload
+                while len(state.verified) > state.max_verified:
+                    state.verified.popitem(last=False)
+        if payload['exp'] < time.time() or self._id(payload, token_digest) in state.ledger:
+            return None
+        return payload
+
+    def _verify(self, token: str) -> dict|None:
+        keys = self._keys()
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError:
+            return None
+        # tokens signed before key ids were sent are checked against all the keys
+        for key in [keys[kid]] if kid in keys else keys.values():
+            try:
+                payload = jwt.decode(
+                    token, key, algorithms=['HS256'], options={'require': ['exp']})
+            except jwt.InvalidSignatureError:
+                continue
+            except jwt.InvalidTokenError:
+                return None
+            return payload
+        return None
+
+    def _id(self, payload: dict, token_digest: str) -> str:
+        return payload.get('jti') or token_digest
+
+    def use(self, token: str) -> dict|None:
+        """
+        Return the payload of a valid token and record it as used, None if it's
+        invalid, expired or was already used, concurrent uses have one winner,
+        the use is undone if the session is rolled back before its next commit
+        """
+        payload = self.decode(token)
+        if payload is None:
+            return None
+        id = self._id(payload, digest(token))
+        if not self._state.ledger.add(id, payload['exp']):
+            return None
+        db.session.info.setdefault('used_tokens', []).append(id)
+        return payload
+
+
+tokens = TokenService()
+
+
+def _keep_tokens(session):
+    session.info.pop('used_tokens', None)
+
+
+def _release_tokens(session):
+    ids = session.info.pop('used_tokens', None)
+    if ids and has_app_context():
+        for id in ids:
+            tokens.ledger.discard(id)
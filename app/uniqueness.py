@@ -0,0 +1,124 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import Flask, current_app
+from flask_wtf import FlaskForm
+from sqlalchemy import select, exists
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Blog, Post
+
+
+class UniqueField():
+    """Unique column and the form field its values are entered in"""
+    def __init__(self, column, field: str, message: str):
+        self.column = column
+        self.field = field
+        self.message = message
+
+
+# by name, e.g. `uniqueness.taken("email", ...)`
+fields = {
+    'email': UniqueField(User.email, 'email', 'email already in use'),
+    'username': UniqueField(User.username, 'username', 'username already in use'),
+    'blog-name': UniqueField(Blog.name, 'name', 'blog name already in use'),
+    'post-title': UniqueField(Post.title, 'title', 'title already in use'),
+}
+# checked while typed by the unauthenticated availability endpoint, emails are
+# left out, it would tell anyone which addresses are registered
+inline_fields = ('username', 'blog-name')
+# by violated column, `table.column`
+columns = {
+    f'{field.column.property.columns[0].table.name}.{field.column.key}': field
+    for field in fields.values()}
+
+
+def violated_column(error: IntegrityError) -> str|None:
+    """Return the `table.column` of the unique constraint violated by an insert or update"""
+    message = str(error.orig)
+    # sqlite names the columns
+    match = re.match(r'UNIQUE constraint failed: (\w+\.\w+)$', message)
+    if match:
+        return match.group(1)
+    # other databases name the constraint or index
+    name = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    if name is None:
+        match = re.search(r"Duplicate entry .* for key '(?:\w+\.)?(\w+)'", message)
+        name = match.group(1) if match else None
+    for table in db.metadata.tables.values():
+        for constraint in (*table.indexes, *table.constraints):
+            if constraint.name == name and len(constraint.columns) == 1:
+                return f'{table.name}.{next(iter(constraint.columns)).name}'
+    return None
+
+
+class _UniquenessState():
+    """Per application cache of the values found available"""
+    def __init__(self):
+        self.lock = Lock()
+        self.available = OrderedDict()  # (name, value) -> expires at
+
+
+class Uniqueness():
+    """
+    Unique values (emails, usernames, blog names, post titles) are not looked
+    up before they are written, `save` commits and maps a violated unique
+    index back to the field of the form, so a value is checked by the index
+    alone, even under concurrent requests
+
+    `taken` answers the inline validation of the forms with an EXISTS query,
+    values found available are cached for `UNIQUE_CHECK_TTL` seconds as the
+    same value is checked while it's being typed
+    """
+    def __init__(self, app: Flask=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('UNIQUE_CHECK_TTL', 5)
+        app.config.setdefault('UNIQUE_CHECK_CACHE_SIZE', 1024)
+        app.extensions['uniqueness'] = _UniquenessState()
+
+    @property
+    def _state(self) -> _UniquenessState:
+        return current_app.extensions['uniqueness']
+
+    def save(self, form: FlaskForm=None) -> bool:
+        """
+        Commit the session, if a unique value is already in use the session is
+        rolled back, the error is added to the field of the form and False is
+        returned, other integrity errors are raised
+        """
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError as e:
+            db.session.rollback()
+            field = columns.get(violated_column(e))
+            if field is None or (form is not None and field.field not in form):
+                raise
+            if form is not None:
+                form[field.field].errors.append(field.message)
+            return False
+
+    def taken(self, name: str, value: str) -> bool:
+        """Check if a value of a unique field is in use"""
+        state = self._state
+        key = (name, value)
+        now = time.time()
+        with state.lock:
+            expires = state.available.get(key)
+            if expires is not None and expires > now:
+                return False
+        if db.session.scalar(select(exists().where(fields[name].column == value))):
+            return True
+        with state.lock:
+            state.available[key] = now + current_app.config['UNIQUE_CHECK_TTL']
+            state.available.move_to_end(key)
+            while len(state.available) > current_app.config['UNIQUE_CHECK_CACHE_SIZE']:
+                state.available.popitem(last=False)
+        return False
+
+
+uniqueness = Uniqueness()
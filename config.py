@@ -7,18 +7,91 @@ basedir = os.path.abspath(os.path.dirname(__name__))
 class Config():
     # App
     SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(16)
+    # previous secret keys, comma separated, tokens and sessions signed with them are still accepted
+    SECRET_KEY_FALLBACKS = [key for key in (os.environ.get('SECRET_KEY_FALLBACKS') or '').split(',') if key]
     WTF_CSRF_SECRET_KEY = secrets.token_urlsafe(16)
     APP_ADMIN = os.environ.get('APP_ADMIN')
     APP_ADMIN_PASSWORD = os.environ.get('APP_ADMIN_PASSWORD')
     ENTRIES_PER_PAGE = int(os.environ.get('ENTRIES_PER_PAGE')) or 6
+    COMMENTS_PER_PAGE = int(os.environ.get('COMMENTS_PER_PAGE') or 20)
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE') or 20)
+    PROFILE_ACTIVITY_LIMIT = int(os.environ.get('PROFILE_ACTIVITY_LIMIT') or 5)  # of each kind
+
+    # Home feed, the newest entries are kept in memory for FEED_HEAD_TTL seconds
+    FEED_HEAD_SIZE = int(os.environ.get('FEED_HEAD_SIZE') or 200)
+    FEED_HEAD_TTL = int(os.environ.get('FEED_HEAD_TTL') or 10)
+
+    # Personal timelines, posts of blogs with FANOUT_THRESHOLD followers or more are
+    # merged on read instead of delivered, set workers to 0 when fan-out is done by
+    # `flask fanout-worker`
+    FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS') or 2)
+    FANOUT_THRESHOLD = int(os.environ.get('FANOUT_THRESHOLD') or 1000)
+    FANOUT_BATCH_SIZE = 1000  # inbox rows written per transaction
+    FANOUT_BACKFILL = 20  # latest posts delivered when following a blog
+
+    # Password hashing, any werkzeug method, hashes made with other parameters are
+    # replaced on login, verifications run in PASSWORD_WORKERS processes and logins
+    # beyond PASSWORD_QUEUE_SIZE waiting ones are answered with 429
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS') or 2)
+    PASSWORD_QUEUE_SIZE = int(os.environ.get('PASSWORD_QUEUE_SIZE') or 16)
+    PASSWORD_VERIFY_TIMEOUT = 10  # seconds
 
     # Image upload
     MAX_CONTENT_LENGTH = 1024 * 1024  # maximum request size: 1 MB
     IMAGE_UPLOAD_EXTENSIONS =  ['jpg', 'jpe', 'jpeg', 'png', 'webp', 'gif']
     IMAGE_UPLOAD_PATH = os.path.join(basedir, 'app', 'static', 'images')
+    IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)  # processes resizing uploads
+    IMAGE_GC_GRACE = 3600  # seconds an unreferenced image is kept for
+
+    # Static assets, fingerprinted by `flask assets build`
+    ASSET_MANIFEST = os.path.join(basedir, 'app', 'static', 'manifest.json')
+    ASSET_DIRS = ['css', 'js', 'images']
+    ASSET_MAX_AGE = 365 * 24 * 3600  # seconds, fingerprinted files only
 
     # Database
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    QUERY_COUNT_THRESHOLD = int(os.environ.get('QUERY_COUNT_THRESHOLD') or 30)  # debug mode only
+
+    # Request metrics, served to admins at /admin/metrics, Server-Timing headers
+    # are sent in debug mode or if SERVER_TIMING is set
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', '1']
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ['true', '1']
+
+    # Categories and roles cache, changes of other processes are seen after REFERENCE_DATA_TTL seconds
+    REFERENCE_DATA_TTL = int(os.environ.get('REFERENCE_DATA_TTL') or 60)
+
+    # Fragment cache, backends: memory, sqlite (shared by the workers of a host) or none
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND') or 'memory'
+    FRAGMENT_CACHE_PATH = os.path.join(basedir, 'data', 'fragment-cache.sqlite')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 1024)
+
+    # Rate limits of the auth forms, backends: memory, sqlite (shared by the workers
+    # of a host) or none, idle buckets are evicted every RATE_LIMIT_EVICT_INTERVAL seconds
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', '1']
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND') or 'memory'
+    RATE_LIMIT_PATH = os.path.join(basedir, 'data', 'rate-limit.sqlite')
+    RATE_LIMIT_EVICT_INTERVAL = 60
+
+    # Email tokens, verified tokens are cached, used ones are kept in a ledger until they
+    # expire, backends: memory or sqlite (shared by the workers of a host)
+    TOKEN_CACHE_SIZE = 256
+    TOKEN_LEDGER_BACKEND = os.environ.get('TOKEN_LEDGER_BACKEND') or 'memory'
+    TOKEN_LEDGER_PATH = os.path.join(basedir, 'data', 'token-ledger.sqlite')
+
+    # Inline validation of unique form fields, values found available are cached for
+    # UNIQUE_CHECK_TTL seconds
+    UNIQUE_CHECK_TTL = 5
+    UNIQUE_CHECK_CACHE_SIZE = 1024
+
+    # Presence tracking, in seconds
+    PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL') or 60)
+    PRESENCE_GRANULARITY = int(os.environ.get('PRESENCE_GRANULARITY') or 60)
+
+    # Identity cache of logged in users, in seconds, 0 disables the cache
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 30)
 
     # Mail
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -29,6 +102,12 @@ class Config():
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_SUBJECT_PREFIX = os.environ.get('MAIL_SUBJECT_PREFIX')
 
+    # Mail outbox, set workers to 0 when the outbox is drained by `flask mail-worker`
+    MAIL_OUTBOX_WORKERS = int(os.environ.get('MAIL_OUTBOX_WORKERS') or 2)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 20)
+    MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    MAIL_OUTBOX_RETRY_DELAY = 30  # seconds, doubled on every failed attempt
+
     @staticmethod
     def init_app(app):
         pass
@@ -42,6 +121,12 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    MAIL_OUTBOX_WORKERS = 0
+    IMAGE_WORKERS = 0
+    FANOUT_WORKERS = 0
+    PASSWORD_WORKERS = 0
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast, tests hash a lot
+    RATE_LIMIT_ENABLED = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('TESTING_DB') or 'sqlite://'
 
 
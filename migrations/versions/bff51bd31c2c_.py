@@ -0,0 +1,33 @@
+"""empty message
+
+Revision ID: bff51bd31c2c
+Revises: 07393a18a17f
+Create Date: 2026-10-18 15:26:09.832106
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bff51bd31c2c'
+down_revision = '07393a18a17f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # full-text search index of posts and comments, see app/search.py
+    op.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+        'post_id UNINDEXED, title, body, tokenize="porter unicode61")')
+    op.execute(
+        'INSERT INTO search_index (rowid, post_id, title, body) '
+        'SELECT 2 * id, id, coalesce(title, \'\'), coalesce(body, \'\') FROM posts')
+    op.execute(
+        'INSERT INTO search_index (rowid, post_id, title, body) '
+        'SELECT 2 * id + 1, post_id, \'\', coalesce(body, \'\') FROM comments')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS search_index')
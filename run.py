@@ -5,13 +5,14 @@ from app import create_app, db
 from app.models import User, Role, Permission, Blog, Post, Category, Comment
 from app.cli import register_cli
 from app.util import render_partial
+from app.search import include_name
 from config import basedir
 
 
 load_dotenv(os.path.join(basedir, '.env'))
 
 app = create_app(os.environ.get('APP_CONFIG', 'default'))
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_name=include_name)
 
 register_cli(app)
 
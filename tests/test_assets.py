@@ -0,0 +1,107 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from flask import url_for
+from app import create_app
+from app.assets import assets, brotli
+from app.cli import register_cli
+
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.static = tempfile.mkdtemp()
+        self.app.static_folder = self.static
+        self.app.config['ASSET_MANIFEST'] = os.path.join(self.static, 'manifest.json')
+        os.makedirs(os.path.join(self.static, 'css'))
+        os.makedirs(os.path.join(self.static, 'images', 'ab', 'cd'))
+        self.css = b'body { color: red; }\n' * 100
+        with open(os.path.join(self.static, 'css', 'base.css'), 'wb') as f:
+            f.write(self.css)
+        self.blob = 'abcd' + '0' * 60 + '.png'
+        with open(os.path.join(self.static, 'images', 'ab', 'cd', self.blob), 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app_ctx.pop()
+        shutil.rmtree(self.static)
+
+    def test_build(self):
+        # .gz and .br versions
+        self.assertEqual(assets.build(), (1, 1 if brotli is None else 2))
+        self.assertRegex(assets.manifest['css/base.css'], r'^css/base\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(self.static, 'css', 'base.css.gz')) as f:
+            self.assertEqual(f.read(), self.css)
+        # up to date files are not compressed again
+        self.assertEqual(assets.build(), (1, 0))
+
+    def test_url_for(self):
+        with self.app.test_request_context():
+            self.assertEqual(url_for('static', filename='css/base.css'), '/static/css/base.css')
+            assets.build()
+            self.assertEqual(
+                url_for('static', filename='css/base.css'),
+                f'/static/{assets.manifest["css/base.css"]}')
+
+    def test_fingerprinted_files_are_immutable(self):
+        assets.build()
+        response = self.client.get(f'/static/{assets.manifest["css/base.css"]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.css)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        response.close()
+
+        # outdated fingerprints and plain names are revalidated
+        for path in ('/static/css/base.000000000000.css', '/static/css/base.css'):
+            response = self.client.get(path)
+            self.assertEqual(response.data, self.css)
+            self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+            response.close()
+
+    def test_content_addressed_images_are_immutable(self):
+        response = self.client.get(f'/static/images/ab/cd/{self.blob}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
+
+    def test_precompressed(self):
+        assets.build()
+        url = f'/static/{assets.manifest["css/base.css"]}'
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), self.css)
+        response.close()
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, self.css)
+        response.close()
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        assets.build()
+        url = f'/static/{assets.manifest["css/base.css"]}'
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.data), self.css)
+        response.close()
+
+    def test_build_reports_skipped_brotli(self):
+        register_cli(self.app)
+        with mock.patch('app.assets.brotli', None):
+            output = self.app.test_cli_runner().invoke(args=['assets', 'build']).output
+        self.assertIn('brotli is not installed', output)
+        self.assertFalse(os.path.exists(os.path.join(self.static, 'css', 'base.css.br')))
+
+    def test_missing_file(self):
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../config.py').status_code, 404)
@@ -0,0 +1,61 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment, Category, TimelineEntry, Permission
+from app.fake import generate
+from app.benchmark import Benchmark, percentile, compare
+
+
+class TestFakeData(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_generate(self):
+        counts = generate(users=5, posts=20, comments=50, categories=3, chunk_size=7)
+        self.assertEqual(counts, dict(categories=3, users=5, blogs=5, posts=20, comments=50))
+        self.assertEqual(Comment.query.count(), 50)
+        self.assertEqual(TimelineEntry.query.count(), 20)
+        self.assertEqual(sum(blog.post_count for blog in Blog.query), 20)
+        self.assertEqual(sum(post.comment_count for post in Post.query), 50)
+        self.assertTrue(User.query.first().verify_password('password'))
+        self.assertIsNotNone(Post.query.first().body_html)
+
+        # added to the existing rows
+        generate(users=2, posts=5, comments=5, categories=1, seed=1)
+        self.assertEqual(User.query.count(), 7)
+        self.assertEqual(Category.query.count(), 4)
+
+    def test_benchmark(self):
+        generate(users=3, posts=5, comments=10, categories=1)
+        results = Benchmark(self.app, requests=3, warmup=1).run()
+        self.assertEqual(
+            set(results), {'view_blog', 'view_post', 'profile', 'login', 'create_comment'})
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['queries_per_request'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(Comment.query.count(), 10 + 4)
+
+
+class TestBenchmarkReport(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+
+    def test_compare(self):
+        baseline = {'view_post': {'p95_ms': 10.0, 'queries_per_request': 3}}
+        self.assertEqual(compare({'view_post': {'p95_ms': 11.5, 'queries_per_request': 3}}, baseline), [])
+        self.assertEqual(len(compare({'view_post': {'p95_ms': 13.0, 'queries_per_request': 4}}, baseline)), 2)
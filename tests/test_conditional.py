@@ -0,0 +1,148 @@
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment, Permission
+from app.decorators import template
+
+
+class TestConditionalResponses(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.version = (datetime(2024, 1, 1), 1)
+        self.calls = 0
+
+        @self.app.route('/conditional')
+        @template('errors/403.html', validator=lambda: self.version)
+        def conditional():
+            self.calls += 1
+            return dict()
+
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_validators_are_set(self):
+        resp = self.client.get('/conditional')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNotNone(resp.headers.get('ETag'))
+        self.assertEqual(resp.headers.get('Last-Modified'), 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertIn('HX-Request', resp.headers.get('Vary'))
+
+    def test_not_modified(self):
+        etag = self.client.get('/conditional').headers['ETag']
+        resp = self.client.get('/conditional', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b'')
+        self.assertEqual(self.calls, 1)
+
+    def test_etag_depends_on_request_type(self):
+        etag = self.client.get('/conditional').headers['ETag']
+        resp = self.client.get('/conditional', headers={'If-None-Match': etag, 'HX-Request': 'true'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_etag_changes_with_version(self):
+        etag = self.client.get('/conditional').headers['ETag']
+        self.version = (datetime(2024, 1, 2), 1)
+        resp = self.client.get('/conditional', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_if_modified_since(self):
+        resp = self.client.get(
+            '/conditional', headers={'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(
+            '/conditional', headers={'If-Modified-Since': 'Sun, 31 Dec 2023 00:00:00 GMT'})
+        self.assertEqual(resp.status_code, 200)
+
+
+class TestPostPageValidators(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        author = User(username='john', email='john@example.com')
+        self.commenter = User(username='jane', email='jane@example.com')
+        self.viewer = User(username='joe', email='joe@example.com', password='secret', confirmed=True)
+        blog = Blog(name='blog', user=author)
+        self.post = Post(title='post', body='body', blog=blog, author=author)
+        db.session.add_all([author, self.commenter, self.viewer, blog, self.post])
+        db.session.commit()
+        db.session.add(Comment(body='comment', post=self.post, user=self.commenter))
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'email': 'joe@example.com', 'password': 'secret'})
+        self.url = f'/blog/post/{self.post.id}'
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _status(self, etag):
+        return self.client.get(self.url, headers={'If-None-Match': etag}).status_code
+
+    def test_etag_changes_with_viewer_permissions(self):
+        etag = self.client.get(self.url).headers['ETag']
+        self.assertEqual(self._status(etag), 304)
+        self.viewer.role = Role.query.filter_by(name='administrator').first()
+        db.session.commit()
+        self.assertEqual(self._status(etag), 200)
+
+    def test_etag_changes_with_commenter_names(self):
+        etag = self.client.get(self.url).headers['ETag']
+        self.commenter.username = 'janet'
+        db.session.commit()
+        self.assertEqual(self._status(etag), 200)
+
+
+class TestVersionColumns(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(email='user@example.com')
+        self.blog = Blog(name='blog', user=self.user)
+        self.post = Post(title='post', blog=self.blog, author=self.user)
+        db.session.add_all([self.user, self.blog, self.post])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _versions(self):
+        return db.session.execute(
+            db.select(Post.updated_at, Blog.updated_at)
+            .join(Blog, Post.blog_id == Blog.id)).first()
+
+    def test_comment_updates_post_version(self):
+        post_version, blog_version = self._versions()
+        db.session.add(Comment(body='comment', post_id=self.post.id))
+        db.session.commit()
+        versions = self._versions()
+        self.assertGreater(versions[0], post_version)
+        # the blog page shows the comment counts of the posts
+        self.assertGreater(versions[1], blog_version)
+
+    def test_post_updates_blog_version(self):
+        post_version, blog_version = self._versions()
+        self.post.body = 'new body'
+        db.session.commit()
+        versions = self._versions()
+        self.assertGreater(versions[0], post_version)
+        self.assertGreater(versions[1], blog_version)
@@ -0,0 +1,85 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment
+from app.counters import reconcile_counters
+
+
+class TestCounters(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com')
+        self.blog = Blog(name='jblog', user=self.user)
+        db.session.add(self.blog)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_counters_are_maintained(self):
+        posts = [Post(title=f'post {i}', blog=self.blog, author=self.user) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+        self.assertEqual(self.blog.post_count, 3)
+        self.assertEqual(self.user.post_count, 3)
+
+        comments = [Comment(body='comment', post=posts[0], user=self.user) for i in range(2)]
+        db.session.add_all(comments)
+        db.session.commit()
+        self.assertEqual(posts[0].comment_count, 2)
+        self.assertEqual(posts[1].comment_count, 0)
+        self.assertEqual(self.user.comment_count, 2)
+
+        db.session.delete(comments[0])
+        db.session.delete(posts[2])
+        db.session.commit()
+        self.assertEqual(posts[0].comment_count, 1)
+        self.assertEqual(self.user.comment_count, 1)
+        self.assertEqual(self.blog.post_count, 2)
+        self.assertEqual(self.user.post_count, 2)
+
+    def test_delete_comment_view(self):
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.user.password = 'secret'
+        self.user.confirmed = True
+        post = Post(title='post', blog=self.blog, author=self.user)
+        comment = Comment(body='comment', post=post, user=self.user)
+        db.session.add(comment)
+        db.session.commit()
+        self.assertEqual(post.comment_count, 1)
+
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'john@example.com', 'password': 'secret'})
+        response = client.post(f'/blog/delete-comment/{comment.id}')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith(f'/blog/post/{post.id}'))
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Comment, comment.id))
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.user.comment_count, 0)
+
+    def test_reconcile_counters(self):
+        post = Post(title='post', blog=self.blog, author=self.user)
+        db.session.add(Comment(body='comment', post=post, user=self.user))
+        db.session.commit()
+        self.assertEqual(reconcile_counters(), {
+            'posts.comment_count': 0,
+            'blogs.post_count': 0,
+            'blogs.follower_count': 0,
+            'users.post_count': 0,
+            'users.comment_count': 0})
+
+        db.session.execute(db.update(Post).values(comment_count=7))
+        db.session.execute(db.update(User).values(post_count=0, comment_count=None))
+        db.session.commit()
+        fixed = reconcile_counters(chunk_size=1)
+        self.assertEqual(fixed['posts.comment_count'], 1)
+        self.assertEqual(fixed['users.post_count'], 1)
+        self.assertEqual(fixed['users.comment_count'], 1)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual((self.user.post_count, self.user.comment_count), (1, 1))
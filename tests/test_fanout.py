@@ -0,0 +1,167 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Follow, InboxEntry, FanoutJob
+from app.fanout import fanout
+from app.feed import feed
+
+
+class TestFanout(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.author = User(username='john', email='john@example.com')
+        self.star = User(username='star', email='star@example.com')
+        self.readers = [User(username=f'reader{i}', email=f'reader{i}@example.com') for i in range(3)]
+        self.blog = Blog(name='jblog', user=self.author)
+        self.star_blog = Blog(name='sblog', user=self.star)
+        db.session.add_all([self.blog, self.star_blog, *self.readers])
+        db.session.commit()
+        self.time = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _post(self, blog, title):
+        self.time += timedelta(hours=1)
+        post = Post(title=title, body='body', blog=blog, author=blog.user, created_at=self.time)
+        db.session.add(post)
+        db.session.commit()
+        return post
+
+    def _titles(self, user, per_page=10, cursor=None):
+        return [item.title for item in feed.following(user.id, per_page, cursor)]
+
+    def test_follow_counters(self):
+        for reader in self.readers:
+            reader.follow(self.blog)
+        db.session.commit()
+        self.assertEqual(self.blog.follower_count, 3)
+        self.assertTrue(self.readers[0].is_following(self.blog))
+        self.readers[0].unfollow(self.blog)
+        db.session.commit()
+        self.assertEqual(self.blog.follower_count, 2)
+        self.assertFalse(self.readers[0].is_following(self.blog))
+
+    def test_posts_are_delivered_by_the_worker(self):
+        self.app.config['FANOUT_BATCH_SIZE'] = 2
+        for reader in self.readers:
+            reader.follow(self.blog)
+        db.session.commit()
+        self._post(self.blog, 'post 1')
+        # creating the post only queues a job
+        self.assertEqual(InboxEntry.query.count(), 0)
+        self.assertEqual(FanoutJob.query.count(), 1)
+        self.assertEqual(fanout.drain(), 3)
+        self.assertEqual(FanoutJob.query.count(), 0)
+        self.assertEqual(self._titles(self.readers[2]), ['post 1'])
+        # jobs run again after a crash deliver nothing twice
+        db.session.add(FanoutJob(post_id=Post.query.first().id, blog_id=self.blog.id))
+        db.session.commit()
+        self.assertEqual(fanout.drain(), 0)
+
+    def test_follow_delivers_latest_posts(self):
+        self.app.config['FANOUT_BACKFILL'] = 2
+        for i in range(3):
+            self._post(self.blog, f'post {i}')
+        fanout.drain()
+        self.readers[0].follow(self.blog)
+        db.session.commit()
+        self.assertEqual(self._titles(self.readers[0]), ['post 2', 'post 1'])
+        self.readers[0].unfollow(self.blog)
+        db.session.commit()
+        self.assertEqual(self._titles(self.readers[0]), [])
+
+    def test_celebrity_posts_are_merged_on_read(self):
+        self.app.config['FANOUT_THRESHOLD'] = 3
+        for reader in self.readers:
+            reader.follow(self.star_blog)
+        for reader in self.readers[:2]:
+            reader.follow(self.blog)
+        db.session.commit()
+        for i in range(3):
+            self._post(self.blog, f'post {i}')
+            self._post(self.star_blog, f'star {i}')
+        fanout.drain()
+        delivered = {entry.blog_id for entry in InboxEntry.query}
+        self.assertEqual(delivered, {self.blog.id})
+        self.assertEqual(
+            self._titles(self.readers[0]), ['star 2', 'post 2', 'star 1', 'post 1', 'star 0', 'post 0'])
+
+        titles = []
+        cursor = None
+        while True:
+            page = feed.following(self.readers[0].id, 4, cursor)
+            titles += [item.title for item in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(titles, ['star 2', 'post 2', 'star 1', 'post 1', 'star 0', 'post 0'])
+
+    def test_posts_skipped_above_the_threshold_are_delivered_below_it(self):
+        self.app.config['FANOUT_THRESHOLD'] = 3
+        for reader in self.readers:
+            reader.follow(self.blog)
+        db.session.commit()
+        self._post(self.blog, 'post 1')
+        fanout.drain()
+        self.assertEqual(InboxEntry.query.count(), 0)
+        self.assertEqual(self._titles(self.readers[0]), ['post 1'])
+
+        self.readers[2].unfollow(self.blog)
+        db.session.commit()
+        self.assertEqual(FanoutJob.query.count(), 1)
+        self.assertEqual(fanout.drain(), 2)
+        self.assertEqual(self._titles(self.readers[0]), ['post 1'])
+        # delivered posts are not queued again
+        self.readers[2].follow(self.blog)
+        self.readers[1].unfollow(self.blog)
+        db.session.commit()
+        self.assertEqual(FanoutJob.query.count(), 0)
+
+    def test_deleted_post_leaves_inboxes(self):
+        self.readers[0].follow(self.blog)
+        db.session.commit()
+        post = self._post(self.blog, 'post')
+        fanout.drain()
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(InboxEntry.query.count(), 0)
+
+    def test_create_post_queries_dont_grow_with_followers(self):
+        queries = []
+        counter = lambda conn, cursor, statement, *args: queries.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        self._post(self.blog, 'post 1')
+        first = len(queries)
+        for reader in self.readers:
+            reader.follow(self.blog)
+        db.session.commit()
+        queries.clear()
+        self._post(self.blog, 'post 2')
+        event.remove(db.engine, 'before_cursor_execute', counter)
+        self.assertEqual(len(queries), first)
+
+    def test_follow_views(self):
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.readers[0].password = 'secret'
+        self.readers[0].confirmed = True
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'email': 'reader0@example.com', 'password': 'secret'})
+        response = client.post('/blog/jblog/follow', headers={'HX-Request': 'true'})
+        self.assertEqual(response.status_code, 200)
+        # a user can't follow their own blog
+        db.session.add(Blog(name='rblog', user=self.readers[0]))
+        db.session.commit()
+        self.assertEqual(client.post('/blog/rblog/follow').status_code, 403)
+        self.assertIn('Unfollow', response.get_data(as_text=True))
+        self._post(self.blog, 'followed post')
+        fanout.drain()
+        self.assertIn('followed post', client.get('/blog/following').get_data(as_text=True))
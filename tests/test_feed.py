@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Category, TimelineEntry
+from app.feed import feed
+
+
+class TestFeed(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FEED_HEAD_SIZE'] = 4
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com')
+        self.blog = Blog(name='jblog', user=self.user)
+        self.tech = Category(name='tech')
+        self.art = Category(name='art')
+        db.session.add_all([self.blog, self.tech, self.art])
+        db.session.commit()
+        start = datetime(2024, 1, 1)
+        self.posts = [
+            Post(title=f'post {i}', body='body', blog=self.blog, author=self.user,
+                 category=self.tech if i % 2 else self.art,
+                 created_at=start + timedelta(hours=i))
+            for i in range(7)]
+        db.session.add_all(self.posts)
+        db.session.commit()
+
+        self.queries = []
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _count(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def _titles(self, page):
+        return [item.title for item in page]
+
+    def test_timeline_follows_posts(self):
+        self.assertEqual(TimelineEntry.query.count(), 7)
+        post = self.posts[0]
+        post.category = self.tech
+        db.session.commit()
+        self.assertEqual(db.session.get(TimelineEntry, post.id).category_id, self.tech.id)
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(TimelineEntry.query.count(), 6)
+
+    def test_pages_across_head_and_timeline(self):
+        titles = []
+        cursor = None
+        while True:
+            page = feed.page(3, cursor=cursor)
+            titles += self._titles(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(titles, [f'post {i}' for i in reversed(range(7))])
+
+    def test_category_filter(self):
+        page = feed.page(2, category_id=self.tech.id)
+        self.assertEqual(self._titles(page), ['post 5', 'post 3'])
+        page = feed.page(2, category_id=self.tech.id, cursor=page.next_cursor)
+        self.assertEqual(self._titles(page), ['post 1'])
+        self.assertIsNone(page.next_cursor)
+
+    def test_first_page_needs_no_queries(self):
+        feed.page(3)
+        self.queries.clear()
+        page = feed.page(3)
+        self.assertTrue(page.from_memory)
+        self.assertEqual(self._titles(page), ['post 6', 'post 5', 'post 4'])
+        self.assertEqual(self.queries, [])
+
+    def test_commit_invalidates_head(self):
+        feed.page(3)
+        db.session.add(Post(
+            title='new', blog=self.blog, author=self.user, created_at=datetime(2025, 1, 1)))
+        db.session.commit()
+        self.assertEqual(self._titles(feed.page(1)), ['new'])
+
+    def test_index(self):
+        client = self.app.test_client()
+        response = client.get('/?category=tech')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('post 5', response.get_data(as_text=True))
+        self.assertNotIn('post 4', response.get_data(as_text=True))
+        self.assertEqual(client.get('/?category=unknown').status_code, 404)
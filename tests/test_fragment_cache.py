@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from app import create_app, db
+from app.models import Post
+from app.fragment_cache import fragment_cache, MemoryBackend, SQLiteBackend
+
+
+class BackendTests():
+    def test_get_set(self):
+        self.assertIsNone(self.backend.get('key'))
+        self.backend.set('key', 'value', 60)
+        self.assertEqual(self.backend.get('key'), 'value')
+
+    def test_expired_entries(self):
+        self.backend.set('key', 'value', -1)
+        self.assertIsNone(self.backend.get('key'))
+
+    def test_generations(self):
+        self.assertListEqual(self.backend.generations(('posts', 'comments')), [0, 0])
+        self.backend.bump({'posts'})
+        self.backend.bump({'posts', 'comments'})
+        self.assertListEqual(self.backend.generations(('posts', 'comments')), [2, 1])
+
+    def test_clear(self):
+        self.backend.set('key', 'value', 60)
+        self.backend.clear()
+        self.assertIsNone(self.backend.get('key'))
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+    def setUp(self):
+        self.backend = MemoryBackend(max_entries=2)
+
+    def test_lru_eviction(self):
+        self.backend.set('a', '1', 60)
+        self.backend.set('b', '2', 60)
+        self.backend.get('a')
+        self.backend.set('c', '3', 60)
+        self.assertIsNone(self.backend.get('b'))
+        self.assertEqual(self.backend.get('a'), '1')
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = SQLiteBackend(os.path.join(self.tmp.name, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.backend._conn().close()
+        self.tmp.cleanup()
+
+    def test_shared_between_instances(self):
+        self.backend.set('key', 'value', 60)
+        other = SQLiteBackend(self.backend.path)
+        self.assertEqual(other.get('key'), 'value')
+
+
+class TestFragmentCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_commit_invalidates_changed_tables(self):
+        backend = fragment_cache.backend
+        db.session.add(Post(title='post'))
+        db.session.commit()
+        self.assertListEqual(backend.generations(('posts', 'comments')), [1, 0])
+
+    def test_rollback_discards_changes(self):
+        backend = fragment_cache.backend
+        db.session.add(Post(title='post'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertListEqual(backend.generations(('posts',)), [0])
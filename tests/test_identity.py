@@ -0,0 +1,89 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Blog, Permission
+from app.models.user import load_user
+from app.identity import identity_cache
+
+
+class TestIdentityCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        user = User(username='john', email='john@example.com', confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Blog(name='jblog', user=user))
+        db.session.commit()
+        self.user_id = user.id
+        db.session.remove()
+
+        self.queries = []
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _count(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def test_cached_identity_needs_no_queries(self):
+        load_user(str(self.user_id)).can(Permission.WRITE)
+        db.session.remove()
+        self.queries.clear()
+        user = load_user(str(self.user_id))
+        self.assertEqual(user.username, 'john')
+        self.assertTrue(user.confirmed)
+        self.assertEqual(user.blog.name, 'jblog')
+        self.assertTrue(user.can(Permission.WRITE))
+        self.assertEqual(self.queries, [])
+        self.assertEqual(identity_cache.stats()['hits'], 1)
+
+    def test_cached_identity_is_persistent(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        user = load_user(str(self.user_id))
+        user.location = 'somewhere'
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(db.session.get(User, self.user_id).location, 'somewhere')
+
+    def test_user_changes_invalidate_identity(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        user = db.session.get(User, self.user_id)
+        user.username = 'johnny'
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(load_user(str(self.user_id)).username, 'johnny')
+
+    def test_blog_changes_invalidate_identity(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        db.session.delete(Blog.query.first())
+        db.session.commit()
+        db.session.remove()
+        self.assertIsNone(load_user(str(self.user_id)).blog)
+
+    def test_deleted_user(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        db.session.delete(db.session.get(User, self.user_id))
+        db.session.commit()
+        db.session.remove()
+        self.assertIsNone(load_user(str(self.user_id)))
+
+    def test_disabled_cache(self):
+        self.app.config['IDENTITY_CACHE_TTL'] = 0
+        identity_cache.init_app(self.app)
+        load_user(str(self.user_id))
+        db.session.remove()
+        self.queries.clear()
+        load_user(str(self.user_id))
+        self.assertEqual(len(self.queries), 1)
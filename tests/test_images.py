@@ -0,0 +1,161 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
+from werkzeug.datastructures import FileStorage
+from app import create_app, db
+from app.models import Image as ImageModel, ImageRef, Post, Role
+from app.images import images, sniff_format, variant_name, is_variant, make_variants, relative_path
+from app.util import utcnow
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class TestImages(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.folder = tempfile.mkdtemp()
+        self.app.config['IMAGE_UPLOAD_PATH'] = self.folder
+        self.app.config['IMAGE_VARIANT_WIDTHS'] = [100, 200, 400]
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+        shutil.rmtree(self.folder)
+
+    def _image(self, width: int, height: int, format: str='JPEG') -> bytes:
+        f = io.BytesIO()
+        Image.new('RGB', (width, height), 'red').save(f, format)
+        return f.getvalue()
+
+    def test_sniff_format(self):
+        self.assertEqual(sniff_format(b'\xff\xd8\xff\xe0\x00\x10JFIF'), 'jpeg')
+        self.assertEqual(sniff_format(b'\x89PNG\r\n\x1a\n\x00\x00'), 'png')
+        self.assertEqual(sniff_format(b'GIF89a\x01\x00'), 'gif')
+        self.assertEqual(sniff_format(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'webp')
+        self.assertIsNone(sniff_format(b'RIFF\x00\x00\x00\x00WAVEfmt '))
+        self.assertIsNone(sniff_format(b'<svg xmlns="http://www.w3.org/2000/svg">'))
+        self.assertIsNone(sniff_format(b''))
+
+    def test_variant_name(self):
+        self.assertEqual(variant_name('1_abc_photo.jpg', 320), '1_abc_photo.320w.jpg')
+        self.assertTrue(is_variant('1_abc_photo.320w.jpg'))
+        self.assertFalse(is_variant('1_abc_photo.jpg'))
+
+    def test_relative_path(self):
+        name = 'ab' + 'c' * 62 + '.jpg'
+        self.assertEqual(relative_path(name), f'ab/cc/{name}')
+        self.assertEqual(relative_path('1_abc_photo.jpg'), '1_abc_photo.jpg')
+
+    def _store(self, data: bytes, filename: str='photo.gif'):
+        return images.store(FileStorage(io.BytesIO(data), filename))
+
+    def test_store_deduplicates(self):
+        data = b'GIF89a' + os.urandom(64)
+        image = self._store(data)
+        self.assertEqual(image.ext, 'gif')
+        self.assertEqual(image.size, len(data))
+        self.assertEqual(self._store(data, 'copy.gif').hash, image.hash)
+        self.assertEqual(ImageModel.query.count(), 1)
+        with open(os.path.join(self.folder, image.path), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        shard = os.path.join(self.folder, image.hash[:2], image.hash[2:4])
+        self.assertEqual(os.listdir(shard), [f'{image.hash}.gif'])
+        self.assertFalse([n for n in os.listdir(self.folder) if n.startswith('.upload-')])
+
+    def test_store_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self._store(b'<svg></svg>', 'image.gif')
+        self.assertEqual(ImageModel.query.count(), 0)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_gc(self):
+        used = self._store(b'GIF89a' + os.urandom(64))
+        unused = self._store(b'GIF89a' + os.urandom(64))
+        recent = self._store(b'GIF89a' + os.urandom(64))
+        post = Post(title='post')
+        post.set_image(used)
+        db.session.add(post)
+        for image in (used, unused):
+            image.last_used_at = utcnow() - timedelta(hours=2)
+        db.session.commit()
+        unused_path = os.path.join(self.folder, unused.path)
+
+        self.assertEqual(images.gc(batch_size=1), 1)
+        self.assertEqual(
+            {image.hash for image in ImageModel.query.all()}, {used.hash, recent.hash})
+        self.assertFalse(os.path.exists(unused_path))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, used.path)))
+
+        # replaced and deleted post images are unreferenced
+        post.set_image(recent)
+        db.session.commit()
+        self.assertEqual(ImageRef.query.count(), 1)
+        self.assertEqual(images.gc(), 1)
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(images.gc(grace=0), 1)
+        self.assertEqual(ImageModel.query.count(), 0)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_make_variants(self):
+        path = os.path.join(self.folder, 'photo.jpg')
+        with open(path, 'wb') as f:
+            f.write(self._image(300, 150))
+        self.assertEqual(make_variants(path, [100, 200, 400]), [100, 200])
+        with Image.open(os.path.join(self.folder, 'photo.100w.jpg')) as img:
+            self.assertEqual(img.size, (100, 50))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'photo.400w.jpg')))
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_srcset(self):
+        path = os.path.join(self.folder, 'photo.png')
+        with open(path, 'wb') as f:
+            f.write(self._image(250, 250, 'PNG'))
+        self.assertEqual(images.srcset('http://localhost/static/images/photo.png'), '')
+        images.process(path)
+        self.assertEqual(
+            images.srcset('http://localhost/static/images/photo.png'),
+            'http://localhost/static/images/photo.100w.png 100w, '
+            'http://localhost/static/images/photo.200w.png 200w')
+        self.assertEqual(images.srcset(None), '')
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_images_without_variants_are_cached(self):
+        path = os.path.join(self.folder, 'small.png')
+        with open(path, 'wb') as f:
+            f.write(self._image(50, 50, 'PNG'))
+        url = 'http://localhost/static/images/small.png'
+        self.assertEqual(images.srcset(url), '')
+        with mock.patch('app.images.os.path.exists') as exists:
+            self.assertEqual(images.srcset(url), '')
+        exists.assert_not_called()
+
+        # generated variants replace the cached empty result
+        path = os.path.join(self.folder, 'photo.png')
+        with open(path, 'wb') as f:
+            f.write(self._image(250, 250, 'PNG'))
+        url = 'http://localhost/static/images/photo.png'
+        self.assertEqual(images.srcset(url), '')
+        images.process(path)
+        self.assertIn('photo.200w.png 200w', images.srcset(url))
+
+    def test_missing_pillow_is_logged(self):
+        app = create_app('testing')
+        with mock.patch.dict('sys.modules', {'PIL': None}), self.assertLogs(app.logger, 'WARNING') as logs:
+            images.init_app(app)
+        self.assertIn('Pillow is not installed', logs.output[0])
+        with app.app_context(), mock.patch('app.images.make_variants') as make:
+            images.process(os.path.join(self.folder, 'photo.png'))
+        make.assert_not_called()
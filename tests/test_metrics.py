@@ -0,0 +1,76 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Permission
+from app.metrics import Histogram, metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_render(self):
+        histogram = Histogram('test_seconds', 'Test.', 'endpoint', (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe('blog.view_post', value)
+        self.assertEqual(histogram.render(), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{endpoint="blog.view_post",le="0.1"} 2',
+            'test_seconds_bucket{endpoint="blog.view_post",le="1.0"} 3',
+            'test_seconds_bucket{endpoint="blog.view_post",le="+Inf"} 4',
+            'test_seconds_sum{endpoint="blog.view_post"} 2.65',
+            'test_seconds_count{endpoint="blog.view_post"} 4'])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['APP_ADMIN'] = 'admin@example.com'
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com', password='secret', confirmed=True)
+        admin = User(username='admin', email='admin@example.com', password='secret', confirmed=True)
+        db.session.add_all([self.user, admin])
+        db.session.commit()
+        blog = Blog(name='jblog', user=self.user)
+        self.post = Post(title='post', body='body', blog=blog, author=self.user)
+        db.session.add_all([blog, self.post])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _login(self, email):
+        self.client.post('/auth/login', data={'email': email, 'password': 'secret'})
+
+    def test_requests_are_recorded_per_endpoint(self):
+        self.client.get(f'/blog/post/{self.post.id}')
+        text = metrics.render()
+        self.assertIn('mosaic_request_duration_seconds_count{endpoint="blog.view_post"} 1', text)
+        self.assertIn('mosaic_template_render_seconds_count{endpoint="blog.view_post"} 1', text)
+        self.assertIn('mosaic_response_bytes_count{endpoint="blog.view_post"} 1', text)
+        self.assertIn('mosaic_sql_queries_bucket{endpoint="blog.view_post",le="0"} 0', text)
+        self.assertNotIn('endpoint="blog.view_blog"', text)
+
+    def test_server_timing(self):
+        response = self.client.get('/blog/jblog')
+        self.assertNotIn('Server-Timing', response.headers)
+        self.app.config['SERVER_TIMING'] = True
+        response = self.client.get('/blog/jblog')
+        self.assertRegex(response.headers['Server-Timing'], r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_metrics_are_admin_only(self):
+        self.assertEqual(self.client.get('/admin/metrics').status_code, 302)
+        self._login('john@example.com')
+        self.assertEqual(self.client.get('/admin/metrics').status_code, 403)
+        self.client.get('/auth/logout')
+        self._login('admin@example.com')
+        response = self.client.get('/admin/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('# TYPE mosaic_request_duration_seconds histogram', response.get_data(as_text=True))
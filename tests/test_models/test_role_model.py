@@ -1,6 +1,7 @@
 import unittest
 from app import create_app, db
-from app.models import Role, Permission
+from app.models import Role, User, Permission
+from app.models.role import permission_table
 
 
 class TestRoleModel(unittest.TestCase):
@@ -73,3 +74,31 @@ class TestRoleModel(unittest.TestCase):
         self.assertTrue(role_2.has_permission(Permission.WRITE))
         self.assertTrue(role_2.has_permission(Permission.MODERATE))
         self.assertFalse(role_2.has_permission(Permission.COMMENT))
+
+    def test_permission_table(self):
+        Role.set_roles({'role_1': [Permission.WRITE, Permission.COMMENT]}, default_role='role_1')
+        role_1 = Role.query.filter_by(name='role_1').first()
+        self.assertEqual(permission_table.get(role_1.id), Permission.WRITE | Permission.COMMENT)
+
+    def test_permission_table_is_refreshed_on_role_changes(self):
+        r = Role(name='r')
+        db.session.add(r)
+        db.session.commit()
+        self.assertEqual(permission_table.get(r.id), 0)
+        r.add_permission(Permission.ADMIN)
+        db.session.commit()
+        self.assertEqual(permission_table.get(r.id), Permission.ADMIN)
+
+    def test_permission_table_ignores_rolled_back_changes(self):
+        r = Role(name='r')
+        db.session.add(r)
+        db.session.commit()
+        user = User(email='john@example.com', role=r)
+        db.session.add(user)
+        db.session.commit()
+        self.assertFalse(user.can(Permission.ADMIN))
+        r.add_permission(Permission.ADMIN)
+        db.session.flush()
+        self.assertTrue(user.can(Permission.ADMIN))
+        db.session.rollback()
+        self.assertFalse(user.can(Permission.ADMIN))
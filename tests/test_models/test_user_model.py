@@ -72,6 +72,22 @@ class TestUserModel(unittest.TestCase):
         self.assertTrue(u.can(Permission.WRITE))
         self.assertFalse(u.can(Permission.MODERATE))
 
+    def test_can_method_does_not_load_role(self):
+        u = User()
+        db.session.add(u)
+        db.session.commit()
+        u = db.session.get(User, u.id)
+        self.assertTrue(u.can(Permission.WRITE))
+        self.assertNotIn('role', u.__dict__)
+
+    def test_can_method_after_role_change(self):
+        u = User()
+        db.session.add(u)
+        db.session.commit()
+        u.role = Role.query.filter_by(name='administrator').first()
+        db.session.commit()
+        self.assertTrue(u.is_admin())
+
     def test_is_admin_method(self):
         u = User()
         admin = User(email=self.app.config['APP_ADMIN'])
@@ -0,0 +1,120 @@
+import socket
+import unittest
+from datetime import timedelta
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+from app import create_app, db, mail
+from app.models import OutboxMessage
+from app.outbox import outbox
+from app.util import utcnow
+
+
+class RecordingHandler():
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestMailOutbox(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.smtpd = Controller(self.handler, hostname='127.0.0.1', port=free_port())
+        self.smtpd.start()
+        self.app = create_app('testing')
+        self.app.config.update(
+            MAIL_SERVER='127.0.0.1',
+            MAIL_PORT=self.smtpd.port,
+            MAIL_USE_TLS=False,
+            MAIL_USE_SSL=False,
+            MAIL_SUPPRESS_SEND=False)
+        # flask-mail reads its settings once in init_app
+        mail.init_app(self.app)
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+        self.smtpd.stop()
+
+    def _smtp_down(self):
+        self.app.extensions['mail'].port = free_port()
+
+    def _enqueue(self, n: int=1):
+        for i in range(n):
+            outbox.enqueue(Message(
+                subject=f'subject {i}', recipients=[f'user{i}@example.com'],
+                sender='admin@example.com', body='body'))
+        db.session.commit()
+
+    def test_enqueue_stores_message(self):
+        self._enqueue()
+        row = OutboxMessage.query.one()
+        self.assertEqual(row.to_message().recipients, ['user0@example.com'])
+        self.assertEqual(outbox.stats()['pending'], 1)
+
+    def test_enqueue_joins_caller_transaction(self):
+        outbox.enqueue(Message(
+            subject='subject', recipients=['user@example.com'],
+            sender='admin@example.com', body='body'))
+        db.session.rollback()
+        self.assertEqual(OutboxMessage.query.count(), 0)
+        self.assertNotIn('outbox_messages', db.session.info)
+
+    def test_drain_sends_batch_over_one_connection(self):
+        self._enqueue(5)
+        self.assertEqual(outbox.drain(), 5)
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(self.handler.connections, 1)
+        self.assertEqual(OutboxMessage.query.count(), 0)
+        stats = outbox.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['sent'], 5)
+
+    def test_batches(self):
+        self.app.config['MAIL_OUTBOX_BATCH_SIZE'] = 2
+        self._enqueue(5)
+        self.assertEqual(outbox.drain(), 5)
+        self.assertEqual(outbox.stats()['batches'], 3)
+
+    def test_claimed_messages_are_not_claimed_twice(self):
+        self._enqueue(3)
+        self.assertEqual(len(outbox.claim(10)), 3)
+        self.assertListEqual(outbox.claim(10), [])
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self._enqueue()
+        self._smtp_down()
+        self.assertEqual(outbox.drain(), 0)
+        row = OutboxMessage.query.one()
+        self.assertEqual(row.attempts, 1)
+        self.assertIsNone(row.claim)
+        self.assertFalse(row.failed)
+        self.assertGreater(row.next_attempt_at, (utcnow() + timedelta(seconds=20)).replace(tzinfo=None))
+        self.assertEqual(outbox.stats()['retried'], 1)
+
+    def test_give_up_after_max_attempts(self):
+        self.app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 1
+        self._enqueue()
+        self._smtp_down()
+        outbox.drain()
+        stats = outbox.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['pending'], 0)
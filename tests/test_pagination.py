@@ -0,0 +1,117 @@
+import re
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment, Permission
+from app.pagination import KeysetPagination, encode_cursor, decode_cursor
+
+
+class TestKeysetPagination(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        start = datetime(2024, 1, 1)
+        # two posts share each timestamp to exercise the id tie breaker
+        self.posts = [
+            Post(title=f'post {i}', created_at=start + timedelta(minutes=i // 2))
+            for i in range(7)]
+        db.session.add_all(self.posts)
+        db.session.commit()
+        self.keys = [Post.created_at, Post.id]
+        # newest first
+        self.ordered = sorted(self.posts, key=lambda p: (p.created_at, p.id), reverse=True)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_cursor_round_trip(self):
+        values = [datetime(2024, 1, 1, 12, 30), 5]
+        self.assertEqual(decode_cursor(encode_cursor(values, 'prev'), self.keys), ('prev', values))
+
+    def test_invalid_cursor(self):
+        self.assertIsNone(decode_cursor('not a cursor', self.keys))
+        self.assertIsNone(decode_cursor(encode_cursor([1]), self.keys))
+
+    def test_first_page(self):
+        page = KeysetPagination(Post.query, self.keys, 3)
+        self.assertListEqual(page.items, self.ordered[:3])
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_prev)
+        self.assertIsNone(page.prev_cursor)
+        self.assertIsNone(page.total)
+
+    def test_walk_forward_and_back(self):
+        page_1 = KeysetPagination(Post.query, self.keys, 3)
+        page_2 = KeysetPagination(Post.query, self.keys, 3, page_1.next_cursor)
+        page_3 = KeysetPagination(Post.query, self.keys, 3, page_2.next_cursor)
+        self.assertListEqual(page_2.items, self.ordered[3:6])
+        self.assertListEqual(page_3.items, self.ordered[6:])
+        self.assertFalse(page_3.has_next)
+        self.assertIsNone(page_3.next_cursor)
+
+        back = KeysetPagination(Post.query, self.keys, 3, page_3.prev_cursor)
+        self.assertListEqual(back.items, page_2.items)
+        self.assertTrue(back.has_prev)
+        self.assertTrue(back.has_next)
+        back = KeysetPagination(Post.query, self.keys, 3, back.prev_cursor)
+        self.assertListEqual(back.items, page_1.items)
+        self.assertFalse(back.has_prev)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = KeysetPagination(Post.query, self.keys, 3, 'garbage')
+        self.assertListEqual(page.items, self.ordered[:3])
+
+    def test_count(self):
+        page = KeysetPagination(Post.query, self.keys, 3, count=True)
+        self.assertEqual(page.total, 7)
+
+
+class TestCommentPages(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['COMMENTS_PER_PAGE'] = 3
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        user = User(username='john', email='john@example.com')
+        self.post = Post(title='post', body='body', blog=Blog(name='blog', user=user), author=user)
+        start = datetime(2024, 1, 1)
+        db.session.add_all([self.post] + [
+            Comment(body=f'comment {i}', post=self.post, user=user, created_at=start + timedelta(minutes=i))
+            for i in range(8)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _comments(self, html: bytes) -> list[str]:
+        return re.findall(r'<p>(comment \d)</p>', html.decode())
+
+    def _next(self, html: bytes) -> str|None:
+        match = re.search(r'hx-get="([^"]+/comments\?cursor=[^"]+)"', html.decode())
+        return match.group(1).replace('&amp;', '&') if match else None
+
+    def test_walk_comments(self):
+        response = self.client.get(f'/blog/post/{self.post.id}')
+        seen = self._comments(response.data)
+        self.assertEqual(len(seen), 3)
+        url = self._next(response.data)
+        while url is not None:
+            response = self.client.get(url, headers={'HX-Request': 'true'})
+            self.assertEqual(response.status_code, 200)
+            seen += self._comments(response.data)
+            url = self._next(response.data)
+        self.assertEqual(seen, [f'comment {i}' for i in reversed(range(8))])
+
+    def test_comments_of_unknown_post(self):
+        self.assertEqual(self.client.get('/blog/post/999/comments').status_code, 404)
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+from concurrent.futures import Future
+from threading import BoundedSemaphore
+from app import create_app, db
+from app.models import User, Role
+from app.passwords import passwords, method_of, benchmark
+
+
+class TestPasswords(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com', password='secret', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        passwords.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _login(self, password='secret'):
+        return self.client.post('/auth/login', data={'email': 'john@example.com', 'password': password})
+
+    def test_hash_uses_configured_method(self):
+        self.assertEqual(method_of(self.user.password_hash), 'pbkdf2:sha256:1000')
+        self.app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+        self.assertEqual(passwords.method, 'scrypt:32768:8:1')
+        self.assertEqual(method_of(passwords.hash('secret')), 'scrypt:32768:8:1')
+
+    def test_login_rehashes_to_current_parameters(self):
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        old_hash = self.user.password_hash
+        self.assertEqual(self._login('wrong').status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, self.user.id).password_hash, old_hash)
+
+        self.assertIn('HX-Redirect', self._login().headers)
+        db.session.expire_all()
+        user = db.session.get(User, self.user.id)
+        self.assertEqual(method_of(user.password_hash), 'pbkdf2:sha256:2000')
+        self.assertTrue(user.verify_password('secret'))
+        self.assertEqual(passwords.stats()['rehashed'], 1)
+
+    def test_verify_in_pool(self):
+        self.app.config['PASSWORD_WORKERS'] = 1
+        self.assertEqual(passwords.verify(self.user.password_hash, 'secret'), (True, None))
+        self.assertEqual(passwords.verify(self.user.password_hash, 'wrong'), (False, None))
+
+    def test_saturated_pool_answers_429(self):
+        self.app.config['PASSWORD_WORKERS'] = 1
+        state = self.app.extensions['passwords']
+        state.slots = BoundedSemaphore(1)
+        state.slots.acquire()
+        response = self._login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(passwords.stats()['rejected'], 1)
+        state.slots.release()
+        self.assertIn('HX-Redirect', self._login().headers)
+
+    def test_slow_verification_answers_429(self):
+        self.app.config['PASSWORD_WORKERS'] = 1
+        self.app.config['PASSWORD_VERIFY_TIMEOUT'] = 0.01
+        state = self.app.extensions['passwords']
+        state.slots = BoundedSemaphore(1)
+        queued, running = Future(), Future()
+        running.set_running_or_notify_cancel()
+        state.pool = mock.Mock(**{'submit.side_effect': [queued, running]})
+
+        # a queued job is cancelled and its slot freed
+        self.assertEqual(self._login().status_code, 429)
+        self.assertTrue(queued.cancelled())
+        # a running job keeps its slot until it's done
+        self.assertEqual(self._login().status_code, 429)
+        self.assertFalse(state.slots.acquire(blocking=False))
+        running.set_result((True, None))
+        self.assertTrue(state.slots.acquire(blocking=False))
+        self.assertEqual(passwords.stats()['rejected'], 2)
+
+    def test_benchmark(self):
+        results = benchmark(['pbkdf2:sha256:1000'], duration=0.05, processes=1)
+        self.assertEqual(results['pbkdf2:sha256:1000']['cores'], 1)
+        self.assertGreater(results['pbkdf2:sha256:1000']['per_core'], 0)
@@ -0,0 +1,63 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role
+from app.presence import presence
+
+
+class TestPresenceTracker(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_ping_is_buffered(self):
+        u = User()
+        db.session.add(u)
+        db.session.commit()
+        last_seen = u.last_seen
+        u.ping()
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, u.id).last_seen, last_seen)
+        self.assertEqual(presence.stats()['pending'], 1)
+
+    def test_pings_within_granularity_are_absorbed(self):
+        u = User()
+        db.session.add(u)
+        db.session.commit()
+        for _ in range(5):
+            u.ping()
+        stats = presence.stats()
+        self.assertEqual(stats['pings'], 5)
+        self.assertEqual(stats['absorbed'], 4)
+        self.assertEqual(stats['pending'], 1)
+
+    def test_flush_writes_pending_activity(self):
+        u_1 = User(email='u1@example.com')
+        u_2 = User(email='u2@example.com')
+        db.session.add_all([u_1, u_2])
+        db.session.commit()
+        last_seen = u_1.last_seen
+        u_1.ping()
+        u_2.ping()
+        self.assertEqual(presence.flush(), 2)
+        db.session.expire_all()
+        self.assertGreater(db.session.get(User, u_1.id).last_seen, last_seen)
+        stats = presence.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['flushed'], 2)
+        self.assertEqual(stats['flushes'], 1)
+        self.assertEqual(presence.flush(), 0)
+
+    def test_should_flush(self):
+        self.app.config['PRESENCE_FLUSH_INTERVAL'] = 0
+        presence.init_app(self.app)
+        self.assertFalse(presence.should_flush())
+        presence.ping(1)
+        self.assertTrue(presence.should_flush())
@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment
+
+
+class TestProfileActivity(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['PROFILE_ACTIVITY_LIMIT'] = 3
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com')
+        self.blog = Blog(name='jblog', user=self.user)
+        db.session.add(self.blog)
+        db.session.commit()
+        start = datetime(2024, 1, 1)
+        self.posts = [
+            Post(title=f'post {i}', body='body', blog=self.blog, author=self.user,
+                 created_at=start + timedelta(hours=i))
+            for i in range(5)]
+        db.session.add_all(self.posts)
+        db.session.add_all([
+            Comment(body=f'comment {i}', post=self.posts[i], user=self.user,
+                    created_at=start + timedelta(hours=i, minutes=30))
+            for i in range(5)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+        self.queries = []
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _count(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def _activity(self):
+        return self.client.get(
+            '/blog/profile/john/activity', headers={'HX-Request': 'true'}).get_data(as_text=True)
+
+    def test_latest_comments_and_posts_in_one_query(self):
+        html = self._activity()
+        # the user id scoping the cache, then the activity
+        self.assertEqual(len(self.queries), 2)
+        for i in (4, 3, 2):
+            self.assertIn(f'comment {i}', html)
+            self.assertIn(f'post {i}', html)
+        self.assertNotIn('comment 1', html)
+        self.assertNotIn('post 1<', html)
+
+    def test_cached_until_new_comment(self):
+        self._activity()
+        self.queries.clear()
+        self._activity()
+        self.assertEqual(len(self.queries), 1)
+
+        # comments of other users leave the panel cached
+        other = User(username='jane', email='jane@example.com')
+        db.session.add(Comment(body='other comment', post=self.posts[0], user=other))
+        db.session.commit()
+        self.queries.clear()
+        self._activity()
+        self.assertEqual(len(self.queries), 1)
+
+        db.session.add(Comment(body='new comment', post=self.posts[0], user=self.user))
+        db.session.commit()
+        self.assertIn('new comment', self._activity())
+        self.posts[4].title = 'renamed post'
+        db.session.commit()
+        self.assertIn('renamed post', self._activity())
+
+    def test_unknown_user(self):
+        response = self.client.get('/blog/profile/unknown/activity', headers={'HX-Request': 'true'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_index_is_used(self):
+        plan = db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN SELECT created_at FROM comments '
+            'WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5')).all()
+        self.assertIn('ix_comments_user_id_created_at', ' '.join(row[-1] for row in plan))
@@ -0,0 +1,38 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role
+from app.query_guard import query_guard
+
+
+class TestQueryGuard(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.debug = True
+        self.app.config['QUERY_COUNT_THRESHOLD'] = 2
+        query_guard.init_app(self.app)
+
+        @self.app.route('/queries/<int:n>')
+        def queries(n):
+            for _ in range(n):
+                User.query.first()
+            return ''
+
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_no_warning_under_threshold(self):
+        with self.assertNoLogs(self.app.logger, 'WARNING'):
+            self.client.get('/queries/2')
+
+    def test_warning_over_threshold(self):
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/queries/3')
+        self.assertIn('queries issued 3 queries', logs.output[0])
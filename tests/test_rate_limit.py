@@ -0,0 +1,94 @@
+import os
+import unittest
+import tempfile
+from app import create_app, db
+from app.models import User, Role
+from app.rate_limit import rate_limiter, MemoryStore, SQLiteStore
+
+
+class StoreTests():
+    def test_bucket(self):
+        # 3 requests per 30 seconds, one more every 10 seconds
+        for _ in range(3):
+            self.assertEqual(self.store.hit('key', 10, 30, 1000), 0)
+        self.assertAlmostEqual(self.store.hit('key', 10, 30, 1000), 10)
+        self.assertAlmostEqual(self.store.hit('key', 10, 30, 1004), 6)
+        self.assertEqual(self.store.hit('key', 10, 30, 1010), 0)
+        self.assertGreater(self.store.hit('key', 10, 30, 1010), 0)
+        self.assertEqual(self.store.hit('other', 10, 30, 1010), 0)
+
+    def test_evict_full_buckets(self):
+        self.store.hit('a', 10, 30, 1000)
+        self.store.hit('b', 10, 30, 1015)
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.evict(1012), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.evict(1030), 1)
+        self.assertEqual(len(self.store), 0)
+
+
+class TestMemoryStore(StoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore()
+
+
+class TestSQLiteStore(StoreTests, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteStore(os.path.join(self.dir.name, 'rate-limit.sqlite'))
+
+    def tearDown(self):
+        self.store._conn().close()
+        self.dir.cleanup()
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['RATE_LIMIT_ENABLED'] = True
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        db.session.add(User(username='john', email='john@example.com', password='secret'))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _login(self, email, password='wrong', ip='10.0.0.1'):
+        return self.client.post(
+            '/auth/login', data={'email': email, 'password': password},
+            environ_base={'REMOTE_ADDR': ip})
+
+    def test_login_limited_by_email(self):
+        for _ in range(5):
+            self.assertEqual(self._login('john@example.com').status_code, 200)
+        response = self._login('John@example.com ', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        self.assertEqual(self._login('jane@example.com').status_code, 200)
+        # forms are not counted
+        self.assertEqual(self.client.get('/auth/login').status_code, 200)
+
+    def test_login_limited_by_ip(self):
+        for i in range(20):
+            self.assertEqual(self._login(f'user{i}@example.com').status_code, 200)
+        self.assertEqual(self._login('john@example.com').status_code, 429)
+        self.assertEqual(self._login('john@example.com', ip='10.0.0.2').status_code, 200)
+
+    def test_resend_confirmation_limited_by_user(self):
+        self._login('john@example.com', 'secret')
+        for _ in range(3):
+            self.assertEqual(self.client.get('/auth/resend-confirmation').status_code, 302)
+        self.assertEqual(self.client.get('/auth/resend-confirmation').status_code, 429)
+
+    def test_disabled(self):
+        self.app.config['RATE_LIMIT_ENABLED'] = False
+        for _ in range(6):
+            self.assertEqual(self._login('john@example.com').status_code, 200)
+        self.assertEqual(len(rate_limiter.store), 0)
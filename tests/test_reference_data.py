@@ -0,0 +1,109 @@
+import unittest
+from datetime import timedelta
+from sqlalchemy import event, text
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Category, Permission
+from app.reference_data import reference_data
+from app.util import utcnow
+
+
+class TestReferenceData(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['ENTRIES_PER_PAGE'] = 2
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.tech = Category(name='tech')
+        self.art = Category(name='art')
+        user = User(username='john', email='john@example.com', password='secret', confirmed=True)
+        db.session.add_all([self.tech, self.art, user])
+        db.session.commit()
+        blog = Blog(name='jblog', user=user)
+        now = utcnow()
+        db.session.add_all([blog] + [
+            Post(title=f'post {i}', body='body', blog=blog, author=user,
+                 category=self.tech if i % 2 else self.art, created_at=now - timedelta(minutes=i))
+            for i in range(7)])
+        db.session.commit()
+        self.queries = 0
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def test_choices_are_cached(self):
+        self.assertEqual(reference_data.choices('categories'), ((self.art.id, 'art'), (self.tech.id, 'tech')))
+        self.assertEqual([name for _, name in reference_data.choices('roles')][0], 'user')
+        self.queries = 0
+        reference_data.choices('categories')
+        self.assertEqual(reference_data.id('categories', 'tech'), self.tech.id)
+        self.assertIsNone(reference_data.id('categories', 'unknown'))
+        self.assertEqual(self.queries, 0)
+
+    def test_write_invalidates(self):
+        reference_data.choices('categories')
+        db.session.add(Category(name='music'))
+        self.assertNotIn('music', dict(reference_data.choices('categories')).values())
+        db.session.commit()
+        self.assertIn('music', dict(reference_data.choices('categories')).values())
+        self.art.name = 'painting'
+        db.session.rollback()
+        self.assertIn('art', dict(reference_data.choices('categories')).values())
+
+    def test_edit_post_rejects_unknown_category(self):
+        post = Post.query.filter_by(title='post 1').one()
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'secret'})
+        self.client.post(f'/blog/edit/{post.id}', data={
+            'title': 'post 1', 'body': 'edited', 'category': 999})
+        db.session.expire_all()
+        self.assertEqual(post.body, 'edited')
+        self.assertEqual(post.category_id, self.tech.id)
+        self.client.post(f'/blog/edit/{post.id}', data={
+            'title': 'post 1', 'body': 'edited', 'category': self.art.id})
+        db.session.expire_all()
+        self.assertEqual(post.category_id, self.art.id)
+
+    def test_category_listing(self):
+        client = self.app.test_client()
+        response = client.get('/blog/category/tech')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'post 1', response.data)
+        self.assertIn(b'post 3', response.data)
+        self.assertNotIn(b'post 5', response.data)
+        self.assertNotIn(b'post 0', response.data)
+        self.assertIn(b'/blog/category/tech/posts?cursor=', response.data)
+
+        cursor = response.data.split(b'/blog/category/tech/posts?cursor=')[1].split(b'"')[0].decode()
+        response = client.get(f'/blog/category/tech/posts?cursor={cursor}', headers={'HX-Request': 'true'})
+        self.assertIn(b'post 5', response.data)
+        self.assertNotIn(b'post 1', response.data)
+        self.assertEqual(client.get('/blog/category/unknown').status_code, 404)
+
+    def test_category_listing_uses_index(self):
+        plan = ' '.join(row[-1] for row in db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id FROM posts WHERE category_id = 1 '
+            'ORDER BY created_at DESC, id DESC LIMIT 3')))
+        self.assertIn('ix_posts_category_id_created_at', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_changes_of_other_processes_expire(self):
+        role_id, permissions = db.session.execute(text("SELECT id, permissions FROM roles WHERE name = 'user'")).one()
+        self.assertEqual(reference_data.value('roles', role_id), permissions)
+        # written without the session, e.g. by another process
+        db.session.execute(text('UPDATE roles SET permissions = 0 WHERE id = :id'), {'id': role_id})
+        db.session.commit()
+        self.assertEqual(reference_data.value('roles', role_id), permissions)
+        self.app.config['REFERENCE_DATA_TTL'] = 0
+        self.assertEqual(reference_data.value('roles', role_id), 0)
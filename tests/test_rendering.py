@@ -0,0 +1,73 @@
+import unittest
+from app import create_app, db
+from app.models import Post
+from app.rendering import MarkdownRenderer, rerender_posts
+
+
+class TestMarkdownRenderer(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_render_sanitizes_html(self):
+        r = MarkdownRenderer()
+        html = r.render('# title\n\n<script>alert(1)</script> *text*')
+        self.assertIn('<h1>title</h1>', html)
+        self.assertIn('<em>text</em>', html)
+        self.assertNotIn('<script>', html)
+        self.assertIsNone(r.render(None))
+
+    def test_render_linkifies_urls(self):
+        html = MarkdownRenderer().render('visit https://example.com')
+        self.assertIn('<a href="https://example.com"', html)
+
+    def test_render_is_cached(self):
+        r = MarkdownRenderer()
+        html = r.render('**bold**')
+        self.assertEqual(r.render('**bold**'), html)
+        self.assertEqual(r.hits, 1)
+        self.assertEqual(r.misses, 1)
+
+    def test_cache_is_bounded(self):
+        r = MarkdownRenderer(cache_size=2)
+        r.render('a')
+        r.render('b')
+        r.render('c')
+        r.render('a')
+        self.assertEqual(r.misses, 4)
+        self.assertEqual(len(r._cache), 2)
+
+    def test_cache_key_depends_on_allowed_tags(self):
+        self.assertNotEqual(
+            MarkdownRenderer(['p'])._key('text'), MarkdownRenderer(['p', 'em'])._key('text'))
+        self.assertEqual(MarkdownRenderer(['p']).render('*text*'), '<p>text</p>')
+
+    def test_render_many(self):
+        r = MarkdownRenderer()
+        html = r.render_many(['*a*', '*b*', '*a*'])
+        self.assertListEqual(html, ['<p><em>a</em></p>', '<p><em>b</em></p>', '<p><em>a</em></p>'])
+        self.assertEqual(r.misses, 2)
+
+    def test_post_body_is_rendered(self):
+        p = Post(body='*text*')
+        self.assertEqual(p.body_html, '<p><em>text</em></p>')
+
+    def test_rerender_posts(self):
+        posts = [Post(title=f'post {i}', body=f'*{i}*') for i in range(5)]
+        db.session.add_all(posts)
+        db.session.commit()
+        db.session.execute(db.update(Post).values(body_html=None))
+        db.session.commit()
+        progress = []
+        count = rerender_posts(2, lambda done, total: progress.append((done, total)))
+        self.assertEqual(count, 5)
+        self.assertListEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Post, posts[3].id).body_html, '<p><em>3</em></p>')
@@ -0,0 +1,100 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Comment
+from app.search import search, match_query
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com')
+        self.blog = Blog(name='jblog', user=self.user)
+        db.session.add(self.blog)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _post(self, title: str, body: str) -> Post:
+        post = Post(title=title, body=body, blog=self.blog, author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        return post
+
+    def test_match_query(self):
+        self.assertEqual(match_query('flask htmx'), '"flask" "htmx"*')
+        self.assertEqual(match_query('flask ht'), '"flask" "ht"')
+        self.assertEqual(match_query('"NEAR(a b)" OR -c'), '"NEAR" "a" "b" "OR" "c"')
+        self.assertIsNone(match_query(' "*" '))
+
+    def test_index_is_synced(self):
+        post = self._post('Caching in Flask', 'fragment caches and etags')
+        comment = Comment(body='great article about sqlite', post=post, user=self.user)
+        db.session.add(comment)
+        db.session.commit()
+
+        hits = list(search.search('caching', 10))
+        self.assertEqual([(hit.kind, hit.id) for hit in hits], [('post', post.id)])
+        self.assertEqual(hits[0].post, post)
+        self.assertIn('<mark>Caching</mark>', hits[0].title)
+        hits = list(search.search('sqlite', 10))
+        self.assertEqual([(hit.kind, hit.id, hit.post_id) for hit in hits], [('comment', comment.id, post.id)])
+
+        post.body = 'rewritten about queues'
+        db.session.commit()
+        self.assertEqual(list(search.search('etags', 10)), [])
+        self.assertEqual(len(list(search.search('queue', 10))), 1)
+
+        db.session.delete(comment)
+        db.session.commit()
+        self.assertEqual(list(search.search('sqlite', 10)), [])
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(list(search.search('queues', 10)), [])
+
+    def test_ranking_and_paging(self):
+        for i in range(5):
+            self._post(f'post {i}', 'flask ' * (i + 1) + 'filler ' * 20)
+        self._post('flask in the title', 'nothing else')
+        results = search.search('flask', 4)
+        self.assertEqual(results.items[0].post.title, 'flask in the title')
+        self.assertTrue(results.has_next)
+        rest = search.search('flask', 4, results.next_cursor)
+        self.assertFalse(rest.has_next)
+        ids = [hit.id for hit in results] + [hit.id for hit in rest]
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+        scores = [hit.score for hit in results] + [hit.score for hit in rest]
+        self.assertEqual(scores, sorted(scores))
+
+    def test_snippets_are_escaped(self):
+        self._post('xss', 'hello <script>alert(1)</script> world')
+        hit = search.search('hello', 10).items[0]
+        self.assertNotIn('<script>', hit.body)
+        self.assertIn('&lt;script&gt;', hit.body)
+
+    def test_rebuild(self):
+        post = self._post('Caching in Flask', 'fragment caches')
+        db.session.add(Comment(body='a comment', post=post, user=self.user))
+        db.session.commit()
+        db.session.execute(db.text('DELETE FROM search_index'))
+        db.session.commit()
+        self.assertEqual(list(search.search('caching', 10)), [])
+        self.assertEqual(search.rebuild(chunk_size=1), 2)
+        self.assertEqual(len(list(search.search('caching', 10))), 1)
+        self.assertEqual(len(list(search.search('comment', 10))), 1)
+
+    def test_search_view(self):
+        self._post('Caching in Flask', 'fragment caches')
+        response = self.client.get('/blog/search?q=cach')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<mark>Caching</mark> in Flask', response.data)
+        response = self.client.get('/blog/search/results?q=nothing', headers={'HX-Request': 'true'})
+        self.assertIn(b'no results', response.data)
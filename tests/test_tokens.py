@@ -0,0 +1,127 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+import jwt
+from app import create_app, db
+from app.models import User, Role
+from app.tokens import tokens, key_id, MemoryLedger, SQLiteLedger
+from app.uniqueness import uniqueness
+
+
+old_key = 'old secret key of at least 32 bytes'
+new_key = 'new secret key of at least 32 bytes'
+
+
+class TestTokens(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['SECRET_KEY'] = old_key
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def test_decode(self):
+        token = tokens.encode({'confirm': 1})
+        self.assertEqual(tokens.decode(token)['confirm'], 1)
+        self.assertIsNone(tokens.decode(token + 'A'))
+        self.assertIsNone(tokens.decode('not a token'))
+        self.assertIsNone(tokens.decode(tokens.encode({'confirm': 1}, -1)))
+        self.assertIsNone(tokens.decode(jwt.encode({'confirm': 1}, old_key, algorithm='HS256')))
+
+    def test_verified_tokens_are_cached(self):
+        token = tokens.encode({'confirm': 1})
+        tokens.decode(token)
+        with mock.patch('app.tokens.jwt.decode') as decode:
+            self.assertEqual(tokens.decode(token)['confirm'], 1)
+        decode.assert_not_called()
+
+    def test_tokens_are_single_use(self):
+        token = tokens.encode({'email': 'john@example.com'})
+        self.assertEqual(tokens.use(token)['email'], 'john@example.com')
+        self.assertIsNone(tokens.use(token))
+        self.assertIsNone(tokens.decode(token))
+        self.assertEqual(User.reset_password(token), False)
+
+    def test_key_rotation(self):
+        old_token = tokens.encode({'confirm': 1})
+        self.app.config['SECRET_KEY'] = new_key
+        self.assertIsNone(tokens.decode(old_token))
+        self.app.config['SECRET_KEY_FALLBACKS'] = [old_key]
+        self.assertEqual(tokens.decode(old_token)['confirm'], 1)
+        new_token = tokens.encode({'confirm': 1})
+        self.assertEqual(jwt.get_unverified_header(new_token)['kid'], key_id(new_key))
+        self.assertEqual(jwt.decode(new_token, new_key, algorithms='HS256')['confirm'], 1)
+
+    def test_sessions_signed_with_fallback_keys(self):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['key'] = 'value'
+        self.app.config['SECRET_KEY'] = new_key
+        self.app.config['SECRET_KEY_FALLBACKS'] = [old_key]
+        with client.session_transaction() as session:
+            self.assertEqual(session.get('key'), 'value')
+
+    def test_confirm_replay(self):
+        user = User(email='john@example.com')
+        db.session.add(user)
+        db.session.commit()
+        token = user.generate_token({'confirm': user.id})
+        self.assertTrue(user.confirm(token))
+        user.confirmed = False
+        self.assertFalse(user.confirm(token))
+        self.assertFalse(user.confirmed)
+
+
+    def test_token_of_failed_change_can_be_used_again(self):
+        user = User(username='john', email='john@example.com')
+        jane = User(username='jane', email='jane@example.com')
+        db.session.add_all([user, jane])
+        db.session.commit()
+        token = user.generate_token({'update-email': 'jane@example.com'})
+        self.assertTrue(user.update_email(token))
+        self.assertFalse(uniqueness.save())
+        # the address is freed, the link still works once
+        db.session.delete(jane)
+        db.session.commit()
+        self.assertTrue(user.update_email(token))
+        self.assertTrue(uniqueness.save())
+        self.assertEqual(user.email, 'jane@example.com')
+        self.assertFalse(user.update_email(token))
+
+
+class LedgerTests():
+    def test_add(self):
+        self.assertTrue(self.ledger.add('a', 2e9))
+        self.assertFalse(self.ledger.add('a', 2e9))
+        self.assertIn('a', self.ledger)
+        self.assertNotIn('b', self.ledger)
+        self.ledger.discard('a')
+        self.assertTrue(self.ledger.add('a', 2e9))
+
+
+class TestMemoryLedger(LedgerTests, unittest.TestCase):
+    def setUp(self):
+        self.ledger = MemoryLedger()
+
+    def test_expired_ids_are_evicted(self):
+        self.ledger.add('a', 1)
+        self.ledger.add('b', 2e9)
+        self.assertNotIn('a', self.ledger)
+        self.assertEqual(len(self.ledger), 1)
+
+
+class TestSQLiteLedger(LedgerTests, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.ledger = SQLiteLedger(os.path.join(self.dir.name, 'ledger.sqlite'))
+
+    def tearDown(self):
+        self.ledger._conn().close()
+        self.dir.cleanup()
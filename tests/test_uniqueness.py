@@ -0,0 +1,88 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Blog, Post, Permission
+from app.uniqueness import uniqueness
+from app.blueprints.blog.forms import CreateBlogForm
+
+
+class TestUniqueness(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        # registered by run.py
+        self.app.context_processor(lambda: dict(Permission=Permission))
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.create_all()
+        Role.set_roles()
+        self.user = User(username='john', email='john@example.com', password='secret', confirmed=True)
+        db.session.add(self.user)
+        db.session.commit()
+        db.session.add(Blog(name='jblog', user=self.user))
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.queries = []
+        event.listen(db.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._record)
+        db.session.remove()
+        db.drop_all()
+        self.app_ctx.pop()
+
+    def _record(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def _register(self, email, username):
+        return self.client.post('/auth/register', data={
+            'email': email, 'username': username,
+            'password': 'secret', 'confirm_password': 'secret'})
+
+    def test_register_is_not_looked_up_first(self):
+        response = self._register('jane@example.com', 'jane')
+        self.assertIn('HX-Redirect', response.headers)
+        self.assertFalse([q for q in self.queries if q.startswith('SELECT') and 'users.email =' in q])
+
+    def test_register_duplicates(self):
+        response = self._register('john@example.com', 'jane')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'email already in use', response.data)
+        response = self._register('jane@example.com', 'john')
+        self.assertIn(b'username already in use', response.data)
+        self.assertEqual(User.query.count(), 1)
+
+    def test_create_post_duplicate_title(self):
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'secret'})
+        self.client.post('/blog/write', data={'title': 'hello', 'body': 'body'})
+        response = self.client.post('/blog/write', data={'title': 'hello', 'body': 'other'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'title already in use', response.data)
+        self.assertEqual(Post.query.count(), 1)
+
+    def test_availability(self):
+        response = self.client.get('/blog/available/username?username=john')
+        self.assertIn(b'username already in use', response.data)
+        response = self.client.get('/blog/available/blog-name?name=other', headers={'HX-Request': 'true'})
+        self.assertEqual(response.data.strip(), b'')
+        self.assertEqual(self.client.get('/blog/available/password?password=x').status_code, 404)
+        # registered emails are not disclosed
+        self.assertEqual(self.client.get('/blog/available/email?email=john@example.com').status_code, 404)
+        self.assertEqual(self.client.get('/blog/available/post-title?title=x').status_code, 404)
+
+    def test_availability_is_rate_limited(self):
+        self.app.config['RATE_LIMIT_ENABLED'] = True
+        statuses = {self.client.get('/blog/available/username?username=jane').status_code for _ in range(121)}
+        self.assertEqual(statuses, {200, 429})
+
+    def test_available_values_are_cached(self):
+        self.assertFalse(uniqueness.taken('username', 'jane'))
+        self.queries.clear()
+        self.assertFalse(uniqueness.taken('username', 'jane'))
+        self.assertEqual(self.queries, [])
+        self.assertTrue(uniqueness.taken('username', 'john'))
+
+    def test_reserved_blog_names(self):
+        for name, valid in (('search', False), ('Following', False), ('category', False), ('searching', True)):
+            with self.app.test_request_context(method='POST', data={'name': name}):
+                self.assertEqual(CreateBlogForm().validate(), valid, name)